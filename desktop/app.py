@@ -1,133 +1,73 @@
 #!/usr/bin/env python3
 import tkinter as tk
 from tkinter import ttk, messagebox
+import queue
 import subprocess
 import sys
-from threading import Thread, Event
-import signal
-import time
+from threading import Thread
 import socket
-import sounddevice as sd
-import numpy as np
-import argparse
-from queue import Queue
 import logging
+import time
 
 
-class AudioReceiver:
-    def __init__(
-        self, host="0.0.0.0", port=5555, sample_rate=44100, channels=1, device=None
-    ):
-        self.host = host
-        self.port = port
-        self.sample_rate = sample_rate
-        self.channels = channels
-        self.device = device
-        self.audio_queue = Queue(maxsize=20)
-        self.shutdown_event = Event()
-        self.stream = None
-        self.logger = logging.getLogger("AudioReceiver")
-
-    def signal_handler(self, signum, frame):
-        """Handle shutdown signals"""
-        self.logger.info(f"Received signal {signum}, shutting down...")
-        self.shutdown_event.set()
-
-    def callback(self, outdata, frames, time, status):
-        if status:
-            self.logger.warning(f"Audio stream status: {status}")
-
-        if not self.audio_queue.empty():
-            data = self.audio_queue.get()
-            try:
-                audio_data = np.frombuffer(data, dtype=np.int16)
-                if len(audio_data) < frames * self.channels:
-                    padding = np.zeros(
-                        frames * self.channels - len(audio_data), dtype=np.int16
-                    )
-                    audio_data = np.concatenate((audio_data, padding))
-                elif len(audio_data) > frames * self.channels:
-                    audio_data = audio_data[: frames * self.channels]
-                outdata[:] = audio_data.reshape(-1, self.channels)
-            except Exception as e:
-                self.logger.error(f"Audio processing error: {e}")
-                outdata.fill(0)
-        else:
-            outdata.fill(0)
-
-    def network_thread(self):
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            s.settimeout(1)
-            s.bind((self.host, self.port))
-            s.listen(1)
-            self.logger.info(f"Listening on {self.host}:{self.port}")
-
-            try:
-                while not self.shutdown_event.is_set():
-                    try:
-                        conn, addr = s.accept()
-                    except socket.timeout:
-                        continue
-
-                    self.logger.info(f"Connected by {addr}")
-                    conn.settimeout(1)
-
-                    with conn:
-                        chunk_size = int(self.sample_rate * 0.02) * self.channels * 2
-                        while not self.shutdown_event.is_set():
-                            try:
-                                data = conn.recv(chunk_size)
-                                if not data:
-                                    break
-                                self.audio_queue.put(data)
-                            except socket.timeout:
-                                continue
-                            except Exception as e:
-                                self.logger.error(f"Network error: {e}")
-                                break
-            except Exception as e:
-                if not self.shutdown_event.is_set():
-                    self.logger.error(f"Connection error: {e}")
-            finally:
-                self.logger.info("Network thread stopping")
-
-    def start(self):
-        try:
-            self.stream = sd.OutputStream(
-                device=self.device,
-                samplerate=self.sample_rate,
-                channels=self.channels,
-                dtype="int16",
-                callback=self.callback,
-                blocksize=int(self.sample_rate * 0.02),
-            )
-            self.stream.start()
-            self.logger.info("Audio stream started")
+class LevelBar:
+    """Horizontal meter: RMS as a bar, peak as a line, -60 to 0 dBFS"""
 
-            network_thread = Thread(target=self.network_thread)
-            network_thread.start()
+    FLOOR_DB = -60
+    COLORS = ((-12, "#27AE60"), (-3, "#F1C40F"), (0, "#E74C3C"))
 
-            while not self.shutdown_event.is_set():
-                time.sleep(0.1)
+    def __init__(self, parent, width=260, height=14):
+        self.width = width
+        self.height = height
+        self.canvas = tk.Canvas(
+            parent,
+            width=width,
+            height=height,
+            background="#1C2833",
+            highlightthickness=0,
+        )
+        self.bar = self.canvas.create_rectangle(0, 0, 0, height, width=0)
+        self.peak = self.canvas.create_line(0, 0, 0, height, fill="white", width=2)
 
-        except Exception as e:
-            self.logger.error(f"Error: {e}")
-        finally:
-            self.cleanup()
+    def x(self, db):
+        return self.width * (max(db, self.FLOOR_DB) - self.FLOOR_DB) / -self.FLOOR_DB
 
-    def cleanup(self):
-        self.shutdown_event.set()
-        if self.stream:
-            try:
-                self.stream.stop()
-                self.stream.close()
-            except Exception as e:
-                self.logger.error(f"Error stopping stream: {e}")
-        self.logger.info("Audio receiver stopped")
+    def show(self, peak_db, rms_db):
+        color = self.COLORS[-1][1]
+        for limit, limit_color in self.COLORS:
+            if peak_db < limit:
+                color = limit_color
+                break
+        self.canvas.coords(self.bar, 0, 0, self.x(rms_db), self.height)
+        self.canvas.itemconfig(self.bar, fill=color)
+        peak = self.x(peak_db)
+        self.canvas.coords(self.peak, peak, 0, peak, self.height)
 
 
 class AudioReceiverApp:
+    # Output choices shown in the UI and the backends they select
+    OUTPUTS = [
+        ("Sound device", "sounddevice"),
+        ("WAV/raw file", "file"),
+        ("Pipe (FIFO)", "pipe"),
+        ("None", "null"),
+    ]
+    # How often the Tk thread picks up results from background workers
+    POLL_MS = 50
+    # How often the meters are refreshed while the receiver runs
+    METER_MS = 50
+    # How long the clip indicator stays lit
+    CLIP_HOLD_S = 1
+    LEVEL_COLUMNS = (
+        ("sender", "Sender", 150),
+        ("peak", "Peak dB", 60),
+        ("rms", "RMS dB", 60),
+        ("buffer", "Buffer ms", 80),
+        ("latency", "Latency ms", 80),
+        ("underruns", "Underruns", 70),
+        ("lost", "Lost", 50),
+    )
+
     def __init__(self, root):
         self.root = root
         self.root.title("FastiMic - Audio Receiver")
@@ -137,7 +77,12 @@ class AudioReceiverApp:
         self.receiver_thread = None
         self.receiver = None
         self.is_running = False
-        self.audio_devices = self.get_audio_devices()
+        self.audio_devices = []
+        self.audio_loaded = False
+        self.results = queue.SimpleQueue()
+        self.levels_job = None
+        self.mix_clipped = 0
+        self.clip_until = 0
 
         # Configure logging
         logging.basicConfig(
@@ -151,22 +96,66 @@ class AudioReceiverApp:
         self.create_widgets()
         self.center_window()
 
-    def get_audio_devices(self):
-        """Get available audio output devices"""
-        devices = []
+        # numpy, PortAudio's device scan and the IP lookup take seconds on
+        # some machines, so the window comes up first and fills in after
+        self.poll_results()
+        self.run_in_background(self.load_audio, self.on_devices_loaded)
+        self.run_in_background(self.get_ip_address, self.ip_var.set)
+
+    def run_in_background(self, work, done):
+        """Call ``work`` on a worker thread, then ``done(result)`` on Tk's"""
+
+        def worker():
+            self.results.put((done, work()))
+
+        Thread(target=worker, daemon=True).start()
+
+    def poll_results(self):
+        # Tk may only be touched from its own thread
+        while True:
+            try:
+                done, result = self.results.get_nowait()
+            except queue.Empty:
+                break
+            done(result)
+        self.root.after(self.POLL_MS, self.poll_results)
+
+    def load_audio(self, refresh=False):
+        """Import the receiver and list output devices; runs off the Tk thread"""
         try:
-            host_apis = sd.query_hostapis()
-            for api in host_apis:
-                for device_idx in api["devices"]:
-                    device = sd.query_devices(device_idx)
-                    if device["max_output_channels"] > 0:
-                        devices.append(
-                            (device_idx, f"{device['name']} ({api['name']})")
-                        )
+            import engine  # noqa: F401 (numpy, sounddevice)
+            from backends import output_devices
+
+            return output_devices(refresh)
         except Exception as e:
             self.logger.error(f"Error getting audio devices: {e}")
-            devices = [(None, "Default Device")]
-        return devices
+            return [(None, "Default Device")]
+
+    def on_devices_loaded(self, devices):
+        self.audio_devices = devices
+        names = [name for idx, name in devices]
+        self.device_menu.config(values=names)
+        if self.device_var.get() not in names:
+            self.device_var.set(names[0] if names else "")
+        self.extra_devices_list.config(state=tk.NORMAL)
+        self.extra_devices_list.delete(0, tk.END)
+        for name in names:
+            self.extra_devices_list.insert(tk.END, name)
+        self.audio_loaded = True
+        self.on_output_selected()
+        if not self.is_running:
+            self.start_button.config(state=tk.NORMAL)
+            self.refresh_button.config(state=tk.NORMAL)
+            self.status_var.set("Ready")
+
+    def refresh_devices(self):
+        """Rescan for sound cards plugged in or removed since startup"""
+        self.start_button.config(state=tk.DISABLED)
+        self.refresh_button.config(state=tk.DISABLED)
+        self.status_var.set("Looking for audio devices...")
+        self.run_in_background(
+            lambda: self.load_audio(refresh=True), self.on_devices_loaded
+        )
 
     def get_ip_address(self):
         """Get the current IP address of the machine"""
@@ -199,11 +188,11 @@ class AudioReceiverApp:
         ip_frame = ttk.Frame(main_frame, padding="5")
         ip_frame.pack(fill=tk.X, pady=(0, 10))
 
-        current_ip = self.get_ip_address()
+        self.ip_var = tk.StringVar(value="...")
         ttk.Label(ip_frame, text="Current IP Address:").pack(side=tk.LEFT, padx=5)
         ttk.Label(
             ip_frame,
-            text=current_ip,
+            textvariable=self.ip_var,
             font=("TkDefaultFont", 10, "bold"),
             foreground="#2E86C1",
         ).pack(side=tk.LEFT)
@@ -230,6 +219,43 @@ class AudioReceiverApp:
         self.port_entry.insert(0, "5555")
         self.port_entry.grid(row=1, column=1, sticky="ew", padx=5, pady=5)
 
+        # Transport
+        ttk.Label(conn_frame, text="Transport:").grid(
+            row=2, column=0, sticky="e", padx=5, pady=5
+        )
+        self.transport_var = tk.StringVar(value="tcp")
+        self.transport_menu = ttk.Combobox(
+            conn_frame,
+            textvariable=self.transport_var,
+            values=["tcp", "udp"],
+            state="readonly",
+            width=10,
+        )
+        self.transport_menu.grid(row=2, column=1, sticky="w", padx=5, pady=5)
+
+        # Keep networking out of the GUI's process
+        self.process_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            conn_frame,
+            text="Receive in a separate process",
+            variable=self.process_var,
+        ).grid(row=3, column=1, sticky="w", padx=5, pady=5)
+
+        # Socket options for TCP senders (see netprofile.py)
+        self.low_latency_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            conn_frame,
+            text="Low-latency network settings",
+            variable=self.low_latency_var,
+        ).grid(row=4, column=1, sticky="w", padx=5, pady=5)
+
+        # Downstream receivers to forward the mix to
+        ttk.Label(conn_frame, text="Relay To:").grid(
+            row=5, column=0, sticky="e", padx=5, pady=5
+        )
+        self.relay_entry = ttk.Entry(conn_frame)
+        self.relay_entry.grid(row=5, column=1, sticky="ew", padx=5, pady=5)
+
         # Audio settings frame
         audio_frame = ttk.LabelFrame(main_frame, text="Audio Settings", padding="10")
         audio_frame.pack(fill=tk.X, pady=5)
@@ -238,17 +264,22 @@ class AudioReceiverApp:
         ttk.Label(audio_frame, text="Output Device:").grid(
             row=0, column=0, sticky="e", padx=5, pady=5
         )
-        self.device_var = tk.StringVar()
+        self.device_var = tk.StringVar(value="Loading devices...")
         self.device_menu = ttk.Combobox(
             audio_frame,
             textvariable=self.device_var,
-            values=[name for idx, name in self.audio_devices],
-            state="readonly",
+            state=tk.DISABLED,
             width=40,
         )
-        if self.audio_devices:
-            self.device_menu.current(0)
         self.device_menu.grid(row=0, column=1, sticky="ew", padx=5, pady=5)
+        self.device_menu.bind("<<ComboboxSelected>>", self.on_setting_changed)
+        self.refresh_button = ttk.Button(
+            audio_frame,
+            text="Refresh",
+            command=self.refresh_devices,
+            state=tk.DISABLED,
+        )
+        self.refresh_button.grid(row=0, column=2, padx=5, pady=5)
 
         # Sample Rate
         ttk.Label(audio_frame, text="Sample Rate:").grid(
@@ -278,8 +309,124 @@ class AudioReceiverApp:
         )
         self.channels_menu.grid(row=2, column=1, sticky="w", padx=5, pady=5)
 
+        # Jitter buffer latency
+        ttk.Label(audio_frame, text="Latency (ms):").grid(
+            row=3, column=0, sticky="e", padx=5, pady=5
+        )
+        self.latency_var = tk.StringVar(value="Off")
+        self.latency_menu = ttk.Combobox(
+            audio_frame,
+            textvariable=self.latency_var,
+            values=["Off", 40, 60, 80, 120, 200],
+            state="readonly",
+            width=10,
+        )
+        self.latency_menu.grid(row=3, column=1, sticky="w", padx=5, pady=5)
+        self.latency_menu.bind("<<ComboboxSelected>>", self.on_setting_changed)
+
+        # Clock drift compensation
+        self.drift_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            audio_frame, text="Compensate clock drift", variable=self.drift_var
+        ).grid(row=4, column=1, sticky="w", padx=5, pady=5)
+
+        # Output backend
+        ttk.Label(audio_frame, text="Output:").grid(
+            row=5, column=0, sticky="e", padx=5, pady=5
+        )
+        self.output_var = tk.StringVar(value=self.OUTPUTS[0][0])
+        self.output_menu = ttk.Combobox(
+            audio_frame,
+            textvariable=self.output_var,
+            values=[label for label, backend in self.OUTPUTS],
+            state="readonly",
+            width=15,
+        )
+        self.output_menu.grid(row=5, column=1, sticky="w", padx=5, pady=5)
+        self.output_menu.bind("<<ComboboxSelected>>", self.on_output_selected)
+
+        # File or FIFO path for non-device outputs
+        ttk.Label(audio_frame, text="Output Path:").grid(
+            row=6, column=0, sticky="e", padx=5, pady=5
+        )
+        self.output_path_entry = ttk.Entry(audio_frame)
+        self.output_path_entry.insert(0, "fastimic.wav")
+        self.output_path_entry.config(state=tk.DISABLED)
+        self.output_path_entry.grid(row=6, column=1, sticky="ew", padx=5, pady=5)
+
+        # Level processing
+        self.leveling_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            audio_frame,
+            text="Even out levels (noise gate, AGC, limiter)",
+            variable=self.leveling_var,
+        ).grid(row=7, column=1, sticky="w", padx=5, pady=5)
+
+        # More sound cards playing the same mix, each with its own clock
+        ttk.Label(audio_frame, text="Also Play On:").grid(
+            row=8, column=0, sticky="ne", padx=5, pady=5
+        )
+        self.extra_devices_list = tk.Listbox(
+            audio_frame,
+            selectmode=tk.MULTIPLE,
+            height=4,
+            exportselection=False,
+            state=tk.DISABLED,
+        )
+        self.extra_devices_list.grid(row=8, column=1, sticky="ew", padx=5, pady=5)
+        self.extra_devices_list.bind("<<ListboxSelect>>", self.on_setting_changed)
+
+        # Level of the whole mix
+        ttk.Label(audio_frame, text="Output Gain (dB):").grid(
+            row=9, column=0, sticky="e", padx=5, pady=5
+        )
+        self.gain_var = tk.DoubleVar(value=0.0)
+        gain_spinbox = ttk.Spinbox(
+            audio_frame,
+            textvariable=self.gain_var,
+            from_=-30,
+            to=12,
+            increment=1,
+            width=8,
+            command=self.on_setting_changed,
+        )
+        gain_spinbox.bind("<Return>", self.on_setting_changed)
+        gain_spinbox.grid(row=9, column=1, sticky="w", padx=5, pady=5)
+
+        # Live meters and counters, refreshed while the receiver runs
+        levels_frame = ttk.LabelFrame(main_frame, text="Live Levels", padding="10")
+        levels_frame.pack(fill=tk.X, pady=5)
+
+        ttk.Label(levels_frame, text="Mix:").grid(
+            row=0, column=0, sticky="e", padx=5, pady=5
+        )
+        self.mix_meter = LevelBar(levels_frame)
+        self.mix_meter.canvas.grid(row=0, column=1, sticky="w", padx=5, pady=5)
+        self.clip_label = ttk.Label(
+            levels_frame, text="", foreground="#E74C3C", width=5
+        )
+        self.clip_label.grid(row=0, column=2, padx=5, pady=5)
+        self.mix_level_var = tk.StringVar(value="")
+        ttk.Label(levels_frame, textvariable=self.mix_level_var).grid(
+            row=1, column=1, columnspan=2, sticky="w", padx=5
+        )
+
+        self.levels_tree = ttk.Treeview(
+            levels_frame,
+            columns=[name for name, heading, width in self.LEVEL_COLUMNS],
+            show="headings",
+            height=4,
+        )
+        for name, heading, width in self.LEVEL_COLUMNS:
+            self.levels_tree.heading(name, text=heading)
+            self.levels_tree.column(name, width=width, anchor=tk.E, stretch=False)
+        self.levels_tree.column("sender", anchor=tk.W, stretch=True)
+        self.levels_tree.grid(
+            row=2, column=0, columnspan=3, sticky="ew", padx=5, pady=5
+        )
+
         # Status bar
-        self.status_var = tk.StringVar(value="Ready")
+        self.status_var = tk.StringVar(value="Loading audio...")
         status_bar = ttk.Label(
             main_frame, textvariable=self.status_var, relief=tk.SUNKEN, anchor=tk.W
         )
@@ -290,7 +437,11 @@ class AudioReceiverApp:
         button_frame.pack(fill=tk.X, pady=10)
 
         self.start_button = ttk.Button(
-            button_frame, text="Start Receiver", command=self.start_receiver, width=15
+            button_frame,
+            text="Start Receiver",
+            command=self.start_receiver,
+            width=15,
+            state=tk.DISABLED,
         )
         self.start_button.pack(side=tk.LEFT, padx=5)
 
@@ -310,6 +461,140 @@ class AudioReceiverApp:
         # Configure grid weights
         conn_frame.columnconfigure(1, weight=1)
         audio_frame.columnconfigure(1, weight=1)
+        levels_frame.columnconfigure(1, weight=1)
+
+    def selected_output(self):
+        for label, backend in self.OUTPUTS:
+            if label == self.output_var.get():
+                return backend
+        return "sounddevice"
+
+    def on_output_selected(self, event=None):
+        """Enable the controls that apply to the chosen output"""
+        backend = self.selected_output()
+        # Until the devices are listed, on_devices_loaded calls this again
+        devices = self.audio_loaded and backend == "sounddevice"
+        self.device_menu.config(state="readonly" if devices else tk.DISABLED)
+        self.extra_devices_list.config(state=tk.NORMAL if devices else tk.DISABLED)
+        path_state = tk.NORMAL if backend in ("file", "pipe") else tk.DISABLED
+        self.output_path_entry.config(state=path_state)
+
+    def selected_devices(self):
+        """Output device ID, or a list of IDs when extra devices are ticked"""
+        device_idx = None
+        for idx, name in self.audio_devices:
+            if name == self.device_var.get():
+                device_idx = idx
+                break
+        extra_devices = [
+            self.audio_devices[i][0]
+            for i in self.extra_devices_list.curselection()
+            if self.audio_devices[i][0] != device_idx
+        ]
+        if self.selected_output() != "sounddevice" or not extra_devices:
+            return device_idx
+        return [device_idx] + extra_devices
+
+    def selected_latency_ms(self):
+        latency = self.latency_var.get()
+        return None if latency == "Off" else int(latency)
+
+    def selected_gain_db(self):
+        try:
+            return float(self.gain_var.get())
+        except (tk.TclError, ValueError):
+            return 0.0
+
+    def on_setting_changed(self, event=None):
+        """Apply device, latency and gain changes to the running receiver"""
+        if not self.is_running:
+            return
+        receiver = self.receiver
+        changes = {
+            "latency_ms": self.selected_latency_ms(),
+            "output_gain_db": self.selected_gain_db(),
+        }
+        if self.selected_output() == "sounddevice":
+            changes["device"] = self.selected_devices()
+
+        def apply():
+            # Opening a device can take a while; keep it off the Tk thread
+            try:
+                receiver.reconfigure(**changes)
+            except Exception as e:
+                return str(e)
+
+        self.run_in_background(apply, self.on_reconfigured)
+
+    def on_reconfigured(self, error):
+        if error:
+            messagebox.showerror("Error", f"Failed to apply the change: {error}")
+
+    def poll_levels(self):
+        """Refresh the meters; reads published snapshots, never the audio path"""
+        self.levels_job = None
+        receiver = self.receiver
+        if receiver is None or not self.is_running:
+            return
+        try:
+            levels = receiver.levels()
+        except Exception:
+            # Not started yet, or stopping
+            levels = None
+        if levels is not None:
+            self.show_levels(levels)
+        self.levels_job = self.root.after(self.METER_MS, self.poll_levels)
+
+    def show_levels(self, levels):
+        mix = levels["mix"]
+        if mix is not None:
+            self.mix_meter.show(mix["peak_dbfs"], mix["rms_dbfs"])
+            if mix["clipped_windows"] > self.mix_clipped:
+                self.clip_until = time.monotonic() + self.CLIP_HOLD_S
+            self.mix_clipped = mix["clipped_windows"]
+            glitches = levels["stream_status_events"] + levels.get(
+                "playback_underruns", 0
+            )
+            self.mix_level_var.set(
+                f"Peak {mix['peak_dbfs']:.0f} dBFS, RMS {mix['rms_dbfs']:.0f} dBFS, "
+                f"output glitches: {glitches}"
+            )
+        clipping = time.monotonic() < self.clip_until
+        self.clip_label.config(text="CLIP" if clipping else "")
+
+        tree = self.levels_tree
+        shown = set(tree.get_children())
+        for name, client in levels["clients"].items():
+            buffer = f"{client['buffered_ms']:.0f}"
+            if "target_ms" in client:
+                buffer += f" / {client['target_ms']:.0f}"
+            values = (
+                name,
+                f"{client['peak_dbfs']:.0f}",
+                f"{client['rms_dbfs']:.0f}",
+                buffer,
+                f"{client['latency_ms']:.0f}",
+                client["underruns"],
+                client["packets_lost"],
+            )
+            if name in shown:
+                tree.item(name, values=values)
+                shown.discard(name)
+            else:
+                tree.insert("", tk.END, iid=name, values=values)
+        for name in shown:
+            tree.delete(name)
+
+    def clear_levels(self):
+        if self.levels_job is not None:
+            self.root.after_cancel(self.levels_job)
+            self.levels_job = None
+        self.mix_meter.show(LevelBar.FLOOR_DB, LevelBar.FLOOR_DB)
+        self.mix_level_var.set("")
+        self.clip_label.config(text="")
+        self.mix_clipped = 0
+        self.clip_until = 0
+        self.levels_tree.delete(*self.levels_tree.get_children())
 
     def center_window(self):
         self.root.update_idletasks()
@@ -320,18 +605,22 @@ class AudioReceiverApp:
         self.root.geometry(f"{width}x{height}+{x}+{y}")
 
     def start_receiver(self):
+        # Already imported by load_audio
+        from engine import AudioReceiver
+        from ioprocess import ProcessReceiver
+        from relay import parse_target
+
         host = self.host_entry.get().strip()
         port = self.port_entry.get().strip()
         rate = self.rate_var.get()
         channels = self.channels_var.get()
+        latency_ms = self.selected_latency_ms()
+        output = self.selected_output()
+        output_path = self.output_path_entry.get().strip() or None
+        leveling = self.leveling_var.get()
+        relay_targets = self.relay_entry.get().replace(",", " ").split()
 
-        # Get selected device
-        device_idx = None
-        if self.audio_devices and self.device_var.get():
-            for idx, name in self.audio_devices:
-                if name == self.device_var.get():
-                    device_idx = idx
-                    break
+        device = self.selected_devices()
 
         # Validate inputs
         if not host:
@@ -346,13 +635,45 @@ class AudioReceiverApp:
             messagebox.showerror("Error", "Please enter a valid port number (1-65535)")
             return
 
+        if output in ("file", "pipe") and not output_path:
+            messagebox.showerror("Error", "Please enter an output file or FIFO path")
+            return
+
+        try:
+            for target in relay_targets:
+                parse_target(target)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+
+        if isinstance(device, list) and self.process_var.get():
+            messagebox.showerror(
+                "Error", "A separate receive process plays on a single device"
+            )
+            return
+
+        # A child process keeps Tk from stalling the network path
+        receiver_class = ProcessReceiver if self.process_var.get() else AudioReceiver
         try:
-            self.receiver = AudioReceiver(
+            self.receiver = receiver_class(
                 host=host,
                 port=port,
                 sample_rate=rate,
                 channels=channels,
-                device=device_idx,
+                device=device,
+                latency_ms=latency_ms,
+                drift_compensation=self.drift_var.get(),
+                transport=self.transport_var.get(),
+                output=output,
+                output_path=output_path,
+                gate_db=-50 if leveling else None,
+                agc_db=-20 if leveling else None,
+                limiter_db=-1 if leveling else None,
+                output_gain_db=self.selected_gain_db(),
+                socket_profile=(
+                    "low-latency" if self.low_latency_var.get() else "default"
+                ),
+                relay_targets=relay_targets,
             )
 
             self.receiver_thread = Thread(target=self.receiver.start, daemon=True)
@@ -360,8 +681,12 @@ class AudioReceiverApp:
 
             self.is_running = True
             self.start_button.config(state=tk.DISABLED)
+            self.refresh_button.config(state=tk.DISABLED)
             self.stop_button.config(state=tk.NORMAL)
-            self.status_var.set(f"Receiver running on {host}:{port}")
+            self.status_var.set(
+                f"Receiver running on {host}:{port} ({self.transport_var.get()})"
+            )
+            self.poll_levels()
 
         except Exception as e:
             messagebox.showerror("Error", f"Failed to start receiver: {str(e)}")
@@ -370,7 +695,7 @@ class AudioReceiverApp:
     def stop_receiver(self):
         if self.receiver and self.is_running:
             try:
-                self.receiver.shutdown_event.set()
+                self.receiver.stop()
                 if self.receiver_thread:
                     self.receiver_thread.join(timeout=2)
                 self.reset_ui()
@@ -378,10 +703,12 @@ class AudioReceiverApp:
                 messagebox.showerror("Error", f"Failed to stop receiver: {str(e)}")
 
     def reset_ui(self):
+        self.clear_levels()
         self.is_running = False
         self.receiver = None
         self.receiver_thread = None
         self.start_button.config(state=tk.NORMAL)
+        self.refresh_button.config(state=tk.NORMAL)
         self.stop_button.config(state=tk.DISABLED)
         self.status_var.set("Ready")
 
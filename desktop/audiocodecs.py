@@ -0,0 +1,251 @@
+import struct
+
+import numpy as np
+
+
+def _ulaw_table():
+    codes = ~np.arange(256, dtype=np.int32) & 0xFF
+    exponent = (codes >> 4) & 0x07
+    mantissa = codes & 0x0F
+    magnitude = (((mantissa << 3) + 0x84) << exponent) - 0x84
+    return np.where(codes & 0x80, -magnitude, magnitude).astype(np.int16)
+
+
+# G.711 mu-law code -> linear int16
+ULAW_TABLE = _ulaw_table()
+
+IMA_INDEX_TABLE = np.array(
+    [-1, -1, -1, -1, 2, 4, 6, 8, -1, -1, -1, -1, 2, 4, 6, 8], dtype=np.int32
+)
+IMA_STEP_TABLE = np.array(
+    [
+        7, 8, 9, 10, 11, 12, 13, 14, 16, 17, 19, 21, 23, 25, 28, 31, 34, 37,
+        41, 45, 50, 55, 60, 66, 73, 80, 88, 97, 107, 118, 130, 143, 157, 173,
+        190, 209, 230, 253, 279, 307, 337, 371, 408, 449, 494, 544, 598, 658,
+        724, 796, 876, 963, 1060, 1166, 1282, 1411, 1552, 1707, 1878, 2066,
+        2272, 2499, 2749, 3024, 3327, 3660, 4026, 4428, 4871, 5358, 5894,
+        6484, 7132, 7845, 8630, 9493, 10442, 11487, 12635, 13899, 15289,
+        16818, 18500, 20350, 22385, 24623, 27086, 29794, 32767,
+    ],
+    dtype=np.int32,
+)  # fmt: skip
+
+# Per-channel IMA block header: predictor, step index, reserved
+IMA_BLOCK_HEADER = struct.Struct("<hBB")
+# Per-frame capture time of timestamped TCP streams, in microseconds
+TIMESTAMP = struct.Struct("!Q")
+
+
+def clamped_cumsum(start, deltas, lo, hi):
+    """Running ``x = clip(x + delta, lo, hi)`` along the last axis, vectorized
+
+    Clamped addition steps compose into functions of the same shape
+    (``clip(x + a, low, high)``), so the sequence is evaluated with a parallel
+    prefix scan in log2(n) numpy passes instead of a Python loop per sample.
+    Returns the value after every step.
+    """
+    a = deltas.astype(np.int64)
+    low = np.full(a.shape, lo, dtype=np.int64)
+    high = np.full(a.shape, hi, dtype=np.int64)
+    d = 1
+    while d < a.shape[-1]:
+        # Compose each step with the one d positions earlier
+        cur_a, cur_low, cur_high = a[..., d:], low[..., d:], high[..., d:]
+        new_low = np.clip(low[..., :-d] + cur_a, cur_low, cur_high)
+        new_high = np.clip(high[..., :-d] + cur_a, cur_low, cur_high)
+        new_a = a[..., :-d] + cur_a
+        a[..., d:], low[..., d:], high[..., d:] = new_a, new_low, new_high
+        d *= 2
+    return np.clip(np.asarray(start)[..., None] + a, low, high)
+
+
+class StreamDecoder:
+    """Base for decoders fed from a byte stream in whole units
+
+    ``write_view``/``commit`` mirror PCMRingBuffer so the network loop can
+    ``recv_into`` a preallocated staging area; ``commit`` returns the PCM
+    decoded from every complete unit and keeps any partial unit.
+    """
+
+    unit_bytes = 1
+    unit_frames = 1
+    # Optional dsp.ProcessingChain run on everything decoded
+    chain = None
+    # Capture time of the newest frame in the last decode, if the stream has them
+    last_timestamp_us = None
+
+    def __init__(self, channels, units=8):
+        self.channels = channels
+        self.max_output_frames = units * self.unit_frames
+        self._staging = bytearray(units * self.unit_bytes)
+        self._view = memoryview(self._staging)
+        self._fill = 0
+
+    def write_view(self):
+        return self._view[self._fill :]
+
+    def commit(self, nbytes):
+        self._fill += nbytes
+        usable = self._fill - self._fill % self.unit_bytes
+        pcm = self.convert(self._view[:usable])
+        leftover = self._fill - usable
+        self._staging[:leftover] = self._staging[usable : self._fill]
+        self._fill = leftover
+        return pcm
+
+    def convert(self, data):
+        """Decode ``data`` and run the processing chain, if any"""
+        pcm = self.decode(data)
+        if self.chain is not None:
+            pcm = self.chain.process(pcm)
+        return pcm
+
+    def decode(self, data):
+        """Decode all complete units in ``data`` to (frames, channels) int16"""
+        raise NotImplementedError
+
+
+class PcmDecoder(StreamDecoder):
+    """Uncompressed PCM, staged only so a processing chain can run on it"""
+
+    def __init__(self, channels, frame_samples, dtype=np.int16):
+        self.dtype = np.dtype(dtype)
+        self.unit_bytes = channels * self.dtype.itemsize
+        super().__init__(channels, units=frame_samples * 4)
+
+    def decode(self, data):
+        usable = len(data) // self.unit_bytes * self.channels
+        return np.frombuffer(data, dtype=self.dtype, count=usable).reshape(
+            -1, self.channels
+        )
+
+
+class MuLawDecoder(StreamDecoder):
+    """G.711 mu-law, one byte per sample, decoded with a lookup table"""
+
+    def __init__(self, channels, frame_samples):
+        self.unit_bytes = channels
+        super().__init__(channels, units=frame_samples * 4)
+
+    def decode(self, data):
+        usable = len(data) - len(data) % self.unit_bytes
+        codes = np.frombuffer(data, dtype=np.uint8, count=usable)
+        return ULAW_TABLE[codes].reshape(-1, self.channels)
+
+
+class ImaAdpcmDecoder(StreamDecoder):
+    """IMA-ADPCM in self-contained blocks of one frame each
+
+    A block starts with a 4-byte header per channel (little-endian int16
+    predictor, step index, reserved byte), followed by the channels'
+    4-bit codes interleaved in 4-byte groups of 8 samples, low nibble
+    first, as in WAV IMA-ADPCM. Each block decodes to ``frame_samples``
+    rounded up to a multiple of 8 frames; the header predictor is the
+    starting state and is not itself played. Every block is independent,
+    so a block lost over UDP does not corrupt the next one.
+    """
+
+    def __init__(self, channels, frame_samples):
+        self.unit_frames = block_samples(frame_samples)
+        self.unit_bytes = ima_block_bytes(channels, frame_samples)
+        super().__init__(channels, units=4)
+
+    def decode(self, data):
+        blocks = len(data) // self.unit_bytes
+        if not blocks:
+            return np.zeros((0, self.channels), dtype=np.int16)
+        raw = np.frombuffer(data, dtype=np.uint8, count=blocks * self.unit_bytes)
+        raw = raw.reshape(blocks, self.unit_bytes)
+        channels = self.channels
+        samples = self.unit_frames
+
+        header = raw[:, : 4 * channels].reshape(blocks, channels, 4)
+        predictor = header[:, :, :2].copy().view("<i2")[..., 0].astype(np.int64)
+        index = np.minimum(header[:, :, 2], 88).astype(np.int64)
+
+        # (blocks, groups, channels, 4 bytes) -> (blocks, channels, samples)
+        body = raw[:, 4 * channels :].reshape(blocks, -1, channels, 4)
+        body = body.transpose(0, 2, 1, 3).reshape(blocks, channels, -1)
+        codes = np.empty((blocks, channels, samples), dtype=np.int32)
+        codes[..., 0::2] = body & 0x0F
+        codes[..., 1::2] = body >> 4
+
+        # Step index before each code, then the step size it selects
+        after = clamped_cumsum(index, IMA_INDEX_TABLE[codes], 0, 88)
+        before = np.concatenate((index[..., None], after[..., :-1]), axis=-1)
+        step = IMA_STEP_TABLE[before]
+
+        diff = step >> 3
+        diff += np.where(codes & 4, step, 0)
+        diff += np.where(codes & 2, step >> 1, 0)
+        diff += np.where(codes & 1, step >> 2, 0)
+        diff = np.where(codes & 8, -diff, diff)
+
+        pcm = clamped_cumsum(predictor, diff, -32768, 32767).astype(np.int16)
+        # (blocks, channels, samples) -> (frames, channels)
+        return pcm.transpose(0, 2, 1).reshape(-1, channels)
+
+
+class TimestampedDecoder(StreamDecoder):
+    """Strips the capture timestamp sent before each frame of a TCP stream
+
+    Each unit is a big-endian uint64 (microseconds) followed by one frame
+    of the ``inner`` decoder's format. Payloads are gathered into a
+    scratch buffer and decoded together; the newest timestamp is kept in
+    ``last_timestamp_us``.
+    """
+
+    def __init__(self, inner, frame_samples):
+        self.inner = inner
+        inner_units = -(-frame_samples // inner.unit_frames)
+        self.payload_bytes = inner.unit_bytes * inner_units
+        self.unit_bytes = TIMESTAMP.size + self.payload_bytes
+        self.unit_frames = inner.unit_frames * inner_units
+        super().__init__(inner.channels, units=4)
+        self._payload = np.zeros(len(self._staging), dtype=np.uint8)
+
+    def decode(self, data):
+        units = len(data) // self.unit_bytes
+        if not units:
+            self.last_timestamp_us = None
+            return self.inner.decode(b"")
+        raw = np.frombuffer(data, dtype=np.uint8, count=units * self.unit_bytes)
+        raw = raw.reshape(units, self.unit_bytes)
+        self.last_timestamp_us = TIMESTAMP.unpack_from(raw[-1])[0]
+        if units * self.payload_bytes > len(self._payload):
+            self._payload = np.zeros(units * self.payload_bytes, dtype=np.uint8)
+        payload = self._payload[: units * self.payload_bytes]
+        payload.reshape(units, self.payload_bytes)[:] = raw[:, TIMESTAMP.size :]
+        return self.inner.decode(memoryview(payload))
+
+
+def block_samples(frame_samples):
+    return (frame_samples + 7) // 8 * 8
+
+
+def ima_block_bytes(channels, frame_samples):
+    return channels * (4 + block_samples(frame_samples) // 2)
+
+
+DECODERS = {
+    "ulaw": MuLawDecoder,
+    "ima-adpcm": ImaAdpcmDecoder,
+}
+
+
+def make_decoder(session, chain=None, timestamps=False):
+    """Decoder for a session's codec, optional chain and frame timestamps
+
+    Returns None for plain PCM with neither, which is received straight
+    into the ring buffer.
+    """
+    if session.codec is not None:
+        decoder = DECODERS[session.codec](session.channels, session.frame_samples)
+    elif chain is not None or timestamps:
+        decoder = PcmDecoder(session.channels, session.frame_samples, session.dtype)
+    else:
+        return None
+    if timestamps:
+        decoder = TimestampedDecoder(decoder, session.frame_samples)
+    decoder.chain = chain
+    return decoder
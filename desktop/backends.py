@@ -0,0 +1,255 @@
+import os
+import struct
+import sys
+import time
+from threading import Thread, Event
+
+import numpy as np
+
+try:
+    import sounddevice as sd
+except (ImportError, OSError):
+    sd = None
+
+# RIFF header with a 16-byte fmt chunk; sizes are patched when the file closes
+WAV_HEADER = struct.Struct("<4sI4s4sIHHIIHH4sI")
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+
+
+def wav_header(sample_rate, channels, dtype, data_bytes):
+    """Canonical 44-byte WAV header; float dtypes are tagged IEEE float"""
+    dtype = np.dtype(dtype)
+    fmt = WAVE_FORMAT_IEEE_FLOAT if dtype.kind == "f" else WAVE_FORMAT_PCM
+    align = dtype.itemsize * channels
+    data_bytes = min(data_bytes, 0xFFFFFFFF - WAV_HEADER.size)
+    return WAV_HEADER.pack(
+        b"RIFF",
+        WAV_HEADER.size - 8 + data_bytes,
+        b"WAVE",
+        b"fmt ",
+        16,
+        fmt,
+        channels,
+        sample_rate,
+        sample_rate * align,
+        align,
+        dtype.itemsize * 8,
+        b"data",
+        data_bytes,
+    )
+
+
+class ClockedStream:
+    """Output stream pulled by a timer instead of a sound card
+
+    Mirrors the parts of ``sd.OutputStream`` AudioReceiver uses. A thread
+    calls ``callback`` once per block on an absolute schedule derived from
+    the block count, so sleep jitter never accumulates into drift. When the
+    thread falls more than a block behind (e.g. the machine stalled), the
+    next callback gets an ``output underflow`` status and the schedule
+    restarts instead of catching up with a burst of calls.
+    """
+
+    def __init__(
+        self, device, samplerate, channels, dtype, callback, blocksize, target=None
+    ):
+        self.samplerate = samplerate
+        self.channels = channels
+        self.dtype = np.dtype(dtype)
+        self.callback = callback
+        self.blocksize = blocksize
+        self.target = target
+        self._out = np.zeros((blocksize, channels), dtype=self.dtype)
+        self._stop = Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def close(self):
+        pass
+
+    def run(self):
+        period = self.blocksize / self.samplerate
+        origin = time.perf_counter()
+        blocks = 0
+        status = None
+        while not self._stop.is_set():
+            self.tick(status)
+            status = None
+            blocks += 1
+            delay = origin + blocks * period - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -period:
+                status = "output underflow"
+                origin = time.perf_counter()
+                blocks = 0
+
+    def tick(self, status):
+        """Pull one block from the callback and hand it to ``write``"""
+        self.callback(self._out, self.blocksize, None, status)
+        self.write(self._out)
+
+    def write(self, block):
+        pass
+
+
+class NullStream(ClockedStream):
+    """Discards the audio; useful for CI and for relays with no local output"""
+
+
+class FileStream(ClockedStream):
+    """Writes the output to a WAV file, or raw PCM for any other extension"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wav = self.target.lower().endswith(".wav")
+        self.data_bytes = 0
+        self.file = open(self.target, "wb")
+        if self.wav:
+            self.file.write(self.wav_header())
+
+    def wav_header(self):
+        return wav_header(self.samplerate, self.channels, self.dtype, self.data_bytes)
+
+    def write(self, block):
+        self.file.write(block)
+        self.data_bytes += block.nbytes
+
+    def close(self):
+        if self.file.closed:
+            return
+        if self.wav:
+            self.file.seek(0)
+            self.file.write(self.wav_header())
+        self.file.close()
+
+
+class PipeStream(ClockedStream):
+    """Writes raw interleaved PCM to stdout (``-``) or a FIFO
+
+    Suitable for ``ffmpeg -f s16le -ar 48000 -ac 1 -i -`` and the like.
+    Opening a FIFO blocks until a reader opens it. If the reader goes away
+    the stream keeps running so playback bookkeeping continues, but the
+    audio is dropped.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.file = None
+        self.broken = False
+
+    def start(self):
+        if self.file is None:
+            if self.target in (None, "-"):
+                self.file = sys.stdout.buffer
+            else:
+                self.file = open(self.target, "wb", buffering=0)
+        super().start()
+
+    def write(self, block):
+        if self.broken:
+            return
+        try:
+            self.file.write(block)
+            self.file.flush()
+        except (BrokenPipeError, ValueError):
+            self.broken = True
+
+    def close(self):
+        if self.file is not None and self.file is not sys.stdout.buffer:
+            try:
+                self.file.close()
+            except BrokenPipeError:
+                pass
+        self.file = None
+
+
+def sounddevice_stream(**kwargs):
+    if sd is None:
+        raise RuntimeError("sounddevice is not available")
+    return sd.OutputStream(**kwargs)
+
+
+def native_format(device=None):
+    """Default sample rate and channel count (at most stereo) of an output device"""
+    if sd is None:
+        raise RuntimeError("sounddevice is not available")
+    info = sd.query_devices(device, "output")
+    return int(info["default_samplerate"]), min(info["max_output_channels"], 2)
+
+
+_output_devices = None
+
+
+def output_devices(refresh=False):
+    """``(index, "name (host API)")`` for each output device, cached
+
+    One ``query_devices()`` call lists every device. PortAudio only scans
+    for devices when it initializes, so ``refresh`` restarts it to pick up
+    cards plugged in since; no stream may be open while it does.
+    """
+    global _output_devices
+    if sd is None:
+        raise RuntimeError("sounddevice is not available")
+    if refresh:
+        sd._terminate()
+        sd._initialize()
+    if refresh or _output_devices is None:
+        host_apis = sd.query_hostapis()
+        _output_devices = [
+            (idx, f"{device['name']} ({host_apis[device['hostapi']]['name']})")
+            for idx, device in enumerate(sd.query_devices())
+            if device["max_output_channels"] > 0
+        ]
+    return _output_devices
+
+
+BACKENDS = {
+    "sounddevice": None,
+    "file": FileStream,
+    "pipe": PipeStream,
+    "null": NullStream,
+}
+
+
+def numbered_path(path, n):
+    """``out.wav`` -> ``out-2.wav`` for the second file of a run"""
+    if n < 2:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}-{n}{ext}"
+
+
+def make_stream_factory(backend, target=None):
+    """Callable with ``sd.OutputStream``'s keyword signature for a backend
+
+    The receiver reopens its stream when a sender changes the format, so
+    the file backend numbers each new file rather than truncating the
+    previous one.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown output backend: {backend}")
+    if backend == "sounddevice":
+        return sounddevice_stream
+    if backend == "file" and not target:
+        raise ValueError("The file output needs a path")
+    opened = 0
+
+    def factory(**kwargs):
+        nonlocal opened
+        opened += 1
+        path = numbered_path(target, opened) if backend == "file" else target
+        return BACKENDS[backend](target=path, **kwargs)
+
+    return factory
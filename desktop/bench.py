@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+"""Headless loopback benchmark for AudioReceiver
+
+Runs the receiver against a synthetic sender on localhost and a null output
+stream clocked by a timer instead of a sound card (see backends.py), then
+reports glitches, latency and callback cost. Every sample of sender frame
+``k`` carries the value ``k % 32000 + 1``, so the sink can tell exactly
+which frame it is playing, and silence (0) marks padding.
+
+    python bench.py --duration 10 --jitter-ms 15 --latency-ms 60
+    python bench.py --transport udp --loss 0.02 --burst-every-s 3 --burst-ms 150
+    python bench.py --compare-profiles --jitter-ms 5
+    python bench.py --latency-ms 60 --reconnect-every-s 2
+"""
+
+import argparse
+import json
+import logging
+import socket
+import time
+from threading import Thread
+
+import numpy as np
+
+from backends import NullStream
+from netprofile import PROFILES
+from engine import LOG_FORMAT, AudioReceiver
+from session import SessionInfo
+from udp import PACKET_HEADER
+
+FRAME_ID_MODULO = 32000
+
+
+class AnalyzingStream(NullStream):
+    """Null output that also measures what the receiver plays
+
+    It records how long each callback took and which sender frames it
+    played (and when), for the report. Blocks and padding are counted from
+    the first audio to the last; the silence after the sender finishes is
+    not an underrun.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.callback_times = []
+        self.blocks = 0
+        self.padded_samples = 0
+        self.underrun_blocks = 0
+        self.first_played = {}
+        self._started_audio = False
+        # Silence since the last audio, counted only if more audio follows
+        self._pending_blocks = 0
+        self._pending_underruns = 0
+        self._pending_samples = 0
+
+    def tick(self, status):
+        start = time.perf_counter()
+        super().tick(status)
+        self.callback_times.append(time.perf_counter() - start)
+        self.analyze(self._out[:, 0], start)
+
+    def analyze(self, block, played_at):
+        audio = np.flatnonzero(block)
+        if not len(audio):
+            if self._started_audio:
+                self._pending_blocks += 1
+                self._pending_underruns += 1
+                self._pending_samples += len(block)
+            return
+        self._started_audio = True
+        # The silence before this audio was an underrun after all
+        self.blocks += self._pending_blocks + 1
+        self.underrun_blocks += self._pending_underruns
+        self.padded_samples += self._pending_samples
+        last = int(audio[-1])
+        gaps = last + 1 - len(audio)
+        trailing = len(block) - 1 - last
+        if gaps:
+            self.padded_samples += gaps
+            self.underrun_blocks += 1
+        self._pending_blocks = 0
+        self._pending_underruns = int(bool(trailing and not gaps))
+        self._pending_samples = trailing
+
+        ids, first = np.unique(block[audio], return_index=True)
+        offsets = audio[first]
+        for frame_id, offset in zip(ids.tolist(), offsets.tolist()):
+            if frame_id not in self.first_played:
+                self.first_played[frame_id] = played_at + offset / self.samplerate
+
+
+class SyntheticSender:
+    """Sends numbered frames on a schedule with jitter, bursts and loss"""
+
+    def __init__(self, args, frame_samples):
+        self.args = args
+        self.frame_samples = frame_samples
+        self.frame_s = frame_samples / args.rate
+        frames = int(args.duration / self.frame_s)
+        rng = np.random.default_rng(args.seed)
+
+        # Ideal capture times, stretched by the sender's clock skew
+        capture = np.arange(frames) * self.frame_s * (1 - args.skew_ppm * 1e-6)
+        send = (
+            capture
+            + self.frame_s
+            + rng.exponential(args.jitter_ms / 1000, frames) * (args.jitter_ms > 0)
+        )
+        if args.burst_every_s and args.burst_ms:
+            # Stall the link periodically, then release everything at once
+            phase = np.mod(send, args.burst_every_s)
+            stalled = (phase > args.burst_every_s - args.burst_ms / 1000) & (
+                send > args.burst_every_s
+            )
+            send[stalled] += args.burst_every_s - phase[stalled]
+
+        self.capture = capture
+        self.lost = np.zeros(frames, dtype=bool)
+        if args.transport == "udp":
+            self.lost = rng.random(frames) < args.loss
+            self.order = np.argsort(send, kind="stable")
+        else:
+            # A byte stream cannot reorder; late frames hold back later ones
+            send = np.maximum.accumulate(send)
+            self.order = np.arange(frames)
+        self.send = send
+
+        # Reconnecting senders declare their format and, unless told not
+        # to, a session ID the receiver can resume them by
+        self.header = None
+        self.reconnects = 0
+        if args.reconnect_every_s:
+            session_id = 0 if args.no_session_id else int(rng.integers(1, 2**63))
+            self.header = SessionInfo(
+                args.rate,
+                args.channels,
+                frame_us=int(args.frame_ms * 1000),
+                session_id=session_id,
+            ).pack()
+
+    def frame(self, k):
+        value = k % FRAME_ID_MODULO + 1
+        return np.full(self.frame_samples * self.args.channels, value, dtype=np.int16)
+
+    def connect(self):
+        self.addr = ("127.0.0.1", self.args.port)
+        if self.args.transport == "udp":
+            # A new socket sends from a new port, as after a Wi-Fi roam
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            if self.header:
+                self.sock.sendto(self.header, self.addr)
+        else:
+            self.sock = socket.create_connection(self.addr)
+            if self.header:
+                self.sock.sendall(self.header)
+
+    def run(self, start):
+        udp = self.args.transport == "udp"
+        every = self.args.reconnect_every_s
+        reconnect_at = every
+        for k in self.order.tolist():
+            delay = start + self.send[k] - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            if every and self.send[k] >= reconnect_at:
+                self.sock.close()
+                self.connect()
+                self.reconnects += 1
+                reconnect_at += every
+            if self.lost[k]:
+                continue
+            payload = self.frame(k).tobytes()
+            if udp:
+                timestamp_us = int((start + self.capture[k]) * 1e6)
+                self.sock.sendto(
+                    PACKET_HEADER.pack(k, timestamp_us) + payload, self.addr
+                )
+            else:
+                self.sock.sendall(payload)
+
+    def close(self):
+        self.sock.close()
+
+
+def percentiles(values, points=(50, 95, 99)):
+    if not len(values):
+        return {}
+    result = {f"p{p}": round(float(np.percentile(values, p)), 3) for p in points}
+    result["max"] = round(float(np.max(values)), 3)
+    return result
+
+
+def run(args):
+    frame_samples = int(args.rate * args.frame_ms / 1000)
+    streams = []
+
+    def stream_factory(**kwargs):
+        stream = AnalyzingStream(**kwargs)
+        streams.append(stream)
+        return stream
+
+    receiver = AudioReceiver(
+        port=args.port,
+        sample_rate=args.rate,
+        channels=args.channels,
+        latency_ms=args.latency_ms,
+        max_latency_ms=args.max_latency_ms,
+        drift_compensation=args.drift_comp,
+        transport=args.transport,
+        stream_factory=stream_factory,
+        socket_profile=args.socket_profile,
+    )
+    if not args.verbose:
+        logging.getLogger("AudioReceiver").setLevel(logging.WARNING)
+
+    receiver_thread = Thread(target=receiver.start)
+    receiver_thread.start()
+    time.sleep(0.2)
+
+    sender = SyntheticSender(args, frame_samples)
+    sender.connect()
+    start = time.perf_counter()
+    sender.run(start)
+    # Let buffered audio play out before collecting results
+    time.sleep(0.5 + (args.max_latency_ms or args.latency_ms or 400) / 1000)
+    stats = receiver.stats()
+    sender.close()
+    receiver.stop()
+    receiver_thread.join()
+
+    sink = streams[-1]
+    sent = len(sender.capture) - int(sender.lost.sum())
+    latencies = []
+    for k, capture in enumerate(sender.capture.tolist()):
+        # Concealment repeats the previous frame, so skip frames never sent
+        played = sink.first_played.get(k % FRAME_ID_MODULO + 1)
+        if played is not None and not sender.lost[k]:
+            latencies.append((played - (start + capture)) * 1000)
+    callback_us = np.array(sink.callback_times) * 1e6
+    budget_us = sink.blocksize / sink.samplerate * 1e6
+
+    return {
+        "config": dict(vars(args)),
+        "frames_sent": sent,
+        "frames_lost_on_link": int(sender.lost.sum()),
+        "sender_reconnects": sender.reconnects,
+        "frames_played": len(latencies),
+        "frames_dropped": sent - len(latencies),
+        "padded_samples": sink.padded_samples,
+        "underrun_blocks": sink.underrun_blocks,
+        "blocks": sink.blocks,
+        "latency_ms": percentiles(latencies),
+        "callback_us": percentiles(callback_us),
+        "callback_budget_us": round(budget_us),
+        "receiver": stats,
+    }
+
+
+def read_cost(chunk_bytes, reads=20000):
+    """Microseconds per read with ``recv`` and with ``recv_into``
+
+    ``recv`` returns a new bytes object for every read, which is what the
+    receiver avoids by reading straight into its ring buffer; both loops
+    include the same send, so the difference is the allocation and copy.
+    """
+    payload = bytes(chunk_bytes)
+    view = memoryview(bytearray(chunk_bytes))
+    costs = {}
+    a, b = socket.socketpair()
+    with a, b:
+        for mode in ("recv", "recv_into"):
+            start = time.perf_counter()
+            for _ in range(reads):
+                a.sendall(payload)
+                if mode == "recv":
+                    b.recv(chunk_bytes)
+                else:
+                    b.recv_into(view)
+            costs[mode] = round((time.perf_counter() - start) / reads * 1e6, 2)
+    return costs
+
+
+def compare_profiles(args):
+    """Run the same scenario once per socket profile"""
+    reports = {}
+    for profile in PROFILES:
+        args.socket_profile = profile
+        reports[profile] = run(args)
+    frame_bytes = int(args.rate * args.frame_ms / 1000) * args.channels * 2
+    return {"profiles": reports, "read_us": read_cost(frame_bytes)}
+
+
+def print_report(report):
+    latency = report["latency_ms"]
+    callback = report["callback_us"]
+    print(
+        f"frames sent/played/dropped: {report['frames_sent']}/"
+        f"{report['frames_played']}/{report['frames_dropped']} "
+        f"(lost on link: {report['frames_lost_on_link']})"
+    )
+    print(
+        f"underrun blocks: {report['underrun_blocks']}/{report['blocks']}, "
+        f"padded samples: {report['padded_samples']}"
+    )
+    if latency:
+        print(
+            f"end-to-end latency ms: p50 {latency['p50']}, p95 {latency['p95']}, "
+            f"p99 {latency['p99']}, max {latency['max']}"
+        )
+    if callback:
+        print(
+            f"callback us: p50 {callback['p50']}, p99 {callback['p99']}, "
+            f"max {callback['max']} (budget {report['callback_budget_us']})"
+        )
+    if report["sender_reconnects"]:
+        print(
+            f"sender reconnects: {report['sender_reconnects']}, "
+            f"resumed: {report['receiver']['resumes']}"
+        )
+    for name, stats in report["receiver"]["clients"].items():
+        print(f"{name}: {stats}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="AudioReceiver loopback benchmark")
+    parser.add_argument("--port", type=int, default=5555, help="Loopback port")
+    parser.add_argument("--transport", default="tcp", choices=["tcp", "udp"])
+    parser.add_argument("--rate", type=int, default=48000, help="Sample rate")
+    parser.add_argument("--channels", type=int, default=1, choices=[1, 2])
+    parser.add_argument("--duration", type=float, default=10, help="Seconds to send")
+    parser.add_argument("--frame-ms", type=float, default=20, help="Sender frame size")
+    parser.add_argument(
+        "--jitter-ms", type=float, default=0, help="Mean extra network delay"
+    )
+    parser.add_argument(
+        "--burst-every-s", type=float, default=0, help="Stall the link this often"
+    )
+    parser.add_argument(
+        "--burst-ms", type=float, default=0, help="Length of each stall"
+    )
+    parser.add_argument(
+        "--loss", type=float, default=0, help="UDP packet loss probability"
+    )
+    parser.add_argument(
+        "--skew-ppm", type=float, default=0, help="Sender clock speed offset"
+    )
+    parser.add_argument("--latency-ms", type=int, help="Receiver jitter buffer target")
+    parser.add_argument("--max-latency-ms", type=int, help="Receiver latency cap")
+    parser.add_argument("--drift-comp", action="store_true")
+    parser.add_argument("--socket-profile", choices=PROFILES, default="default")
+    parser.add_argument(
+        "--compare-profiles",
+        action="store_true",
+        help="Run once per socket profile and time recv() against recv_into()",
+    )
+    parser.add_argument(
+        "--reconnect-every-s",
+        type=float,
+        default=0,
+        help="Reconnect the sender this often (UDP: switch source port)",
+    )
+    parser.add_argument(
+        "--no-session-id",
+        action="store_true",
+        help="Reconnect as a new sender instead of resuming the session",
+    )
+    parser.add_argument("--seed", type=int, default=1, help="Random seed")
+    parser.add_argument("--json", action="store_true", help="Print a JSON report")
+    parser.add_argument("--verbose", action="store_true", help="Show receiver logs")
+    args = parser.parse_args()
+    # Logs go to stderr, leaving stdout to the report
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
+
+    if args.compare_profiles:
+        comparison = compare_profiles(args)
+        if args.json:
+            print(json.dumps(comparison, indent=2))
+        else:
+            for profile, report in comparison["profiles"].items():
+                print(f"== {profile} socket profile")
+                print_report(report)
+            read = comparison["read_us"]
+            print(
+                f"== one frame per read: recv() {read['recv']} us, "
+                f"recv_into() {read['recv_into']} us"
+            )
+    else:
+        report = run(args)
+        if args.json:
+            print(json.dumps(report, indent=2))
+        else:
+            print_report(report)
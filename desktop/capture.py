@@ -0,0 +1,166 @@
+import json
+import queue
+import struct
+import time
+from threading import Thread
+
+MAGIC = b"FMCAP\0"
+VERSION = 1
+# Magic, version, length of the JSON metadata that follows
+FILE_HEADER = struct.Struct("<6sBI")
+# Microseconds since the capture started, stream ID, kind, payload length
+RECORD = struct.Struct("<QIBI")
+
+# Record kinds: a TCP connection opens (payload "host:port"), delivers a
+# chunk as returned by one recv_into(), or closes; or a UDP datagram
+# arrives (the first one from each address follows an OPEN)
+OPEN = 0
+DATA = 1
+CLOSE = 2
+DATAGRAM = 3
+
+
+class CaptureWriter:
+    """Logs every chunk the network thread receives, for replay.py
+
+    The network thread stamps each chunk with the monotonic clock and
+    queues a copy; a writer thread appends it to the file, so capturing
+    adds no disk I/O to the receive path. If the disk falls more than
+    ``max_backlog_bytes`` behind, records are dropped and counted, and a
+    replay of the file is incomplete. ``metadata`` describes the
+    receiver's settings so the replay can start from the same ones.
+    """
+
+    def __init__(self, path, metadata, max_backlog_bytes=64 * 1024 * 1024, logger=None):
+        self.path = path
+        self.max_backlog_bytes = max_backlog_bytes
+        self.logger = logger
+        self.file = open(path, "wb")
+        header = json.dumps(metadata).encode()
+        self.file.write(FILE_HEADER.pack(MAGIC, VERSION, len(header)) + header)
+
+        # Written by the network thread
+        self.records = 0
+        self.queued_bytes = 0
+        self.dropped_records = 0
+        # Written by the writer thread
+        self.written_bytes = 0
+        self.error = None
+
+        self._origin_ns = time.monotonic_ns()
+        # Stream ID of each connection or UDP sender address
+        self._ids = {}
+        self._next_id = 1
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+
+    def open(self, key, addr):
+        stream = self._ids[key] = self._next_id
+        self._next_id += 1
+        self.put(stream, OPEN, f"{addr[0]}:{addr[1]}".encode())
+
+    def data(self, key, chunk):
+        self.put(self._ids[key], DATA, chunk)
+
+    def close(self, key):
+        stream = self._ids.pop(key, None)
+        if stream is not None:
+            self.put(stream, CLOSE, b"")
+
+    def datagram(self, addr, datagram):
+        if addr not in self._ids:
+            self.open(addr, addr)
+        self.put(self._ids[addr], DATAGRAM, datagram)
+
+    def put(self, stream, kind, payload):
+        """Queue one record; never blocks"""
+        if self.queued_bytes - self.written_bytes > self.max_backlog_bytes:
+            self.dropped_records += 1
+            return
+        t_us = (time.monotonic_ns() - self._origin_ns) // 1000
+        record = RECORD.pack(t_us, stream, kind, len(payload)) + payload
+        self.queued_bytes += len(record)
+        self.records += 1
+        self._queue.put(record)
+
+    def start(self):
+        self._thread = Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Write out everything queued so far and close the file"""
+        self._queue.put(None)
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.file.close()
+        if self.logger:
+            self.logger.info(f"Captured {self.records} records to {self.path}")
+            if self.dropped_records:
+                self.logger.warning(
+                    f"{self.dropped_records} records missing from the capture"
+                )
+
+    def run(self):
+        while True:
+            record = self._queue.get()
+            if record is None:
+                return
+            if self.error is not None:
+                continue
+            try:
+                self.file.write(record)
+            except OSError as e:
+                # Keep draining so the network thread just counts drops
+                self.error = e
+                if self.logger:
+                    self.logger.error(f"Capture stopped: {e}")
+                continue
+            self.written_bytes += len(record)
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "records": self.records,
+            "dropped_records": self.dropped_records,
+            "queue_bytes": self.queued_bytes - self.written_bytes,
+        }
+
+
+class CaptureReader:
+    """Iterates a capture file as ``(seconds, stream, kind, payload)``
+
+    A record cut short by a crash ends the iteration.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        header = self.file.read(FILE_HEADER.size)
+        if len(header) < FILE_HEADER.size:
+            self.file.close()
+            raise ValueError(f"{path} is not a capture file")
+        magic, version, length = FILE_HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION:
+            self.file.close()
+            raise ValueError(f"{path} is not a version {VERSION} capture file")
+        self.metadata = json.loads(self.file.read(length))
+
+    def __iter__(self):
+        while True:
+            header = self.file.read(RECORD.size)
+            if len(header) < RECORD.size:
+                return
+            t_us, stream, kind, length = RECORD.unpack(header)
+            payload = self.file.read(length)
+            if len(payload) < length:
+                return
+            yield t_us / 1e6, stream, kind, payload
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
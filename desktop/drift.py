@@ -0,0 +1,106 @@
+import numpy as np
+
+
+class DriftCompensator:
+    """Hold a ring buffer at its target depth with a variable-ratio resampler
+
+    The sender's capture clock and the sound card never run at exactly the
+    same rate, so the buffer slowly drains or fills. The compensator low-pass
+    filters the fill level seen by each callback, turns the deviation from
+    the target into a playback ratio with a PI controller, and reads the
+    ring through a linear-interpolating resampler at that ratio. The
+    integral term converges on the clock mismatch and is reported as
+    ``drift_ppm``.
+
+    Install it with ``ring.resampler = DriftCompensator(...)``; it then
+    serves every ``ring.read_into`` call.
+    """
+
+    MAX_PPM = 2000
+    # Fill level smoothing and controller gains (per second of error)
+    FILL_TAU_S = 2.0
+    KP = 0.01
+    KI = 0.0002
+
+    def __init__(self, sample_rate, channels, blocksize, target_frames):
+        self.sample_rate = sample_rate
+        self.blocksize = blocksize
+        self.target_frames = target_frames
+        self.ratio = 1.0
+        self.drift = 0.0
+        self.avg_fill = float(target_frames)
+        self.resampled_blocks = 0
+        self.bypassed_blocks = 0
+        self._phase = 0.0
+        self._alpha = blocksize / (sample_rate * self.FILL_TAU_S)
+
+        # Scratch arrays sized for blocks up to twice the nominal size
+        max_out = blocksize * 2
+        max_in = int(max_out * (1 + self.MAX_PPM * 1e-6)) + 2
+        self._steps = np.arange(max_out, dtype=np.float64)
+        self._pos = np.empty(max_out, dtype=np.float64)
+        self._idx = np.empty(max_out, dtype=np.intp)
+        self._frac = np.empty((max_out, 1), dtype=np.float32)
+        self._in = np.empty((max_in, channels), dtype=np.float32)
+        self._a = np.empty((max_out, channels), dtype=np.float32)
+        self._b = np.empty((max_out, channels), dtype=np.float32)
+
+    def _update_ratio(self, ring, frames):
+        target = getattr(ring, "target_frames", self.target_frames)
+        self.avg_fill += self._alpha * (ring.available() - self.avg_fill)
+        error = (self.avg_fill - target) / self.sample_rate
+        self.drift += self.KI * error * frames / self.sample_rate
+        limit = self.MAX_PPM * 1e-6
+        self.drift = min(max(self.drift, -limit), limit)
+        correction = min(max(self.KP * error + self.drift, -limit), limit)
+        self.ratio = 1.0 + correction
+
+    def read_into(self, ring, out):
+        frames = len(out)
+        self._update_ratio(ring, frames)
+
+        needed = int(self._phase + (frames - 1) * self.ratio) + 2
+        if frames > len(self._pos) or ring.available() < needed:
+            # Not enough audio to interpolate; play what is there unchanged
+            self._phase = 0.0
+            self.bypassed_blocks += 1
+            return ring.copy_into(out)
+
+        inbuf = self._in[:needed]
+        ring.peek_into(inbuf, needed)
+
+        pos = self._pos[:frames]
+        idx = self._idx[:frames]
+        frac = self._frac[:frames]
+        np.multiply(self._steps[:frames], self.ratio, out=pos)
+        pos += self._phase
+        idx[:] = pos
+        np.subtract(pos, idx, out=frac[:, 0], casting="unsafe")
+
+        a = self._a[:frames]
+        b = self._b[:frames]
+        np.take(inbuf, idx, axis=0, out=a)
+        idx += 1
+        np.take(inbuf, idx, axis=0, out=b)
+        b -= a
+        b *= frac
+        a += b
+        if out.dtype.kind == "i":
+            np.rint(a, out=a)
+        out[:] = a
+
+        end = self._phase + frames * self.ratio
+        consumed = int(end)
+        ring.advance(consumed)
+        self._phase = end - consumed
+        self.resampled_blocks += 1
+        return frames
+
+    def stats(self):
+        return {
+            "drift_ppm": round(self.drift * 1e6, 1),
+            "ratio": round(self.ratio, 6),
+            "avg_fill_ms": round(self.avg_fill * 1000 / self.sample_rate, 1),
+            "resampled_blocks": self.resampled_blocks,
+            "bypassed_blocks": self.bypassed_blocks,
+        }
@@ -0,0 +1,378 @@
+import math
+
+import numpy as np
+
+
+def db_to_gain(db):
+    return 10 ** (db / 20)
+
+
+def gain_to_db(gain):
+    return 20 * math.log10(max(gain, 1e-10))
+
+
+def full_scale(dtype):
+    """Magnitude that corresponds to 0 dBFS for a sample format"""
+    dtype = np.dtype(dtype)
+    if dtype.kind == "i":
+        return float(-np.iinfo(dtype).min)
+    return 1.0
+
+
+class Processor:
+    """Base for in-place processors of float32 (frames, channels) blocks
+
+    Samples are scaled so full scale is 1.0. Levels are measured across
+    all channels together so the stereo image does not shift. Gain
+    changes are ramped linearly over the block to avoid zipper noise.
+    """
+
+    def __init__(self, sample_rate):
+        self.sample_rate = sample_rate
+        self._index = np.zeros(0, dtype=np.float32)
+        self._ramp = np.zeros(0, dtype=np.float32)
+
+    def process(self, block):
+        raise NotImplementedError
+
+    def stats(self):
+        return {}
+
+    def smoothing(self, frames, time_ms):
+        """Fraction of the way to a new value covered in ``frames``"""
+        if time_ms <= 0:
+            return 1.0
+        return 1 - math.exp(-frames * 1000 / (time_ms * self.sample_rate))
+
+    def ramp(self, start, end, frames):
+        """Gains moving linearly from ``start`` to ``end`` over the block"""
+        if frames > len(self._index):
+            self._index = np.arange(1, frames + 1, dtype=np.float32)
+            self._ramp = np.empty(frames, dtype=np.float32)
+        ramp = self._ramp[:frames]
+        np.multiply(self._index[:frames], (end - start) / frames, out=ramp)
+        ramp += start
+        return ramp
+
+    def apply_gain(self, block, start, end):
+        if start == end:
+            if start != 1.0:
+                block *= start
+            return
+        block *= self.ramp(start, end, len(block))[:, None]
+
+
+def block_rms(block):
+    flat = block.reshape(-1)
+    if not len(flat):
+        return 0.0
+    return math.sqrt(float(np.dot(flat, flat)) / len(flat))
+
+
+def level_db(level, floor_db=-120.0):
+    # Adding 0.0 turns the -0.0 of a full-scale int16 peak into 0.0
+    return round(max(gain_to_db(level), floor_db), 1) + 0.0
+
+
+class LevelMeter:
+    """Peak and RMS of a stream, published once per ``window_s``
+
+    ``observe`` runs on the audio thread and only copies each block into
+    a preallocated float32 window. Once the window holds ``window_s`` of
+    audio, three reductions over it give the peak and RMS, and a new
+    ``snapshot`` tuple is swapped in (peak and RMS relative to full
+    scale, windows that clipped so far, windows so far). Any thread may
+    read the snapshot without a lock.
+    """
+
+    def __init__(self, sample_rate, window_s=0.05):
+        self.window_frames = max(1, round(sample_rate * window_s))
+        self.snapshot = (0.0, 0.0, 0, 0)
+        self._window = np.zeros(0, dtype=np.float32)
+        self._filled = 0
+        self._frames = 0
+        self._scale = 1.0
+        self._clip = 1.0
+        self._clipped = 0
+        self._windows = 0
+
+    def _allocate(self, block):
+        # Room for a full window plus the block that completes it
+        frames = self.window_frames + len(block)
+        self._window = np.zeros(frames * block.size // len(block), dtype=np.float32)
+        self._filled = 0
+        self._frames = 0
+        self._scale = full_scale(block.dtype)
+        # Integer formats clip one step short of full scale
+        self._clip = self._scale - 1 if block.dtype.kind == "i" else 1.0
+
+    def observe(self, block):
+        samples = block.size
+        if not samples:
+            return
+        end = self._filled + samples
+        if end > len(self._window):
+            self._allocate(block)
+            end = samples
+        np.copyto(self._window[self._filled : end], block.reshape(-1), casting="unsafe")
+        self._filled = end
+        self._frames += len(block)
+        if self._frames >= self.window_frames:
+            self._publish()
+
+    def _publish(self):
+        window = self._window[: self._filled]
+        peak = max(float(window.max()), -float(window.min()))
+        if peak >= self._clip:
+            self._clipped += 1
+        rms = math.sqrt(float(np.dot(window, window)) / len(window))
+        self._windows += 1
+        self.snapshot = (
+            peak / self._scale,
+            rms / self._scale,
+            self._clipped,
+            self._windows,
+        )
+        self._filled = 0
+        self._frames = 0
+
+    def read(self):
+        """The latest window in dBFS, and how many windows clipped"""
+        peak, rms, clipped, _ = self.snapshot
+        return {
+            "peak_dbfs": level_db(peak),
+            "rms_dbfs": level_db(rms),
+            "clipped_windows": clipped,
+        }
+
+
+class Gain(Processor):
+    """Fixed make-up gain"""
+
+    def __init__(self, sample_rate, gain_db=0.0):
+        super().__init__(sample_rate)
+        self.gain = db_to_gain(gain_db)
+
+    def process(self, block):
+        if self.gain != 1.0:
+            block *= self.gain
+
+
+class NoiseGate(Processor):
+    """Mutes background noise between phrases
+
+    Opens when the block RMS rises above ``threshold_db`` and closes once
+    it has stayed below ``threshold_db - hysteresis_db`` for ``hold_ms``.
+    """
+
+    def __init__(
+        self,
+        sample_rate,
+        threshold_db=-50.0,
+        hysteresis_db=6.0,
+        attack_ms=2.0,
+        hold_ms=150.0,
+        release_ms=100.0,
+        floor_db=-80.0,
+    ):
+        super().__init__(sample_rate)
+        self.open_level = db_to_gain(threshold_db)
+        self.close_level = db_to_gain(threshold_db - hysteresis_db)
+        self.attack_ms = attack_ms
+        self.hold_frames = int(hold_ms * sample_rate / 1000)
+        self.release_ms = release_ms
+        self.floor = db_to_gain(floor_db)
+        self.gain = self.floor
+        self.is_open = False
+        self._quiet_frames = 0
+
+    def process(self, block):
+        frames = len(block)
+        level = block_rms(block)
+        if level >= self.open_level:
+            self.is_open = True
+            self._quiet_frames = 0
+        elif level < self.close_level and self.is_open:
+            self._quiet_frames += frames
+            if self._quiet_frames > self.hold_frames:
+                self.is_open = False
+
+        if self.is_open:
+            target, time_ms = 1.0, self.attack_ms
+        else:
+            target, time_ms = self.floor, self.release_ms
+        start = self.gain
+        self.gain += (target - start) * self.smoothing(frames, time_ms)
+        self.apply_gain(block, start, self.gain)
+
+    def stats(self):
+        return {"gate_open": self.is_open}
+
+
+class AutoGain(Processor):
+    """Automatic gain control toward a target RMS level
+
+    Cuts quickly (``attack_ms``) and boosts slowly (``release_ms``), within
+    ``max_gain_db``/``max_cut_db``. Adaptation freezes below ``floor_db``
+    so pauses and gated silence are not boosted into noise.
+    """
+
+    def __init__(
+        self,
+        sample_rate,
+        target_db=-20.0,
+        max_gain_db=24.0,
+        max_cut_db=12.0,
+        attack_ms=50.0,
+        release_ms=1500.0,
+        floor_db=-55.0,
+    ):
+        super().__init__(sample_rate)
+        self.target_db = target_db
+        self.max_gain_db = max_gain_db
+        self.max_cut_db = max_cut_db
+        self.attack_ms = attack_ms
+        self.release_ms = release_ms
+        self.floor = db_to_gain(floor_db)
+        self.gain_db = 0.0
+        self.gain = 1.0
+
+    def process(self, block):
+        frames = len(block)
+        level = block_rms(block)
+        if level > self.floor:
+            desired = min(
+                max(self.target_db - gain_to_db(level), -self.max_cut_db),
+                self.max_gain_db,
+            )
+            time_ms = self.attack_ms if desired < self.gain_db else self.release_ms
+            self.gain_db += (desired - self.gain_db) * self.smoothing(frames, time_ms)
+        start = self.gain
+        self.gain = db_to_gain(self.gain_db)
+        self.apply_gain(block, start, self.gain)
+
+    def stats(self):
+        return {"agc_gain_db": round(self.gain_db, 1)}
+
+
+class Limiter(Processor):
+    """Brickwall peak limiter with instant attack and exponential release
+
+    The gain at each sample is the lowest of the gain that sample needs
+    to stay under the ceiling and every earlier reduction relaxing
+    toward unity. With ``r`` the reduction, that is
+    ``max_j(r_j * exp(-(i - j) / tau))``, which factors into a running
+    maximum over ``r_j * exp(j / tau)``, so the whole block is a handful
+    of vectorized passes and no sample ever exceeds the ceiling.
+    ``full_scale`` lets it run directly on integer-scaled mix buffers.
+    """
+
+    def __init__(self, sample_rate, ceiling_db=-1.0, release_ms=80.0, full_scale=1.0):
+        super().__init__(sample_rate)
+        self.ceiling = db_to_gain(ceiling_db) * full_scale
+        # Samples per e-fold of release
+        self.release_tau = release_ms * sample_rate / 1000
+        self.reduction = 0.0
+        self._allocate(0, 1)
+
+    def _allocate(self, frames, channels):
+        # Keep exp(frames / tau) finite in float64 for very short releases
+        self.tau = max(self.release_tau, frames / 600, 1.0)
+        steps = np.arange(frames, dtype=np.float64)
+        self._grow = np.exp(steps / self.tau)
+        self._decay = np.exp(-steps / self.tau)
+        self._abs = np.empty((frames, channels), dtype=np.float32)
+        self._peak = np.empty(frames, dtype=np.float32)
+        self._cut = np.empty(frames, dtype=np.float64)
+        self._gain = np.empty(frames, dtype=np.float32)
+
+    def process(self, block):
+        frames = len(block)
+        if not frames:
+            return
+        if self._abs.shape != block.shape:
+            self._allocate(*block.shape)
+        peak, cut = self._peak, self._cut
+
+        np.abs(block, out=self._abs)
+        np.max(self._abs, axis=1, out=peak)
+        np.maximum(peak, self.ceiling, out=peak)
+        # Reduction each sample needs: 1 - ceiling / peak
+        np.divide(self.ceiling, peak, out=cut)
+        np.subtract(1.0, cut, out=cut)
+        cut *= self._grow
+        cut[0] = max(cut[0], self.reduction * math.exp(-1 / self.tau))
+        np.maximum.accumulate(cut, out=cut)
+        cut *= self._decay
+        self.reduction = float(cut[-1])
+        if cut.any():
+            np.subtract(1.0, cut, out=self._gain)
+            block *= self._gain[:, None]
+
+
+class ProcessingChain:
+    """Runs processors over int16 or float32 PCM
+
+    Input is converted once into a preallocated float32 scratch block and
+    the result written back into a preallocated output array of the same
+    dtype, which stays valid until the next call.
+    """
+
+    def __init__(self, processors, channels, dtype=np.int16):
+        self.processors = list(processors)
+        self.channels = channels
+        self.dtype = np.dtype(dtype)
+        self.full_scale = full_scale(self.dtype)
+        if self.dtype.kind == "i":
+            info = np.iinfo(self.dtype)
+            self._limits = (info.min, info.max)
+        else:
+            self._limits = (-1.0, 1.0)
+        self._allocate(0)
+
+    def _allocate(self, frames):
+        self._work = np.zeros((frames, self.channels), dtype=np.float32)
+        self._out = np.zeros((frames, self.channels), dtype=self.dtype)
+
+    def process(self, pcm):
+        frames = len(pcm)
+        if frames > len(self._work):
+            self._allocate(frames)
+        work = self._work[:frames]
+        out = self._out[:frames]
+        np.multiply(pcm, 1 / self.full_scale, out=work)
+        for processor in self.processors:
+            processor.process(work)
+        if self.dtype.kind == "i":
+            work *= self.full_scale
+            np.rint(work, out=work)
+        np.clip(work, *self._limits, out=work)
+        out[:] = work
+        return out
+
+    def stats(self):
+        stats = {}
+        for processor in self.processors:
+            stats.update(processor.stats())
+        return stats
+
+
+def make_chain(
+    sample_rate,
+    channels,
+    dtype=np.int16,
+    gain_db=0.0,
+    gate_db=None,
+    agc_db=None,
+):
+    """Per-sender chain for the given settings, or None if nothing is enabled"""
+    processors = []
+    if gain_db:
+        processors.append(Gain(sample_rate, gain_db))
+    if gate_db is not None:
+        processors.append(NoiseGate(sample_rate, threshold_db=gate_db))
+    if agc_db is not None:
+        processors.append(AutoGain(sample_rate, target_db=agc_db))
+    if not processors:
+        return None
+    return ProcessingChain(processors, channels, dtype)
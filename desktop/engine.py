@@ -0,0 +1,1350 @@
+import json
+import logging
+import queue
+import selectors
+import socket
+import time
+from concurrent.futures import Future
+from threading import Thread, Event, current_thread
+
+from ringbuffer import PCMRingBuffer
+from jitterbuffer import JitterBuffer
+from drift import DriftCompensator
+from udp import MAX_DATAGRAM, PacketReorderer
+from mixer import Client, Mixer
+from session import SessionInfo, HEADER_PREFIX, header_length, parse_header
+from audiocodecs import make_decoder
+from backends import make_stream_factory, native_format
+from recorder import Recorder
+from capture import CaptureWriter
+from relay import Relay, parse_target
+from multiout import MultiDeviceOutput
+from resample import FormatConverter
+from dsp import LevelMeter, Limiter, db_to_gain, full_scale, make_chain
+from latency import RecentValues
+from netprofile import SocketProfile
+from metrics import (
+    CALLBACK_BUCKETS_S,
+    Counter,
+    EventLog,
+    Histogram,
+    MetricsServer,
+    prometheus_text,
+)
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+
+class AudioReceiver:
+    """Mixes every sender and plays the mix; the core behind both front ends
+
+    ``start`` runs until ``stop``; ``stats`` and ``reconfigure`` may be
+    called from any thread meanwhile. Logging and signal handling are
+    left to the front end.
+    """
+
+    # Seconds without datagrams before a UDP sender is dropped from the mix
+    UDP_IDLE_TIMEOUT = 5
+    # Seconds without data before a TCP peer is taken for dead; senders
+    # stream continuously, so this is far sooner than TCP would notice
+    TCP_IDLE_TIMEOUT = 2
+    # How long a departed sender's place is kept for it to resume
+    RESUME_WINDOW_S = 30
+    # Settings reconfigure() can change while running
+    RECONFIGURABLE = ("device", "latency_ms", "max_latency_ms", "output_gain_db")
+    RECONFIGURE_TIMEOUT_S = 5
+
+    def __init__(
+        self,
+        host="0.0.0.0",
+        port=5555,
+        sample_rate=44100,
+        channels=1,
+        device=None,
+        latency_ms=None,
+        max_latency_ms=None,
+        drift_compensation=False,
+        transport="tcp",
+        max_clients=8,
+        codec=None,
+        output="sounddevice",
+        output_path=None,
+        stream_factory=None,
+        record_path=None,
+        record_max_mb=None,
+        record_max_minutes=None,
+        input_gain_db=0.0,
+        gate_db=None,
+        agc_db=None,
+        limiter_db=None,
+        output_gain_db=0.0,
+        metrics_port=None,
+        metrics_host="127.0.0.1",
+        stats_interval=None,
+        calibrate_s=None,
+        socket_profile="default",
+        relay_targets=None,
+        relay_max_lag_ms=200,
+        resample_to_device=True,
+        capture_path=None,
+    ):
+        self.host = host
+        self.port = port
+        self.transport = transport
+        self.set_devices(device)
+        self.extra_outputs = None
+        self.output = output
+        # Callable with sd.OutputStream's signature (see backends.py)
+        self.stream_factory = stream_factory or make_stream_factory(output, output_path)
+        # Open sound devices at their native format and convert in-process
+        self.resample_to_device = (
+            resample_to_device and output == "sounddevice" and stream_factory is None
+        )
+        self.output_session = None
+        self.converter = None
+        # Level of the played mix, replaced with each output stream
+        self.mix_levels = None
+        # Level processing: per sender in the network thread, limiter on the mix
+        self.input_gain_db = input_gain_db
+        self.gate_db = gate_db
+        self.agc_db = agc_db
+        self.limiter_db = limiter_db
+        self.output_gain_db = output_gain_db
+        # Raw PCM senders are assumed to match the configured format
+        self.default_session = SessionInfo(sample_rate, channels, codec=codec)
+        self.use_session(self.default_session)
+        self.latency_ms = latency_ms
+        self.max_latency_ms = max_latency_ms
+        self.drift_compensation = drift_compensation
+        self.max_clients = max_clients
+        session = self.default_session
+        self.socket_profile = SocketProfile(
+            socket_profile,
+            session.frame_samples * session.channels * session.dtype.itemsize,
+        )
+        # Fail early on invalid buffer settings rather than on first connect
+        self.make_buffer()
+        self._logged_targets = {}
+        self._last_drift_report = time.monotonic()
+        self.shutdown_event = Event()
+        self.stream = None
+        self.network = None
+        # Tee of the played mix into WAV files (see recorder.py)
+        self.record_path = record_path
+        self.record_max_bytes = record_max_mb and int(record_max_mb * 1024 * 1024)
+        self.record_max_seconds = record_max_minutes and record_max_minutes * 60
+        self.recorder = None
+        self._logged_record_drops = 0
+        # Downstream receivers the played mix is forwarded to (see relay.py)
+        self.relay_targets = list(relay_targets or ())
+        for target in self.relay_targets:
+            parse_target(target)
+        self.relay_max_lag_ms = relay_max_lag_ms
+        self.relay = None
+        # Log of every received chunk for replay.py (see capture.py)
+        self.capture_path = capture_path
+        self.capture = None
+        # Writing to this pair wakes the network loop for an immediate stop
+        self._wakeup_recv, self._wakeup_send = socket.socketpair()
+        # (function, Future) pairs the network thread runs for other threads
+        self._commands = queue.SimpleQueue()
+        self._connections = {}
+        self._handshakes = {}
+        # Last time each TCP connection was read from
+        self._last_read = {}
+        # Session ID -> client, kept for RESUME_WINDOW_S after it leaves
+        self._sessions = {}
+        self._udp_senders = {}
+        self._udp_rejected = {}
+        self._datagram = bytearray(MAX_DATAGRAM)
+        # Session headers are read into this before being gathered per connection
+        self._handshake_scratch = memoryview(bytearray(256))
+        self._paused = {}
+        self._draining = []
+
+        # Each metric has one writing thread, so none of them takes a lock
+        self.started_at = time.monotonic()
+        self.callback_duration = Histogram(CALLBACK_BUCKETS_S)
+        self.stream_status_events = Counter()
+        self.connections = Counter()
+        self.reconnects = Counter()
+        self.resumes = Counter()
+        self.rejections = Counter()
+        self._departed_hosts = set()
+        self.metrics_port = metrics_port
+        self.metrics_host = metrics_host
+        self.metrics_server = None
+        # Seconds between JSON stats lines in the log (None disables them)
+        self.stats_interval = stats_interval
+        self._last_stats_line = time.monotonic()
+        # Output DAC time minus callback time, as reported by PortAudio
+        self.device_latency = RecentValues()
+        # Seconds of sender timestamps to gather before the calibration report
+        self.calibrate_s = calibrate_s
+        self.logger = logging.getLogger("AudioReceiver")
+
+        # The audio callback must not log; it queues events for report_stats
+        self.events = EventLog(self.logger)
+
+    def signal_handler(self, signum, frame):
+        """Handle shutdown signals"""
+        self.logger.info(f"Received signal {signum}, shutting down...")
+        self.stop()
+
+    def stop(self):
+        """Request shutdown and wake the network loop"""
+        self.shutdown_event.set()
+        self.wake()
+
+    def wake(self):
+        try:
+            self._wakeup_send.send(b"\0")
+        except OSError:
+            pass
+
+    def set_devices(self, device):
+        # A list of devices plays on all of them; the first one sets the pace
+        devices = list(device) if isinstance(device, (list, tuple)) else [device]
+        self.device = devices[0]
+        self.extra_devices = devices[1:]
+
+    def reconfigure(self, **changes):
+        """Change RECONFIGURABLE settings while running, keeping every sender
+
+        - ``output_gain_db`` applies from the next block.
+        - ``latency_ms``/``max_latency_ms`` retarget each jitter buffer in
+          place (the maximum again defaults to twice the target). Senders
+          whose buffer cannot follow, because the jitter buffer is switched
+          on or off or the new maximum does not fit, keep their settings
+          until they reconnect.
+        - ``device`` (an ID or a list, as in the constructor) reopens the
+          output streams only; buffers, recordings and relays carry on
+          unless the new device needs another format.
+
+        Runs on the network thread, so it never races a connect or a
+        format change, and returns once applied. Raises ValueError for
+        invalid settings, and whatever opening the new device raised.
+        """
+        unknown = set(changes) - set(self.RECONFIGURABLE)
+        if unknown:
+            raise ValueError(f"Cannot reconfigure {', '.join(sorted(unknown))}")
+        return self.call_in_network_thread(lambda: self.apply_changes(changes))
+
+    def call_in_network_thread(self, function):
+        """Run ``function`` between network events and return its result"""
+        network = self.network
+        if network is None or not network.is_alive() or network is current_thread():
+            return function()
+        future = Future()
+        self._commands.put((function, future))
+        self.wake()
+        return future.result(self.RECONFIGURE_TIMEOUT_S)
+
+    def run_commands(self):
+        while True:
+            try:
+                function, future = self._commands.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                future.set_result(function())
+            except Exception as e:
+                future.set_exception(e)
+
+    def apply_changes(self, changes):
+        if "output_gain_db" in changes:
+            self.output_gain_db = changes["output_gain_db"]
+            self.mixer.gain = db_to_gain(self.output_gain_db)
+        if "latency_ms" in changes or "max_latency_ms" in changes:
+            self.set_latency(
+                changes.get("latency_ms", self.latency_ms),
+                changes.get("max_latency_ms"),
+            )
+        if "device" in changes:
+            self.switch_device(changes["device"])
+
+    def set_latency(self, latency_ms, max_latency_ms=None):
+        previous = self.latency_ms, self.max_latency_ms
+        if (latency_ms, max_latency_ms) == previous:
+            return
+        self.latency_ms, self.max_latency_ms = latency_ms, max_latency_ms
+        try:
+            self.make_buffer()
+        except ValueError:
+            self.latency_ms, self.max_latency_ms = previous
+            raise
+        kept = 0
+        for client in self.mixer.clients:
+            buffer = client.buffer
+            if not (
+                latency_ms
+                and isinstance(buffer, JitterBuffer)
+                and buffer.retarget(latency_ms, max_latency_ms)
+            ):
+                kept += 1
+        setting = f"{latency_ms} ms" if latency_ms else "off"
+        self.logger.info(f"Jitter buffer latency set to {setting}")
+        if kept:
+            self.logger.info(
+                f"{kept} sender(s) keep their buffer settings until they reconnect"
+            )
+
+    def switch_device(self, device):
+        previous = [self.device] + self.extra_devices
+        self.set_devices(device)
+        if [self.device] + self.extra_devices == previous or self.stream is None:
+            return
+        try:
+            self.reopen_output()
+        except Exception:
+            self.logger.error(f"Cannot open device {device}; going back to {previous}")
+            self.set_devices(previous)
+            self.reopen_output()
+            raise
+
+    def reopen_output(self):
+        """Move the output to the current devices, keeping taps if the format allows"""
+        self.close_output()
+        output = self.device_session()
+        current = self.output_session
+        if (output.sample_rate, output.channels) == (
+            current.sample_rate,
+            current.channels,
+        ):
+            self.open_output(current)
+        else:
+            self.close_stream()
+            self.open_stream()
+
+    def callback(self, outdata, frames, time_info, status):
+        start = time.perf_counter()
+        if status:
+            self.stream_status_events.inc()
+            self.events.report("Audio stream status", status)
+        if time_info is not None:
+            device_s = time_info.outputBufferDacTime - time_info.currentTime
+            if 0 <= device_s < 1:
+                self.device_latency.add(device_s)
+
+        converter = self.converter
+        if converter is not None:
+            converter.read_into(outdata)
+        else:
+            self.mixer.mix_into(outdata)
+        self.mix_levels.observe(outdata)
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.write(outdata)
+        relay = self.relay
+        if relay is not None:
+            relay.write(outdata)
+        extra_outputs = self.extra_outputs
+        if extra_outputs is not None:
+            extra_outputs.write(outdata)
+        self.callback_duration.observe(time.perf_counter() - start)
+
+    def use_session(self, session):
+        """Adopt a session's format for the mixer and the next output stream"""
+        self.session = session
+        self.sample_rate = session.sample_rate
+        self.channels = session.channels
+        self.blocksize = session.frame_samples
+        limiter = None
+        if self.limiter_db is not None:
+            limiter = Limiter(
+                self.sample_rate,
+                self.limiter_db,
+                full_scale=full_scale(session.dtype),
+            )
+        self.mixer = Mixer(
+            self.channels,
+            self.blocksize,
+            session.dtype,
+            limiter,
+            gain=db_to_gain(self.output_gain_db),
+        )
+
+    def configure_session(self, session):
+        """Switch the output stream to a sender's format if nobody else is playing
+
+        Returns False when other clients still need the current format.
+        """
+        if session.same_stream(self.session):
+            return True
+        draining = {client for client, _ in self._draining}
+        if any(client not in draining for client in self.mixer.clients):
+            return False
+
+        self._draining.clear()
+        self._logged_targets.clear()
+        self.close_stream()
+        try:
+            self.use_session(session)
+            self.open_stream()
+        except Exception as e:
+            self.logger.error(f"Cannot open output stream for {session}: {e}")
+            self.use_session(self.default_session)
+            self.open_stream()
+            return False
+        return True
+
+    def make_buffer(self):
+        """Create the receive buffer for one client"""
+        if self.latency_ms:
+            buffer = JitterBuffer(
+                self.sample_rate,
+                self.channels,
+                self.blocksize,
+                self.latency_ms,
+                self.max_latency_ms,
+                dtype=self.session.dtype,
+            )
+        else:
+            # Room for 400 ms, the same bound the old 20-chunk queue had
+            buffer = PCMRingBuffer(
+                int(self.sample_rate * 0.4), self.channels, self.session.dtype
+            )
+        if self.drift_compensation:
+            # Without a jitter buffer, steer toward three blocks of audio
+            buffer.resampler = DriftCompensator(
+                self.sample_rate, self.channels, self.blocksize, self.blocksize * 3
+            )
+        return buffer
+
+    def add_client(self, addr, session):
+        client = Client(f"{addr[0]}:{addr[1]}", self.make_buffer(), self.sample_rate)
+        client.session = session
+        chain = make_chain(
+            self.sample_rate,
+            self.channels,
+            session.dtype,
+            gain_db=self.input_gain_db,
+            gate_db=self.gate_db,
+            agc_db=self.agc_db,
+        )
+        client.decoder = self.make_decoder(session, chain)
+        self.mixer.add(client)
+        if session.session_id:
+            self._sessions[session.session_id] = client
+        return client
+
+    def make_decoder(self, session, chain):
+        # UDP packets always carry timestamps; TCP streams only if declared
+        timestamps = session.timestamps and self.transport == "tcp"
+        return make_decoder(session, chain, timestamps)
+
+    def admit(self, addr, session):
+        """Configure the stream for a new sender and create its client"""
+        if len(self.mixer.clients) >= self.max_clients:
+            self.logger.warning(
+                f"Rejecting {addr}: {self.max_clients} clients connected"
+            )
+            self.rejections.inc()
+            return None
+        if not self.configure_session(session):
+            self.logger.warning(
+                f"Rejecting {addr}: sends {session} but the stream runs {self.session}"
+            )
+            self.rejections.inc()
+            return None
+        try:
+            client = self.add_client(addr, session)
+        except ValueError as e:
+            self.logger.warning(f"Rejecting {addr}: {e}")
+            self.rejections.inc()
+            return None
+        if addr[0] in self._departed_hosts:
+            self.reconnects.inc()
+        return client
+
+    def remove_client(self, client):
+        """Let the client's remaining audio play out, then drop it"""
+        now = time.monotonic()
+        deadline = now + client.buffer.capacity_frames / self.sample_rate
+        self._draining.append((client, deadline))
+        self._departed_hosts.add(client.name.rsplit(":", 1)[0])
+        client.departed_at = now
+
+    def returning_client(self, session):
+        """The client a reconnecting sender left behind, if it can take it back"""
+        client = self._sessions.get(session.session_id) if session.session_id else None
+        if client is None:
+            return None
+        if not (
+            session.same_encoding(client.session) and session.same_stream(self.session)
+        ):
+            # A different stream now; it starts over as a new sender
+            del self._sessions[session.session_id]
+            return None
+        return client
+
+    def reclaim(self, client):
+        """Put a returning client back in the mix with its buffer and settings"""
+        self._draining = [entry for entry in self._draining if entry[0] is not client]
+        if client not in self.mixer.clients:
+            self.mixer.add(client)
+        client.departed_at = None
+        self.resumes.inc()
+
+    def resume(self, addr, session):
+        """Hand a reconnecting TCP sender its client back, or None if it is new
+
+        A connection that is still open for the session belongs to a peer
+        that has moved on, so it is closed without waiting for it to time
+        out. Audio left from it is flushed rather than played under the
+        new connection's, while the jitter buffer keeps its learned target.
+        """
+        client = self.returning_client(session)
+        if client is None:
+            return None
+        for conn, owner in list(self._connections.items()):
+            if owner is client:
+                self.close_connection(conn, replaced=True)
+        self.reclaim(client)
+        client.buffer.flush()
+        # Codec state and partial frames belong to the old connection
+        chain = client.decoder.chain if client.decoder is not None else None
+        client.decoder = self.make_decoder(session, chain)
+        client.session = session
+        self.logger.info(f"{addr} resumed {client.name}")
+        return client
+
+    def expire_sessions(self):
+        now = time.monotonic()
+        for session_id, client in list(self._sessions.items()):
+            departed = client.departed_at
+            if departed is not None and now - departed > self.RESUME_WINDOW_S:
+                del self._sessions[session_id]
+
+    def reap_clients(self):
+        """Drop disconnected clients whose audio has finished playing"""
+        now = time.monotonic()
+        for entry in list(self._draining):
+            client, deadline = entry
+            if not client.buffer.available() or now >= deadline:
+                self._draining.remove(entry)
+                self.mixer.remove(client)
+                self._logged_targets.pop(client.name, None)
+
+    def set_client_gain(self, name, gain):
+        """Set the mixing gain of the client with the given name"""
+        for client in self.mixer.clients:
+            if client.name == name:
+                client.gain = gain
+                return True
+        return False
+
+    def network_thread(self):
+        """Serve the listener and every client from one selector loop"""
+        selector = selectors.DefaultSelector()
+        selector.register(self._wakeup_recv, selectors.EVENT_READ, self.on_wakeup)
+        self.selector = selector
+
+        if self.transport == "udp":
+            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            handler = self.on_datagram
+        else:
+            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.socket_profile.apply_listener(s)
+            handler = self.on_accept
+
+        with s:
+            try:
+                s.bind((self.host, self.port))
+                if self.transport == "udp":
+                    self.logger.info(f"Listening for UDP on {self.host}:{self.port}")
+                else:
+                    s.listen(self.max_clients)
+                    self.logger.info(
+                        f"Listening on {self.host}:{self.port} "
+                        f"({self.socket_profile.name} socket profile)"
+                    )
+                s.setblocking(False)
+                selector.register(s, selectors.EVENT_READ, handler)
+
+                while not self.shutdown_event.is_set():
+                    for key, _ in selector.select(self.select_timeout()):
+                        key.data(key.fileobj)
+                    self.housekeeping()
+
+            except Exception as e:
+                if not self.shutdown_event.is_set():
+                    self.logger.error(f"Connection error: {e}")
+            finally:
+                for conn in list(self._connections):
+                    self.close_connection(conn)
+                selector.close()
+                # Anything queued from now on runs on the caller's thread
+                self.run_commands()
+                self.logger.info("Network thread stopping")
+
+    def housekeeping(self):
+        """Timers and deferred work, run after each batch of network events"""
+        self.run_commands()
+        self.resume_paused()
+        self.reap_clients()
+        self.expire_tcp_peers()
+        self.expire_udp_senders()
+        self.expire_sessions()
+
+    def select_timeout(self):
+        """Block until the next event unless something needs polling"""
+        if self._paused:
+            return 0.005
+        if self._draining:
+            return 0.05
+        if self._last_read:
+            return 0.5
+        if self._udp_senders or self._sessions:
+            return 1
+        return None
+
+    def on_wakeup(self, sock):
+        sock.recv(64)
+
+    def on_accept(self, s):
+        try:
+            conn, addr = s.accept()
+        except BlockingIOError:
+            return
+        # The client limit is checked once the header shows whether this
+        # is a sender resuming its session
+        if len(self._handshakes) >= self.max_clients:
+            self.logger.warning(f"Rejecting {addr}: too many pending connections")
+            self.rejections.inc()
+            conn.close()
+            return
+
+        self.logger.info(f"Connected by {addr}")
+        self.connections.inc()
+        if self.capture is not None:
+            self.capture.open(conn, addr)
+        conn.setblocking(False)
+        try:
+            self.socket_profile.apply_connection(conn)
+        except OSError as e:
+            self.logger.warning(f"Cannot tune socket for {addr}: {e}")
+        # The client is created once the optional session header is read
+        self._connections[conn] = None
+        self._handshakes[conn] = (addr, bytearray())
+        self._last_read[conn] = time.monotonic()
+        self.selector.register(conn, selectors.EVENT_READ, self.on_client_data)
+
+    def read_handshake(self, conn):
+        addr, pending = self._handshakes[conn]
+        length = header_length(pending)
+        wanted = (length or HEADER_PREFIX.size) - len(pending)
+        scratch = self._handshake_scratch[: max(wanted, 1)]
+        try:
+            received = conn.recv_into(scratch)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            self.logger.error(f"Network error: {e}")
+            received = 0
+        if not received:
+            self.close_connection(conn)
+            return
+
+        if self.capture is not None:
+            self.capture.data(conn, scratch[:received])
+        self._last_read[conn] = time.monotonic()
+        self.socket_profile.rearm(conn)
+        pending += scratch[:received]
+        length = header_length(pending)
+        if length is None or len(pending) < length:
+            return
+        del self._handshakes[conn]
+        if length == 0:
+            session = self.default_session
+        else:
+            try:
+                session = parse_header(pending[:length])
+            except ValueError as e:
+                self.logger.warning(f"Rejecting {addr}: {e}")
+                self.close_connection(conn)
+                return
+            self.logger.info(f"{addr} declared {session}")
+            del pending[:length]
+
+        client = self.resume(addr, session) or self.admit(addr, session)
+        if client is None:
+            self.close_connection(conn)
+            return
+        self._connections[conn] = client
+        # Bytes read while probing for a header are already stream data
+        if client.decoder is not None:
+            view = client.decoder.write_view()
+            view[: len(pending)] = pending
+            client.buffer.write(client.decoder.commit(len(pending)))
+            self.note_timestamp(client, client.decoder.last_timestamp_us)
+        else:
+            client.buffer.write(pending)
+        client.bytes_received += len(pending)
+
+    def on_client_data(self, conn):
+        client = self._connections[conn]
+        if client is None:
+            self.read_handshake(conn)
+            return
+        if client.decoder is not None:
+            self.read_encoded(conn, client)
+            return
+        view = client.buffer.write_view(self.blocksize * client.buffer.frame_bytes)
+        if not len(view):
+            # Playback is behind; stop reading until the callback drains
+            self.selector.unregister(conn)
+            self._paused[conn] = client
+            client.overruns += 1
+            return
+        try:
+            received = conn.recv_into(view)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            self.logger.error(f"Network error: {e}")
+            received = 0
+        if not received:
+            self.close_connection(conn)
+            return
+        if self.capture is not None:
+            self.capture.data(conn, view[:received])
+        client.buffer.commit_write(received)
+        client.bytes_received += received
+        self._last_read[conn] = time.monotonic()
+        self.socket_profile.rearm(conn)
+
+    def read_encoded(self, conn, client):
+        """Receive compressed data and decode it here, off the audio callback"""
+        buffer = client.buffer
+        decoder = client.decoder
+        room = buffer.free_bytes() // buffer.frame_bytes
+        if room < decoder.max_output_frames and not buffer.drops_when_full:
+            self.selector.unregister(conn)
+            self._paused[conn] = client
+            client.overruns += 1
+            return
+        view = decoder.write_view()
+        try:
+            received = conn.recv_into(view)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            self.logger.error(f"Network error: {e}")
+            received = 0
+        if not received:
+            self.close_connection(conn)
+            return
+        if self.capture is not None:
+            self.capture.data(conn, view[:received])
+        pcm = decoder.commit(received)
+        if buffer.write(pcm) < pcm.nbytes:
+            client.overruns += 1
+        client.bytes_received += received
+        self._last_read[conn] = time.monotonic()
+        self.socket_profile.rearm(conn)
+        self.note_timestamp(client, decoder.last_timestamp_us)
+
+    def note_timestamp(self, client, capture_us):
+        """Feed a frame's sender capture time to the client's latency tracker"""
+        # Zero means the sender does not fill in timestamps
+        if capture_us:
+            client.latency.on_timestamp(capture_us, time.time())
+
+    def resume_paused(self):
+        for conn, client in list(self._paused.items()):
+            needed = 1
+            if client.decoder is not None:
+                needed = client.decoder.max_output_frames * client.buffer.frame_bytes
+            if client.buffer.free_bytes() >= needed:
+                del self._paused[conn]
+                # Not reading was our choice, not the peer's silence
+                self._last_read[conn] = time.monotonic()
+                self.selector.register(conn, selectors.EVENT_READ, self.on_client_data)
+
+    def expire_tcp_peers(self):
+        now = time.monotonic()
+        for conn, last_read in list(self._last_read.items()):
+            if conn not in self._paused and now - last_read > self.TCP_IDLE_TIMEOUT:
+                client = self._connections[conn]
+                name = client.name if client else self._handshakes[conn][0]
+                self.logger.info(
+                    f"{name} sent nothing for {self.TCP_IDLE_TIMEOUT} s; "
+                    "dropping the connection"
+                )
+                self.close_connection(conn)
+
+    def close_connection(self, conn, replaced=False):
+        """Close a TCP connection; unless ``replaced``, its client leaves too"""
+        client = self._connections.pop(conn)
+        handshake = self._handshakes.pop(conn, None)
+        self._last_read.pop(conn, None)
+        if self._paused.pop(conn, None) is None:
+            self.selector.unregister(conn)
+        conn.close()
+        if self.capture is not None:
+            self.capture.close(conn)
+        if client is None:
+            if handshake is not None:
+                self.logger.info(f"Disconnected {handshake[0]}")
+            return
+        client.buffer.discard_partial()
+        if replaced:
+            self.logger.info(f"Dropped the old connection of {client.name}")
+            return
+        self.logger.info(f"Disconnected {client.name}")
+        self.remove_client(client)
+
+    def on_datagram(self, s):
+        try:
+            size, addr = s.recvfrom_into(self._datagram)
+        except BlockingIOError:
+            return
+        datagram = memoryview(self._datagram)[:size]
+        if self.capture is not None:
+            self.capture.datagram(addr, datagram)
+        client = self._udp_senders.get(addr)
+
+        length = header_length(datagram)
+        if length:
+            # A session header datagram (re)starts this sender's stream
+            try:
+                session = parse_header(datagram[:length])
+            except ValueError as e:
+                self.logger.warning(f"Ignoring header from {addr}: {e}")
+                return
+            returning = self.returning_client(session)
+            if returning is not None and returning is not client:
+                self.move_udp_sender(returning, addr)
+                return
+            if client is not None:
+                if session.same_encoding(client.session):
+                    if session.session_id:
+                        # Its first packets may have come before the header
+                        self._sessions[session.session_id] = client
+                    return
+                # A new format or codec needs a new decoder and reorderer
+                del self._udp_senders[addr]
+                self.mixer.remove(client)
+            self.logger.info(f"{addr} declared {session}")
+            self._udp_rejected.pop(addr, None)
+            self.admit_udp_sender(addr, session)
+            return
+
+        if client is None:
+            client = self.admit_udp_sender(addr, self.default_session)
+            if client is None:
+                return
+        client.packets.handle(datagram)
+        client.bytes_received += size
+        client.last_seen = time.monotonic()
+        self.note_timestamp(client, client.packets.last_timestamp_us)
+
+    def admit_udp_sender(self, addr, session):
+        now = time.monotonic()
+        if now - self._udp_rejected.get(addr, -1) < 1:
+            # Retry rejected senders at most once a second
+            return None
+        if len(self._udp_senders) >= self.max_clients:
+            self._udp_rejected[addr] = now
+            return None
+        client = self.admit(addr, session)
+        if client is None:
+            self._udp_rejected[addr] = now
+        else:
+            self._udp_rejected.pop(addr, None)
+            self.logger.info(f"Receiving from {addr}")
+            client.packets = PacketReorderer(client.buffer, decoder=client.decoder)
+            self._udp_senders[addr] = client
+        return client
+
+    def move_udp_sender(self, client, addr):
+        """A sender's session continues from a new address, e.g. after a roam
+
+        Its packet reorderer stays, so the sequence numbers carry on.
+        """
+        for old_addr, owner in list(self._udp_senders.items()):
+            if owner is client:
+                del self._udp_senders[old_addr]
+        provisional = self._udp_senders.pop(addr, None)
+        if provisional is not None:
+            # Packets that arrived before the header were taken for a new sender
+            self.mixer.remove(provisional)
+        self.reclaim(client)
+        client.last_seen = time.monotonic()
+        self._udp_senders[addr] = client
+        self._udp_rejected.pop(addr, None)
+        self.logger.info(f"{addr} resumed {client.name}")
+
+    def expire_udp_senders(self):
+        now = time.monotonic()
+        for addr, client in list(self._udp_senders.items()):
+            if now - client.last_seen > self.UDP_IDLE_TIMEOUT:
+                self.logger.info(f"Sender {addr} went quiet")
+                del self._udp_senders[addr]
+                self.remove_client(client)
+
+    def start(self):
+        try:
+            self.open_stream()
+            if self.capture_path:
+                self.capture = CaptureWriter(
+                    self.capture_path, self.capture_metadata(), logger=self.logger
+                )
+                self.capture.start()
+            if self.metrics_port is not None:
+                self.metrics_server = MetricsServer(
+                    self, self.metrics_host, self.metrics_port
+                )
+                self.metrics_server.start()
+                host, port = self.metrics_server.address
+                self.logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+
+            self.network = Thread(target=self.network_thread)
+            self.network.start()
+
+            # Main loop; returns as soon as shutdown is requested
+            while not self.shutdown_event.wait(1):
+                self.report_stats()
+
+        except Exception as e:
+            self.logger.error(f"Error: {e}")
+        finally:
+            self.cleanup()
+
+    def capture_metadata(self):
+        """Settings replay.py needs to rebuild this receiver"""
+        session = self.default_session
+        return {
+            "started": time.time(),
+            "transport": self.transport,
+            "sample_rate": session.sample_rate,
+            "channels": session.channels,
+            "codec": session.codec,
+            "max_clients": self.max_clients,
+            "latency_ms": self.latency_ms,
+            "max_latency_ms": self.max_latency_ms,
+            "drift_compensation": self.drift_compensation,
+            "input_gain_db": self.input_gain_db,
+            "gate_db": self.gate_db,
+            "agc_db": self.agc_db,
+            "limiter_db": self.limiter_db,
+            "output_gain_db": self.output_gain_db,
+        }
+
+    def device_session(self):
+        """Format to open the output in: the device's own if it differs"""
+        return self.session_for_device(self.device, self.session)
+
+    def session_for_device(self, device, session):
+        """``session``, or the device's own format if it differs"""
+        if not self.resample_to_device:
+            return session
+        try:
+            rate, channels = native_format(device)
+        except Exception as e:
+            self.logger.warning(f"Cannot query the format of device {device}: {e}")
+            return session
+        if (rate, channels) == (session.sample_rate, session.channels):
+            return session
+        return SessionInfo(rate, channels, session.sample_format, session.frame_us)
+
+    def open_stream(self):
+        # Everything downstream of the mix runs in the device's format
+        output = self.output_session = self.device_session()
+        if self.record_path:
+            # A new stream may have a new format, so it gets new files
+            self.recorder = Recorder(
+                self.record_path,
+                output.sample_rate,
+                output.channels,
+                output.dtype,
+                max_bytes=self.record_max_bytes,
+                max_seconds=self.record_max_seconds,
+                logger=self.logger,
+            )
+            self.recorder.start()
+        if self.relay_targets:
+            # Downstream connections restart with the new session header
+            self.relay = Relay(
+                self.relay_targets,
+                output,
+                max_lag_ms=self.relay_max_lag_ms,
+                logger=self.logger,
+            )
+            self.relay.start()
+        self.open_output(output)
+
+    def open_output(self, output):
+        """The streams that play the mix, and its conversion to their format"""
+        self.converter = None
+        if output is not self.session:
+            self.converter = FormatConverter(
+                self.mixer.mix_into,
+                self.sample_rate,
+                self.channels,
+                output.sample_rate,
+                output.channels,
+                self.session.dtype,
+            )
+        self.mix_levels = LevelMeter(output.sample_rate)
+        if self.extra_devices:
+            self.extra_outputs = MultiDeviceOutput(
+                self.extra_devices,
+                output,
+                self.stream_factory,
+                session_for_device=self.session_for_device,
+                logger=self.logger,
+            )
+        self.stream = self.stream_factory(
+            device=self.device,
+            samplerate=output.sample_rate,
+            channels=output.channels,
+            dtype=output.sample_format,
+            callback=self.callback,
+            blocksize=output.frame_samples,
+        )
+        self.stream.start()
+        if self.extra_outputs:
+            self.extra_outputs.start()
+        if self.output == "sounddevice":
+            target = f"device {self.device}"
+            if self.extra_devices:
+                target = f"devices {[self.device] + self.extra_devices}"
+        else:
+            target = f"{self.output} output"
+        self.logger.info(f"Audio stream started on {target} ({self.session})")
+        if self.converter is not None:
+            self.logger.info(
+                f"Converting to the device's {output.sample_rate} Hz, "
+                f"{output.channels} ch"
+            )
+
+    def close_stream(self):
+        self.close_output()
+        if self.recorder:
+            self.recorder.stop()
+            self._logged_record_drops = 0
+            self.recorder = None
+        if self.relay:
+            self.relay.stop()
+            self.relay = None
+
+    def close_output(self):
+        if self.stream:
+            try:
+                self.stream.stop()
+                self.stream.close()
+            except Exception as e:
+                self.logger.error(f"Error stopping stream: {e}")
+            self.stream = None
+        if self.extra_outputs:
+            try:
+                self.extra_outputs.close()
+            except Exception as e:
+                self.logger.error(f"Error stopping extra output streams: {e}")
+            self.extra_outputs = None
+
+    def stats(self):
+        """Snapshot of receiver-wide and per-client metrics (the pull API)"""
+        clients = {}
+        device_s = self.device_latency_s()
+        for client in self.mixer.clients:
+            buffer = client.buffer
+            stats = {
+                "gain": client.gain,
+                "bytes_received": client.bytes_received,
+                "throughput_bps": round(client.throughput.rate),
+                "buffered_ms": round(buffer.available() * 1000 / self.sample_rate, 1),
+                "buffer_depth_s": client.buffer_depth.summary(),
+                "starved_blocks": client.starved_blocks,
+                "overruns": client.overruns,
+            }
+            if isinstance(buffer, JitterBuffer):
+                stats.update(buffer.stats())
+            if buffer.resampler is not None:
+                stats.update(buffer.resampler.stats())
+            if client.packets is not None:
+                stats.update(client.packets.stats())
+            if client.decoder is not None and client.decoder.chain is not None:
+                stats.update(client.decoder.chain.stats())
+            stats["latency"] = client.latency.stats(device_s)
+            clients[client.name] = stats
+        return {
+            "uptime_s": round(time.monotonic() - self.started_at, 1),
+            "session": repr(self.session),
+            "output_session": repr(self.output_session),
+            "socket_profile": self.socket_profile.name,
+            "output_gain_db": self.output_gain_db,
+            "callback_s": self.callback_duration.summary(),
+            "stream_status_events": self.stream_status_events.value,
+            "connections": self.connections.value,
+            "reconnects": self.reconnects.value,
+            "resumes": self.resumes.value,
+            "rejections": self.rejections.value,
+            "recorder": self.recorder.stats() if self.recorder else None,
+            "relay": self.relay.stats() if self.relay else None,
+            "capture": self.capture.stats() if self.capture else None,
+            "extra_devices": (
+                self.extra_outputs.stats() if self.extra_outputs else None
+            ),
+            "device_latency_ms": round(device_s * 1000, 1),
+            "clients": clients,
+        }
+
+    def levels(self):
+        """Meters and counters for a live display, cheap to poll at 20 Hz
+
+        Only reads values their single writer has published, such as the
+        level meters' snapshot tuples, so it never holds up the audio
+        callback or the network thread.
+        """
+        device_s = self.device_latency_s()
+        mix = self.mix_levels
+        clients = {}
+        for client in self.mixer.clients:
+            buffer = client.buffer
+            levels = client.levels.read()
+            levels["buffered_ms"] = round(
+                buffer.available() * 1000 / self.sample_rate, 1
+            )
+            if isinstance(buffer, JitterBuffer):
+                levels["target_ms"] = round(buffer.target_ms(), 1)
+            levels["latency_ms"] = client.latency.total_ms(device_s)
+            levels["underruns"] = client.starved_blocks
+            levels["packets_lost"] = (
+                client.packets.lost if client.packets is not None else 0
+            )
+            clients[client.name] = levels
+        return {
+            "mix": mix.read() if mix is not None else None,
+            "stream_status_events": self.stream_status_events.value,
+            "clients": clients,
+        }
+
+    def device_latency_s(self):
+        """Median output latency of the sound device, 0 if it reports none"""
+        return self.device_latency.percentiles((50,)).get("p50", 0.0)
+
+    def prometheus_text(self):
+        """Metrics in the Prometheus text format, as served on /metrics"""
+        clients = self.mixer.clients
+        families = [
+            (
+                "fastimic_callback_duration_seconds",
+                "histogram",
+                "Time spent in the audio callback",
+                [({}, self.callback_duration)],
+            ),
+            (
+                "fastimic_stream_status_events_total",
+                "counter",
+                "Callbacks flagged with an underflow or other stream status",
+                [({}, self.stream_status_events.value)],
+            ),
+            (
+                "fastimic_connections_total",
+                "counter",
+                "Accepted TCP connections",
+                [({}, self.connections.value)],
+            ),
+            (
+                "fastimic_reconnects_total",
+                "counter",
+                "Clients admitted from a host that had disconnected before",
+                [({}, self.reconnects.value)],
+            ),
+            (
+                "fastimic_resumes_total",
+                "counter",
+                "Senders that reconnected into their previous session",
+                [({}, self.resumes.value)],
+            ),
+            (
+                "fastimic_rejections_total",
+                "counter",
+                "Senders refused because of limits or format mismatches",
+                [({}, self.rejections.value)],
+            ),
+            (
+                "fastimic_clients",
+                "gauge",
+                "Clients currently in the mix",
+                [({}, len(clients))],
+            ),
+        ]
+        recorder = self.recorder
+        if recorder is not None:
+            families += [
+                (
+                    "fastimic_recorded_seconds_total",
+                    "counter",
+                    "Audio written to recordings by the current stream",
+                    [({}, recorder.recorded_frames / recorder.sample_rate)],
+                ),
+                (
+                    "fastimic_record_dropped_frames_total",
+                    "counter",
+                    "Frames lost because the recorder fell behind",
+                    [({}, recorder.dropped_frames)],
+                ),
+            ]
+        relay = self.relay
+        if relay is not None:
+            rate = relay.session.sample_rate * relay.ring.frame_bytes
+            subscribers = relay.subscribers
+            families += [
+                (
+                    "fastimic_relay_sent_seconds_total",
+                    "counter",
+                    "Audio forwarded to each downstream receiver",
+                    [({"target": s.name}, s.sent_bytes / rate) for s in subscribers],
+                ),
+                (
+                    "fastimic_relay_dropped_seconds_total",
+                    "counter",
+                    "Audio a downstream receiver missed by falling behind",
+                    [({"target": s.name}, s.dropped_bytes / rate) for s in subscribers],
+                ),
+                (
+                    "fastimic_relay_disconnects_total",
+                    "counter",
+                    "Downstream connections lost",
+                    [({"target": s.name}, s.disconnects) for s in subscribers],
+                ),
+            ]
+
+        def per_client(name, kind, help_text, value):
+            samples = [({"client": c.name}, value(c)) for c in clients]
+            families.append((name, kind, help_text, samples))
+
+        per_client(
+            "fastimic_client_received_bytes_total",
+            "counter",
+            "Bytes received from the client",
+            lambda c: c.bytes_received,
+        )
+        per_client(
+            "fastimic_client_throughput_bytes_per_second",
+            "gauge",
+            "Receive rate over the last report interval",
+            lambda c: round(c.throughput.rate),
+        )
+        per_client(
+            "fastimic_client_buffered_seconds",
+            "gauge",
+            "Audio queued for playback",
+            lambda c: c.buffer.available() / self.sample_rate,
+        )
+        per_client(
+            "fastimic_client_buffer_depth_seconds",
+            "histogram",
+            "Queued audio seen by each callback",
+            lambda c: c.buffer_depth,
+        )
+        per_client(
+            "fastimic_client_starved_blocks_total",
+            "counter",
+            "Callback blocks padded with silence (underruns)",
+            lambda c: c.starved_blocks,
+        )
+        per_client(
+            "fastimic_client_overruns_total",
+            "counter",
+            "Times the receive buffer was full",
+            lambda c: c.overruns,
+        )
+        device_s = self.device_latency_s()
+        per_client(
+            "fastimic_client_latency_seconds",
+            "gauge",
+            "Median network, buffer and device latency",
+            lambda c: c.latency.stats(device_s)["total_ms"] / 1000,
+        )
+        return prometheus_text(families)
+
+    def report_stats(self):
+        """Log events, buffer changes and drift outside the audio callback"""
+        now = time.monotonic()
+        self.events.flush()
+        for client in self.mixer.clients:
+            client.throughput.update(client.bytes_received)
+        if self.stats_interval and now - self._last_stats_line >= self.stats_interval:
+            self._last_stats_line = now
+            self.logger.info(f"stats {json.dumps(self.stats())}")
+        recorder = self.recorder
+        if recorder is not None and recorder.dropped_frames > self._logged_record_drops:
+            self.logger.warning(
+                f"Recorder fell behind; {recorder.dropped_frames} frames "
+                "missing from the recording"
+            )
+            self._logged_record_drops = recorder.dropped_frames
+
+        if self.calibrate_s:
+            self.report_calibration()
+
+        report_drift = now - self._last_drift_report >= 60
+        if report_drift:
+            self._last_drift_report = now
+
+        for client in self.mixer.clients:
+            buffer = client.buffer
+            if isinstance(buffer, JitterBuffer):
+                target = buffer.target_ms()
+                if target != self._logged_targets.get(client.name):
+                    stats = buffer.stats()
+                    self.logger.info(
+                        f"{client.name}: jitter buffer target {target:.0f} ms "
+                        f"(underruns: {stats['underruns']}, "
+                        f"skipped frames: {stats['skipped_frames']})"
+                    )
+                    self._logged_targets[client.name] = target
+
+            if buffer.resampler is not None and report_drift:
+                stats = buffer.resampler.stats()
+                self.logger.info(
+                    f"{client.name}: clock drift {stats['drift_ppm']} ppm, "
+                    f"ratio {stats['ratio']}, "
+                    f"average fill {stats['avg_fill_ms']} ms"
+                )
+
+    def report_calibration(self):
+        """Once a sender has sent ``calibrate_s`` of timestamps, freeze and log"""
+        now = time.time()
+        for client in self.mixer.clients:
+            latency = client.latency
+            if latency.calibrated or latency.timestamp_span(now) < self.calibrate_s:
+                continue
+            latency.calibrated = True
+            latency.clock.frozen = True
+            stats = latency.stats(self.device_latency_s())
+            network = stats["network_ms"]
+            block_ms = self.blocksize * 1000 / self.sample_rate
+            self.logger.info(
+                f"{client.name}: calibration over {self.calibrate_s:g} s: "
+                f"clock offset {stats.get('clock_offset_ms')} ms, "
+                f"skew {stats['clock_skew_ppm']} ppm, network delay "
+                f"p50/p95/p99 {network['p50']}/{network['p95']}/{network['p99']} ms, "
+                f"device latency {stats['device_ms']} ms"
+            )
+            self.logger.info(
+                f"{client.name}: suggested --latency-ms "
+                f"{latency.recommended_latency_ms(block_ms)}"
+            )
+
+    def cleanup(self):
+        """Clean up resources"""
+        self.stop()
+        if self.network:
+            self.network.join(timeout=2)
+        self.close_stream()
+        if self.capture:
+            self.capture.stop()
+            self.capture = None
+        if self.metrics_server:
+            self.metrics_server.stop()
+            self.metrics_server = None
+        self._wakeup_recv.close()
+        self._wakeup_send.close()
+        self.logger.info("Audio receiver stopped")
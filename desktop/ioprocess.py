@@ -0,0 +1,310 @@
+import logging
+import multiprocessing
+import time
+from threading import Thread, Event, Lock
+
+import numpy as np
+
+from backends import ClockedStream, make_stream_factory
+from engine import LOG_FORMAT, AudioReceiver
+from session import SessionInfo
+from shmring import SharedPCMRing, SharedSnapshot
+
+# Shared ring size, and how far ahead of playback the child mixes
+RING_BLOCKS = 8
+AHEAD_BLOCKS = 2
+STARTUP_TIMEOUT_S = 10
+# How often the child publishes its levels for the parent's display
+LEVELS_INTERVAL_S = 0.05
+# Receiver methods the parent may call through the command channel
+COMMANDS = ("stats", "set_client_gain", "reconfigure")
+
+
+class SharedRingStream(ClockedStream):
+    """Child-side output stream that mixes into the shared ring
+
+    Paced by playback rather than a timer: every quarter block it tops
+    the ring up to ``ahead`` blocks, so the parent's sound card clock
+    drives the receiver exactly as a local stream would.
+    """
+
+    def __init__(self, *args, ring=None, ahead=AHEAD_BLOCKS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.ring = ring
+        self.ahead_frames = ahead * self.blocksize
+
+    def run(self):
+        period = self.blocksize / self.samplerate
+        block_bytes = self._out.nbytes
+        while not self._stop.is_set():
+            while (
+                self.ring.available() < self.ahead_frames
+                and self.ring.free_bytes() >= block_bytes
+            ):
+                self.tick(None)
+            time.sleep(period / 4)
+
+    def write(self, block):
+        self.ring.write(block)
+
+
+def run_io_process(conn, ring_name, capacity_frames, levels_name, settings):
+    """Child process entry point: network, decode and mix into the ring"""
+    # A spawned child starts without the parent's logging setup
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
+    session = SessionInfo(
+        settings["sample_rate"], settings["channels"], codec=settings.get("codec")
+    )
+    ring = SharedPCMRing(capacity_frames, session.channels, session.dtype, ring_name)
+    levels = SharedSnapshot(name=levels_name)
+
+    def stream_factory(samplerate, channels, dtype, **kwargs):
+        if (samplerate, channels, np.dtype(dtype)) != (
+            session.sample_rate,
+            session.channels,
+            session.dtype,
+        ):
+            raise ValueError("The I/O process only plays the configured format")
+        return SharedRingStream(
+            samplerate=samplerate, channels=channels, dtype=dtype, ring=ring, **kwargs
+        )
+
+    receiver = AudioReceiver(
+        output="shared memory", stream_factory=stream_factory, **settings
+    )
+    thread = Thread(target=receiver.start)
+    thread.start()
+    conn.send(("ok", None))
+    levels_failed = False
+    try:
+        while thread.is_alive():
+            try:
+                levels.publish(receiver.levels())
+            except Exception as e:
+                if not levels_failed:
+                    receiver.logger.warning(f"Cannot publish levels: {e}")
+                levels_failed = True
+            if not conn.poll(LEVELS_INTERVAL_S):
+                continue
+            command, args, kwargs = conn.recv()
+            if command == "stop":
+                break
+            try:
+                if command not in COMMANDS:
+                    raise ValueError(f"Unknown command {command!r}")
+                conn.send(("ok", getattr(receiver, command)(*args, **kwargs)))
+            except Exception as e:
+                conn.send(("error", str(e)))
+    except (EOFError, OSError):
+        # The parent went away; shut down with it
+        pass
+    finally:
+        receiver.stop()
+        thread.join()
+        levels.close()
+        ring.close()
+
+
+class ProcessReceiver:
+    """AudioReceiver with networking, decoding and mixing in a child process
+
+    The parent keeps only the output stream, whose callback copies mixed
+    PCM out of a SharedPCMRing, so GUI work holding the GIL cannot stall
+    the network path. The child publishes its levels into a
+    SharedSnapshot every ``LEVELS_INTERVAL_S``, so polling them never
+    touches the pipe; everything else goes through a small command
+    channel (``stats``, ``set_client_gain``, ``reconfigure``, ``stop``).
+    Takes the same arguments as AudioReceiver; ``device`` and the output
+    options apply to the parent's stream, the rest are handed to the
+    child. Senders must use the configured format. Mixing ahead of the
+    callback adds about ``AHEAD_BLOCKS`` blocks of latency.
+    """
+
+    def __init__(
+        self,
+        sample_rate=44100,
+        channels=1,
+        device=None,
+        output="sounddevice",
+        output_path=None,
+        stream_factory=None,
+        **settings,
+    ):
+        self.session = SessionInfo(sample_rate, channels, codec=settings.get("codec"))
+        self.settings = dict(settings, sample_rate=sample_rate, channels=channels)
+        if isinstance(device, (list, tuple)):
+            if len(device) > 1:
+                raise ValueError("The I/O process plays on a single device")
+            device = device[0]
+        self.device = device
+        self.output = output
+        self.stream_factory = stream_factory or make_stream_factory(output, output_path)
+        self.blocksize = self.session.frame_samples
+        self.shutdown_event = Event()
+        self.logger = logging.getLogger("AudioReceiver")
+        self.stream = None
+        self.process = None
+        self.ring = None
+        self.levels_snapshot = None
+        self._conn = None
+        self._lock = Lock()
+        # Keeps the snapshot from being closed while levels() reads it
+        self._levels_lock = Lock()
+        # Written by the audio callback
+        self.playback_underruns = 0
+
+    def callback(self, outdata, frames, time_info, status):
+        if self.ring.copy_into(outdata) < frames:
+            self.playback_underruns += 1
+
+    def start(self):
+        # Spawn rather than fork: the parent runs threads and a GUI
+        context = multiprocessing.get_context("spawn")
+        capacity = RING_BLOCKS * self.blocksize
+        try:
+            self.ring = SharedPCMRing(
+                capacity, self.session.channels, self.session.dtype
+            )
+            self.levels_snapshot = SharedSnapshot()
+            # Commands wait until the child has answered on the pipe
+            with self._lock:
+                self._conn, child_conn = context.Pipe()
+                self.process = context.Process(
+                    target=run_io_process,
+                    args=(
+                        child_conn,
+                        self.ring.name,
+                        capacity,
+                        self.levels_snapshot.name,
+                        self.settings,
+                    ),
+                    daemon=True,
+                )
+                self.process.start()
+                child_conn.close()
+                if not self._conn.poll(STARTUP_TIMEOUT_S):
+                    raise RuntimeError("I/O process did not start")
+                self._conn.recv()
+            self.logger.info(f"I/O process {self.process.pid} started")
+
+            self.open_stream()
+
+            while not self.shutdown_event.wait(1):
+                if not self.process.is_alive():
+                    self.logger.error("I/O process exited")
+                    break
+        except Exception as e:
+            self.logger.error(f"Error: {e}")
+        finally:
+            self.cleanup()
+
+    def open_stream(self):
+        self.stream = self.stream_factory(
+            device=self.device,
+            samplerate=self.session.sample_rate,
+            channels=self.session.channels,
+            dtype=self.session.sample_format,
+            callback=self.callback,
+            blocksize=self.blocksize,
+        )
+        self.stream.start()
+
+    def close_stream(self):
+        if self.stream:
+            try:
+                self.stream.stop()
+                self.stream.close()
+            except Exception as e:
+                self.logger.error(f"Error stopping stream: {e}")
+            self.stream = None
+
+    def stop(self):
+        self.shutdown_event.set()
+
+    def command(self, name, *args, wait=True, **kwargs):
+        """Run a receiver method in the child and return its result
+
+        Without ``wait``, returns None at once if another command is in
+        progress.
+        """
+        if not self._lock.acquire(wait):
+            return None
+        try:
+            if self._conn is None:
+                raise RuntimeError("I/O process is not running")
+            try:
+                self._conn.send((name, args, kwargs))
+                status, result = self._conn.recv()
+            except (EOFError, OSError) as e:
+                raise RuntimeError(f"I/O process is not responding: {e}")
+        finally:
+            self._lock.release()
+        if status != "ok":
+            raise RuntimeError(result)
+        return result
+
+    def stats(self):
+        stats = self.command("stats")
+        stats["playback_underruns"] = self.playback_underruns
+        return stats
+
+    def levels(self):
+        """As AudioReceiver.levels, from the child's latest snapshot
+
+        None until the child has published one.
+        """
+        with self._levels_lock:
+            if self.levels_snapshot is None:
+                return None
+            levels = self.levels_snapshot.read()
+        if levels is not None:
+            levels["playback_underruns"] = self.playback_underruns
+        return levels
+
+    def set_client_gain(self, name, gain):
+        return self.command("set_client_gain", name, gain)
+
+    def reconfigure(self, **changes):
+        """As AudioReceiver.reconfigure; the device is switched here"""
+        device = changes.pop("device", self.device)
+        if isinstance(device, (list, tuple)):
+            if len(device) > 1:
+                raise ValueError("The I/O process plays on a single device")
+            device = device[0]
+        if changes:
+            self.command("reconfigure", **changes)
+        if device != self.device:
+            previous, self.device = self.device, device
+            if self.stream is None:
+                return
+            self.close_stream()
+            try:
+                self.open_stream()
+            except Exception:
+                self.device = previous
+                self.open_stream()
+                raise
+
+    def cleanup(self):
+        self.close_stream()
+        with self._lock:
+            if self._conn is not None:
+                try:
+                    self._conn.send(("stop", (), {}))
+                except OSError:
+                    pass
+                self._conn.close()
+                self._conn = None
+        if self.process is not None:
+            self.process.join(timeout=3)
+            if self.process.is_alive():
+                self.process.terminate()
+            self.process = None
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+        with self._levels_lock:
+            if self.levels_snapshot is not None:
+                self.levels_snapshot.close()
+                self.levels_snapshot = None
+        self.logger.info("Audio receiver stopped")
@@ -0,0 +1,189 @@
+import numpy as np
+
+from ringbuffer import PCMRingBuffer
+
+
+class JitterBuffer(PCMRingBuffer):
+    """Ring buffer that keeps playback delay between a target and a maximum
+
+    Reading waits until ``target`` worth of audio is queued, skips the oldest
+    audio once the queue exceeds ``max_latency_ms``, and raises the target
+    when underruns repeat. Incoming audio is discarded instead of blocking
+    the network thread when the buffer is physically full.
+    """
+
+    # Underruns within the window that trigger a larger target
+    UNDERRUN_LIMIT = 3
+    UNDERRUN_WINDOW_S = 2.0
+    # Quiet period after which the target relaxes back toward the base
+    STABLE_S = 30.0
+    STEP_MS = 10
+    # Room allocated at least, so retarget can raise the maximum in place
+    MIN_CAPACITY_MS = 1000
+
+    drops_when_full = True
+
+    def __init__(
+        self,
+        sample_rate,
+        channels,
+        blocksize,
+        latency_ms,
+        max_latency_ms=None,
+        dtype=np.int16,
+    ):
+        self.sample_rate = sample_rate
+        self.blocksize = blocksize
+        self.base_target_frames, self.max_frames = self.limits(
+            latency_ms, max_latency_ms
+        )
+        self.target_frames = self.base_target_frames
+        self.step_frames = self.ms_to_frames(self.STEP_MS)
+        super().__init__(
+            max(
+                self.max_frames + 2 * blocksize, self.ms_to_frames(self.MIN_CAPACITY_MS)
+            ),
+            channels,
+            dtype,
+        )
+
+        self.underruns = 0
+        self.skipped_frames = 0
+        self.overflow_bytes = 0
+        self._primed = False
+        self._played = 0
+        self._window_start = 0
+        self._window_underruns = 0
+        self._last_change = 0
+        self._discarding = False
+        # Bytes of a partly discarded frame still to come from the stream
+        self._realign_bytes = 0
+        self._scratch = bytearray(blocksize * self.frame_bytes)
+        # (serial, target, max) from retarget, applied by the reader
+        self._retarget = None
+        self._retarget_serial = 0
+
+    def ms_to_frames(self, ms):
+        return int(self.sample_rate * ms / 1000)
+
+    def limits(self, latency_ms, max_latency_ms=None):
+        """Target and maximum in frames; the maximum defaults to twice the target"""
+        if max_latency_ms is None:
+            max_latency_ms = latency_ms * 2
+        block_ms = self.blocksize * 1000 / self.sample_rate
+        if max_latency_ms < latency_ms + block_ms:
+            raise ValueError(
+                f"Maximum latency must be at least {latency_ms + block_ms:.0f} ms"
+            )
+        return self.ms_to_frames(latency_ms), self.ms_to_frames(max_latency_ms)
+
+    def retarget(self, latency_ms, max_latency_ms=None):
+        """Move the target and maximum while playing; False if they do not fit
+
+        The reader picks the new limits up at its next block, so the
+        writer never touches state the audio callback is using.
+        """
+        target, maximum = self.limits(latency_ms, max_latency_ms)
+        if maximum + 2 * self.blocksize > self.capacity_frames:
+            return False
+        serial = self._retarget[0] + 1 if self._retarget else 1
+        self._retarget = (serial, target, maximum)
+        return True
+
+    def latency_ms(self):
+        """Current queued audio in milliseconds"""
+        return self.available() * 1000 / self.sample_rate
+
+    def target_ms(self):
+        return self.target_frames * 1000 / self.sample_rate
+
+    def write_view(self, max_bytes=None):
+        if self._realign_bytes:
+            # Finish discarding the frame cut by the last overflow first
+            limit = min(self._realign_bytes, max_bytes or self._realign_bytes)
+            self._discarding = True
+            return memoryview(self._scratch)[:limit]
+        view = super().write_view(max_bytes)
+        self._discarding = not len(view)
+        if self._discarding:
+            # Keep draining the socket; the audio is too late to be useful
+            view = memoryview(self._scratch)[: max_bytes or len(self._scratch)]
+        return view
+
+    def commit_write(self, nbytes):
+        if self._discarding:
+            self.overflow_bytes += nbytes
+            # A full ring ends on a frame boundary, so whole frames are dropped
+            self._realign_bytes = (self._realign_bytes - nbytes) % self.frame_bytes
+        else:
+            super().commit_write(nbytes)
+
+    def discard_partial(self):
+        super().discard_partial()
+        self._realign_bytes = 0
+
+    def read_into(self, out):
+        retarget = self._retarget
+        if retarget is not None and retarget[0] != self._retarget_serial:
+            self._retarget_serial, self.base_target_frames, self.max_frames = retarget
+            self.target_frames = self.base_target_frames
+            self._last_change = self._played
+        if self.skip_flushed():
+            # Build the target back up rather than play from the live edge
+            self._primed = False
+
+        frames = len(out)
+        available = self.available()
+
+        if available > self.max_frames:
+            skip = available - self.target_frames
+            self.advance(skip)
+            self.skipped_frames += skip
+            available -= skip
+
+        if not self._primed:
+            if available < self.target_frames:
+                out.fill(0)
+                return 0
+            self._primed = True
+
+        count = super().read_into(out)
+        self._played += frames
+        if count < frames:
+            self._primed = False
+            self._on_underrun()
+        elif (
+            self.target_frames > self.base_target_frames
+            and self._played - self._last_change > self.STABLE_S * self.sample_rate
+        ):
+            self.target_frames = max(
+                self.base_target_frames, self.target_frames - self.step_frames
+            )
+            self._last_change = self._played
+        return count
+
+    def _on_underrun(self):
+        self.underruns += 1
+        if (
+            self._played - self._window_start
+            > self.UNDERRUN_WINDOW_S * self.sample_rate
+        ):
+            self._window_start = self._played
+            self._window_underruns = 0
+        self._window_underruns += 1
+        if self._window_underruns >= self.UNDERRUN_LIMIT:
+            self.target_frames = min(
+                self.max_frames - self.blocksize, self.target_frames + self.step_frames
+            )
+            self._window_underruns = 0
+            self._window_start = self._played
+        self._last_change = self._played
+
+    def stats(self):
+        return {
+            "latency_ms": round(self.latency_ms(), 1),
+            "target_ms": round(self.target_ms(), 1),
+            "underruns": self.underruns,
+            "skipped_frames": self.skipped_frames,
+            "overflow_bytes": self.overflow_bytes,
+        }
@@ -0,0 +1,165 @@
+import math
+from collections import deque
+
+import numpy as np
+
+
+class RecentValues:
+    """The latest ``size`` samples of a value, written by a single thread"""
+
+    def __init__(self, size=500):
+        self._values = np.zeros(size, dtype=np.float64)
+        self._count = 0
+
+    def add(self, value):
+        self._values[self._count % len(self._values)] = value
+        self._count += 1
+
+    def __len__(self):
+        return min(self._count, len(self._values))
+
+    def percentiles(self, points=(50, 95, 99)):
+        values = self._values[: len(self)].copy()
+        if not len(values):
+            return {}
+        return {f"p{p}": float(np.percentile(values, p)) for p in points}
+
+
+class ClockOffsetEstimator:
+    """Offset of a sender's capture clock from ours, from one-way delays
+
+    ``arrival - capture`` is the clock offset plus the time a frame spent
+    in transit. Within each window the smallest value is the frame that
+    queued least, so window minima trace the offset plus the fixed path
+    delay; a least-squares line through recent minima also follows the
+    two clocks drifting apart. Fixed path delay cannot be told apart from
+    offset without synchronized clocks, so delays measured against the
+    estimate are queuing delay above the fastest path seen.
+    """
+
+    WINDOW_S = 1.0
+    WINDOWS = 30
+
+    def __init__(self):
+        self.frozen = False
+        self.skew = 0.0
+        self._minima = deque(maxlen=self.WINDOWS)
+        self._origin = None
+        self._intercept = None
+        self._window_start = None
+        self._window_min = math.inf
+        self._window_time = 0.0
+
+    def observe(self, capture_s, arrival_s):
+        """Add one frame and return its delay above the estimated offset"""
+        delta = arrival_s - capture_s
+        if self._origin is None:
+            self._origin = arrival_s
+            self._window_start = arrival_s
+        if delta < self._window_min:
+            self._window_min = delta
+            self._window_time = arrival_s - self._origin
+        if arrival_s - self._window_start >= self.WINDOW_S:
+            self._minima.append((self._window_time, self._window_min))
+            self._window_start = arrival_s
+            self._window_min = math.inf
+            if not self.frozen:
+                self.fit()
+        if self._intercept is None:
+            # Until the first window closes, measure against the best so far
+            return delta - self._window_min
+        return delta - self.offset(arrival_s)
+
+    def fit(self):
+        times = np.array([t for t, _ in self._minima])
+        minima = np.array([m for _, m in self._minima])
+        if len(minima) >= 3 and np.ptp(times) > 0:
+            skew, intercept = np.polyfit(times, minima, 1)
+            self.skew, self._intercept = float(skew), float(intercept)
+        else:
+            self.skew, self._intercept = 0.0, float(minima.min())
+
+    def offset(self, arrival_s):
+        """Estimated ``arrival - capture`` for a frame that did not queue"""
+        if self._intercept is None:
+            return None
+        return self._intercept + self.skew * (arrival_s - self._origin)
+
+    @property
+    def windows(self):
+        return len(self._minima)
+
+
+class LatencyTracker:
+    """Live latency components for one sender
+
+    ``network``: delay of timestamped frames above the fastest path (see
+    ClockOffsetEstimator), from the network thread. ``buffer``: audio
+    queued ahead of each callback, from the audio callback. Device latency
+    is per stream and is passed in when reporting.
+    """
+
+    def __init__(self, sample_rate):
+        self.sample_rate = sample_rate
+        self.clock = ClockOffsetEstimator()
+        self.network = RecentValues()
+        self.buffer_frames = RecentValues()
+        self.timestamped_frames = 0
+        self.first_timestamp_s = None
+        self.last_timestamp_s = None
+        self.calibrated = False
+
+    def on_timestamp(self, capture_us, arrival_s):
+        if self.first_timestamp_s is None:
+            self.first_timestamp_s = arrival_s
+        self.timestamped_frames += 1
+        self.last_timestamp_s = arrival_s
+        self.network.add(self.clock.observe(capture_us / 1e6, arrival_s))
+
+    def on_playout(self, buffered_frames):
+        self.buffer_frames.add(buffered_frames)
+
+    def timestamp_span(self, now):
+        """Seconds since the first timestamp arrived"""
+        if self.first_timestamp_s is None:
+            return 0.0
+        return now - self.first_timestamp_s
+
+    def stats(self, device_s=0.0):
+        """Component percentiles and their median sum, in milliseconds"""
+        stats = {}
+        total = device_s * 1000
+        buffer = self.buffer_frames.percentiles()
+        if buffer:
+            scale = 1000 / self.sample_rate
+            stats["buffer_ms"] = {k: round(v * scale, 1) for k, v in buffer.items()}
+            total += buffer["p50"] * scale
+        network = self.network.percentiles()
+        if network:
+            stats["network_ms"] = {k: round(v * 1000, 1) for k, v in network.items()}
+            offset = self.clock.offset(self.last_timestamp_s)
+            if offset is not None:
+                stats["clock_offset_ms"] = round(offset * 1000, 1)
+            stats["clock_skew_ppm"] = round(self.clock.skew * 1e6, 1)
+            total += network["p50"] * 1000
+        stats["device_ms"] = round(device_s * 1000, 1)
+        stats["total_ms"] = round(total, 1)
+        return stats
+
+    def total_ms(self, device_s=0.0):
+        """Median sum of the components, as in ``stats``, without the rest"""
+        total = device_s * 1000
+        buffer = self.buffer_frames.percentiles((50,))
+        if buffer:
+            total += buffer["p50"] * 1000 / self.sample_rate
+        network = self.network.percentiles((50,))
+        if network:
+            total += network["p50"] * 1000
+        return round(total, 1)
+
+    def recommended_latency_ms(self, block_ms):
+        """Jitter buffer target covering 99% of network delays plus one block"""
+        network = self.network.percentiles((99,))
+        if not network:
+            return None
+        return math.ceil((network["p99"] * 1000 + block_ms) / 10) * 10
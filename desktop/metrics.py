@@ -0,0 +1,208 @@
+import json
+import time
+from bisect import bisect_left
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+# Histogram bucket upper bounds, in seconds
+CALLBACK_BUCKETS_S = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.02, 0.05
+)  # fmt: skip
+BUFFER_DEPTH_BUCKETS_S = (0.005, 0.01, 0.02, 0.04, 0.08, 0.16, 0.32, 0.64)
+
+
+class Counter:
+    """Monotonic count with a single writer, so updates need no lock"""
+
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, n=1):
+        self.value += n
+
+
+class Histogram:
+    """Bucketed distribution with a single writer
+
+    ``buckets`` are upper bounds in the exported unit; observations are
+    taken in that unit divided by ``scale`` (e.g. frames for a bucket list
+    in seconds with ``scale=sample_rate``), so the hot path never converts.
+    Readers may see a sample counted in ``count`` but not yet in ``sum``,
+    which is harmless for monitoring.
+    """
+
+    def __init__(self, buckets, scale=1):
+        self.buckets = tuple(buckets)
+        self.scale = scale
+        self._edges = tuple(b * scale for b in self.buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self._edges, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        """(upper bound, observations at or below it) pairs, ending with +Inf"""
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + (float("inf"),), list(self.counts)):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding quantile ``q`` (None if unbounded)"""
+        rank = q * self.count
+        for bound, total in self.cumulative():
+            if total >= rank and total:
+                return bound if bound != float("inf") else None
+        return 0
+
+    def summary(self):
+        mean = self.sum / self.scale / self.count if self.count else 0
+        return {
+            "count": self.count,
+            "mean": round(mean, 6),
+            "p50_le": self.quantile(0.5),
+            "p99_le": self.quantile(0.99),
+        }
+
+
+class RateMeter:
+    """Turns a running byte total into a rate, sampled off the hot path"""
+
+    def __init__(self):
+        self._last_total = 0
+        self._last_time = time.monotonic()
+        self.rate = 0.0
+
+    def update(self, total):
+        now = time.monotonic()
+        elapsed = now - self._last_time
+        if elapsed > 0:
+            self.rate = (total - self._last_total) / elapsed
+        self._last_total = total
+        self._last_time = now
+        return self.rate
+
+
+class EventLog:
+    """Deferred, rate-limited logging for events raised on the audio thread
+
+    ``report`` only appends to a bounded deque (atomic, no lock, no
+    formatting), and ``flush`` on another thread logs the first event of
+    each kind per ``interval`` and summarizes the rest.
+    """
+
+    def __init__(self, logger, interval=5, maxlen=256):
+        self.logger = logger
+        self.interval = interval
+        self._queue = deque(maxlen=maxlen)
+        self._last_logged = {}
+        self._suppressed = {}
+
+    def report(self, kind, detail=None):
+        self._queue.append((kind, detail))
+
+    def flush(self):
+        now = time.monotonic()
+        while True:
+            try:
+                kind, detail = self._queue.popleft()
+            except IndexError:
+                break
+            if now - self._last_logged.get(kind, -self.interval) < self.interval:
+                self._suppressed[kind] = self._suppressed.get(kind, 0) + 1
+                continue
+            suppressed = self._suppressed.pop(kind, 0)
+            more = f" ({suppressed} more since last report)" if suppressed else ""
+            self.logger.warning(f"{kind}: {detail}{more}")
+            self._last_logged[kind] = now
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+    return "{" + pairs + "}"
+
+
+def prometheus_text(families):
+    """Render metric families in the Prometheus text exposition format
+
+    Each family is ``(name, type, help, samples)`` where samples is a list
+    of ``(labels, value)``; for histograms the value is a Histogram.
+    """
+    lines = []
+    for name, kind, help_text, samples in families:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            if kind != "histogram":
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+                continue
+            for bound, total in value.cumulative():
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = _format_labels({**labels, "le": le})
+                lines.append(f"{name}_bucket{bucket_labels} {total}")
+            lines.append(
+                f"{name}_sum{_format_labels(labels)} {value.sum / value.scale}"
+            )
+            lines.append(f"{name}_count{_format_labels(labels)} {value.count}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Local HTTP endpoint serving /metrics (Prometheus text) and /stats (JSON)
+
+    ``source`` needs ``prometheus_text()`` and ``stats()`` methods. Requests
+    are served on their own threads and only read counters.
+    """
+
+    def __init__(self, source, host="127.0.0.1", port=9555):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                path = handler.path.split("?")[0]
+                if path == "/metrics":
+                    body = source.prometheus_text().encode()
+                    content_type = "text/plain; version=0.0.4"
+                elif path == "/stats":
+                    body = json.dumps(source.stats()).encode()
+                    content_type = "application/json"
+                else:
+                    handler.send_error(404)
+                    return
+                handler.send_response(200)
+                handler.send_header("Content-Type", content_type)
+                handler.send_header("Content-Length", str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def address(self):
+        return self.server.server_address
+
+    def start(self):
+        self.thread = Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,114 @@
+import time
+
+import numpy as np
+
+from dsp import LevelMeter
+from latency import LatencyTracker
+from metrics import BUFFER_DEPTH_BUCKETS_S, Histogram, RateMeter
+
+
+class Client:
+    """One connected sender and the buffer its audio is received into"""
+
+    def __init__(self, name, buffer, sample_rate, gain=1.0):
+        self.name = name
+        self.buffer = buffer
+        self.gain = gain
+        self.session = None
+        self.decoder = None
+        self.packets = None
+        self.bytes_received = 0
+        self.connected_at = time.monotonic()
+        self.last_seen = self.connected_at
+        # Set while the sender is gone, in case it resumes its session
+        self.departed_at = None
+
+        # Written by the network thread
+        self.overruns = 0
+        self.throughput = RateMeter()
+        # Written by the audio callback
+        self.starved_blocks = 0
+        self.buffer_depth = Histogram(BUFFER_DEPTH_BUCKETS_S, scale=sample_rate)
+        self.latency = LatencyTracker(sample_rate)
+        self.levels = LevelMeter(sample_rate)
+
+
+class Mixer:
+    """Sum every client's buffer into the output block
+
+    The client list is an immutable tuple swapped on add/remove, so the
+    audio callback never takes a lock. A single client at unity gain is
+    copied straight through; otherwise each client is scaled by its gain,
+    accumulated in float32 and saturated to the output range. Scratch
+    arrays are preallocated for the stream's block size. Each read also
+    records the client's buffer depth, whether it ran short and its
+    level before gain. An optional ``limiter`` (dsp.Limiter scaled to the
+    output range) runs on the sum instead of letting it clip. ``gain``
+    scales the whole mix and, like the client gains, may be set from any
+    thread.
+    """
+
+    def __init__(self, channels, blocksize, dtype=np.int16, limiter=None, gain=1.0):
+        self.channels = channels
+        self.dtype = np.dtype(dtype)
+        self.limiter = limiter
+        self.gain = gain
+        self._clients = ()
+        self._allocate(blocksize * 2)
+
+    def _allocate(self, frames):
+        self._block = np.zeros((frames, self.channels), dtype=self.dtype)
+        self._scaled = np.zeros((frames, self.channels), dtype=np.float32)
+        self._acc = np.zeros((frames, self.channels), dtype=np.float32)
+        if self.dtype.kind == "i":
+            info = np.iinfo(self.dtype)
+            self._limits = (info.min, info.max)
+        else:
+            self._limits = (-1.0, 1.0)
+
+    @property
+    def clients(self):
+        return self._clients
+
+    def add(self, client):
+        self._clients = self._clients + (client,)
+
+    def remove(self, client):
+        self._clients = tuple(c for c in self._clients if c is not client)
+
+    def mix_into(self, out):
+        clients = self._clients
+        gain = self.gain
+        frames = len(out)
+        if not clients:
+            out.fill(0)
+            return
+        if len(clients) == 1 and clients[0].gain * gain == 1.0 and self.limiter is None:
+            self._read(clients[0], out)
+            return
+
+        if frames > len(self._acc):
+            self._allocate(frames)
+        block = self._block[:frames]
+        scaled = self._scaled[:frames]
+        acc = self._acc[:frames]
+        acc.fill(0)
+        for client in clients:
+            self._read(client, block)
+            np.multiply(block, client.gain * gain, out=scaled)
+            acc += scaled
+        if self.limiter is not None:
+            self.limiter.process(acc)
+        if self.dtype.kind == "i":
+            np.rint(acc, out=acc)
+        np.clip(acc, *self._limits, out=acc)
+        out[:] = acc
+
+    def _read(self, client, out):
+        buffer = client.buffer
+        available = buffer.available()
+        client.buffer_depth.observe(available)
+        client.latency.on_playout(available)
+        if buffer.read_into(out) < len(out) and client.bytes_received:
+            client.starved_blocks += 1
+        client.levels.observe(out)
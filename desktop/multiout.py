@@ -0,0 +1,142 @@
+from drift import DriftCompensator
+from resample import FormatConverter
+from ringbuffer import BroadcastRing, RingCursor
+
+
+class DeviceOutput:
+    """Plays what the primary stream played on one more device
+
+    ``device_session`` is the format the device is opened in; if it is
+    not the ring's ``session``, a FormatConverter sits between the
+    cursor and the device.
+    """
+
+    def __init__(
+        self, ring, device, session, stream_factory, start_frames, device_session=None
+    ):
+        self.device = device
+        device_session = device_session or session
+        self.cursor = RingCursor(ring, start_frames=start_frames)
+        # Each sound card has its own clock, drifting against the primary one
+        self.cursor.resampler = DriftCompensator(
+            session.sample_rate, session.channels, session.frame_samples, start_frames
+        )
+        self.converter = None
+        if device_session is not session:
+            self.converter = FormatConverter(
+                self.cursor.read_into,
+                session.sample_rate,
+                session.channels,
+                device_session.sample_rate,
+                device_session.channels,
+                session.dtype,
+            )
+        # Written by this device's callback
+        self.status_events = 0
+        self.stream = stream_factory(
+            device=device,
+            samplerate=device_session.sample_rate,
+            channels=device_session.channels,
+            dtype=session.sample_format,
+            callback=self.callback,
+            blocksize=device_session.frame_samples,
+        )
+
+    def callback(self, outdata, frames, time_info, status):
+        if status:
+            self.status_events += 1
+        if self.converter is not None:
+            self.converter.read_into(outdata)
+        else:
+            self.cursor.read_into(outdata)
+
+    def stats(self):
+        stats = {
+            "underruns": self.cursor.underruns,
+            "skipped_frames": self.cursor.skipped_frames,
+            "stream_status_events": self.status_events,
+        }
+        stats.update(self.cursor.resampler.stats())
+        return stats
+
+
+class MultiDeviceOutput:
+    """Copies of the mix on further sound cards, each on its own clock
+
+    The primary stream's callback writes every played block into one
+    BroadcastRing. Each extra device reads it through its own RingCursor
+    and DriftCompensator, which follow the mismatch between that card's
+    clock and the primary card's. Extra devices play ``START_BLOCKS``
+    blocks behind the primary one.
+
+    ``session_for_device(device, session)``, if given, picks the format
+    each device is opened in. A device that cannot be opened or started
+    is logged and left out, and the others play on.
+    """
+
+    START_BLOCKS = 3
+    BUFFER_BLOCKS = 25
+
+    def __init__(
+        self, devices, session, stream_factory, session_for_device=None, logger=None
+    ):
+        blocksize = session.frame_samples
+        self.logger = logger
+        self.ring = BroadcastRing(
+            self.BUFFER_BLOCKS * blocksize, session.channels, session.dtype
+        )
+        self.outputs = []
+        # Error message of each device that failed
+        self.errors = {}
+        for device in devices:
+            try:
+                device_session = session
+                if session_for_device is not None:
+                    device_session = session_for_device(device, session)
+                output = DeviceOutput(
+                    self.ring,
+                    device,
+                    session,
+                    stream_factory,
+                    self.START_BLOCKS * blocksize,
+                    device_session,
+                )
+            except Exception as e:
+                self.failed(device, "open", e)
+                continue
+            self.outputs.append(output)
+            if device_session is not session and self.logger:
+                self.logger.info(
+                    f"Converting to device {device}'s "
+                    f"{device_session.sample_rate} Hz, {device_session.channels} ch"
+                )
+
+    def failed(self, device, action, error):
+        self.errors[device] = str(error)
+        if self.logger:
+            self.logger.error(f"Cannot {action} extra output device {device}: {error}")
+
+    def write(self, block):
+        """Publish a played block to every extra device; never blocks"""
+        self.ring.write(block)
+
+    def start(self):
+        for output in list(self.outputs):
+            try:
+                output.stream.start()
+            except Exception as e:
+                self.failed(output.device, "start", e)
+                self.outputs.remove(output)
+                output.stream.close()
+
+    def close(self):
+        for output in self.outputs:
+            output.stream.stop()
+            output.stream.close()
+        self.outputs = []
+
+    def stats(self):
+        stats = {f"device {output.device}": output.stats() for output in self.outputs}
+        for device, error in self.errors.items():
+            stats[f"device {device}"] = {"error": error}
+        return stats
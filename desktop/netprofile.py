@@ -0,0 +1,82 @@
+import socket
+
+PROFILES = ("default", "low-latency")
+
+
+class SocketProfile:
+    """Socket options the receiver applies for one of PROFILES
+
+    ``default`` leaves every OS setting alone. ``low-latency`` is for TCP
+    senders:
+
+    - TCP_NODELAY
+    - a receive buffer of a few blocks, so a stalled receiver cannot let
+      seconds of stale audio pile up in the kernel
+    - TCP_QUICKACK on Linux, re-armed after every read, since the kernel
+      leaves quick-ack mode on its own and delayed ACKs hold back a
+      Nagle-bound sender by up to 40 ms
+    - short keepalives, so a phone that vanished is dropped in seconds
+      instead of hours
+
+    UDP keeps its default buffer: datagrams are read as they arrive, and a
+    small buffer would only turn bursts into loss.
+    """
+
+    RCVBUF_BLOCKS = 4
+    MIN_RCVBUF = 4096
+    KEEPALIVE_IDLE_S = 5
+    KEEPALIVE_INTERVAL_S = 2
+    KEEPALIVE_COUNT = 3
+
+    def __init__(self, name="default", block_bytes=0):
+        if name not in PROFILES:
+            raise ValueError(f"Unknown socket profile {name!r}")
+        self.name = name
+        self.low_latency = name == "low-latency"
+        self.rcvbuf = max(self.RCVBUF_BLOCKS * block_bytes, self.MIN_RCVBUF)
+        self.quickack = self.low_latency and hasattr(socket, "TCP_QUICKACK")
+
+    def apply_listener(self, sock):
+        """Options accepted connections inherit; set before ``listen``"""
+        if self.low_latency:
+            # The window scale is negotiated in the handshake, so the
+            # buffer size has to be known before connections arrive
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.rcvbuf)
+
+    def apply_connection(self, conn):
+        if not self.low_latency:
+            return
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.enable_keepalive(conn)
+        self.rearm(conn)
+
+    def enable_keepalive(self, conn):
+        conn.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        if hasattr(socket, "SIO_KEEPALIVE_VALS"):
+            # Windows takes all three settings at once, in milliseconds
+            conn.ioctl(
+                socket.SIO_KEEPALIVE_VALS,
+                (
+                    1,
+                    self.KEEPALIVE_IDLE_S * 1000,
+                    self.KEEPALIVE_INTERVAL_S * 1000,
+                ),
+            )
+            return
+        # macOS calls the idle time TCP_KEEPALIVE
+        idle = getattr(socket, "TCP_KEEPIDLE", getattr(socket, "TCP_KEEPALIVE", None))
+        for option, value in (
+            (idle, self.KEEPALIVE_IDLE_S),
+            (getattr(socket, "TCP_KEEPINTVL", None), self.KEEPALIVE_INTERVAL_S),
+            (getattr(socket, "TCP_KEEPCNT", None), self.KEEPALIVE_COUNT),
+        ):
+            if option is not None:
+                conn.setsockopt(socket.IPPROTO_TCP, option, value)
+
+    def rearm(self, conn):
+        """Stay in quick-ack mode; called after each read"""
+        if self.quickack:
+            try:
+                conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+            except OSError:
+                pass
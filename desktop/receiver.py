@@ -1,154 +1,25 @@
 #!/usr/bin/env python3
-import socket
-import sounddevice as sd
-import numpy as np
+"""Command-line front end for the receiver engine (engine.py)"""
+
 import argparse
-from queue import Queue
-from threading import Thread, Event
 import logging
 import signal
 import sys
 
-
-class AudioReceiver:
-    def __init__(
-        self, host="0.0.0.0", port=5555, sample_rate=44100, channels=1, device=None
-    ):
-        self.host = host
-        self.port = port
-        self.sample_rate = sample_rate
-        self.channels = channels
-        self.device = device
-        self.audio_queue = Queue(maxsize=20)
-        self.shutdown_event = Event()
-        self.stream = None
-
-        # Configure logging
-        logging.basicConfig(
-            level=logging.INFO,
-            format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-            handlers=[
-                logging.StreamHandler(sys.stdout),
-                logging.FileHandler("receiver.log"),
-            ],
-        )
-        self.logger = logging.getLogger("AudioReceiver")
-
-        # Register signal handlers for graceful shutdown
-        signal.signal(signal.SIGINT, self.signal_handler)
-        signal.signal(signal.SIGTERM, self.signal_handler)
-
-    def signal_handler(self, signum, frame):
-        """Handle shutdown signals"""
-        self.logger.info(f"Received signal {signum}, shutting down...")
-        self.shutdown_event.set()
-
-    def callback(self, outdata, frames, time, status):
-        if status:
-            self.logger.warning(f"Audio stream status: {status}")
-
-        if not self.audio_queue.empty():
-            data = self.audio_queue.get()
-            try:
-                audio_data = np.frombuffer(data, dtype=np.int16)
-
-                # Ensure proper size
-                if len(audio_data) < frames * self.channels:
-                    padding = np.zeros(
-                        frames * self.channels - len(audio_data), dtype=np.int16
-                    )
-                    audio_data = np.concatenate((audio_data, padding))
-                elif len(audio_data) > frames * self.channels:
-                    audio_data = audio_data[: frames * self.channels]
-
-                outdata[:] = audio_data.reshape(-1, self.channels)
-            except Exception as e:
-                self.logger.error(f"Audio processing error: {e}")
-                outdata.fill(0)
-        else:
-            outdata.fill(0)
-
-    def network_thread(self):
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            s.settimeout(1)  # Shorter timeout for more responsive shutdown
-            s.bind((self.host, self.port))
-            s.listen(1)
-            self.logger.info(f"Listening on {self.host}:{self.port}")
-
-            try:
-                while not self.shutdown_event.is_set():
-                    try:
-                        conn, addr = s.accept()
-                    except socket.timeout:
-                        continue
-
-                    self.logger.info(f"Connected by {addr}")
-                    conn.settimeout(1)
-
-                    with conn:
-                        chunk_size = int(self.sample_rate * 0.02) * self.channels * 2
-                        self.logger.info(f"Using chunk size: {chunk_size} bytes")
-
-                        while not self.shutdown_event.is_set():
-                            try:
-                                data = conn.recv(chunk_size)
-                                if not data:
-                                    break
-                                self.audio_queue.put(data)
-                            except socket.timeout:
-                                continue
-                            except Exception as e:
-                                self.logger.error(f"Network error: {e}")
-                                break
-
-            except Exception as e:
-                if not self.shutdown_event.is_set():
-                    self.logger.error(f"Connection error: {e}")
-            finally:
-                self.logger.info("Network thread stopping")
-
-    def start(self):
-        try:
-            self.stream = sd.OutputStream(
-                device=self.device,
-                samplerate=self.sample_rate,
-                channels=self.channels,
-                dtype="int16",
-                callback=self.callback,
-                blocksize=int(self.sample_rate * 0.02),
-            )
-            self.stream.start()
-            self.logger.info(f"Audio stream started on device {self.device}")
-
-            network_thread = Thread(target=self.network_thread)
-            network_thread.start()
-
-            # Main loop with shutdown check
-            while not self.shutdown_event.is_set():
-                sd.sleep(100)
-
-        except Exception as e:
-            self.logger.error(f"Error: {e}")
-        finally:
-            self.cleanup()
-
-    def cleanup(self):
-        """Clean up resources"""
-        self.shutdown_event.set()
-        if self.stream:
-            try:
-                self.stream.stop()
-                self.stream.close()
-            except Exception as e:
-                self.logger.error(f"Error stopping stream: {e}")
-        self.logger.info("Audio receiver stopped")
-
+from backends import sd
+from engine import LOG_FORMAT, AudioReceiver
+from netprofile import PROFILES
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Audio Streaming Receiver")
     parser.add_argument("--host", default="0.0.0.0", help="Host IP to bind to")
     parser.add_argument("--port", type=int, default=5555, help="Port to listen on")
+    parser.add_argument(
+        "--transport",
+        default="tcp",
+        choices=["tcp", "udp"],
+        help="tcp (default, works with adb reverse) or sequenced udp datagrams",
+    )
     parser.add_argument(
         "--rate",
         type=int,
@@ -163,16 +34,175 @@ if __name__ == "__main__":
         choices=[1, 2],
         help="Number of audio channels",
     )
-    parser.add_argument("--device", type=int, help="Output device ID")
+    parser.add_argument(
+        "--max-clients",
+        type=int,
+        default=8,
+        help="Maximum number of phones mixed at once",
+    )
+    parser.add_argument(
+        "--codec",
+        choices=["pcm", "ulaw", "ima-adpcm"],
+        default="pcm",
+        help="Codec of senders that do not send a session header",
+    )
+    parser.add_argument(
+        "--device",
+        type=int,
+        nargs="+",
+        help="Output device ID; give several to play on all of them",
+    )
+    parser.add_argument(
+        "--output",
+        choices=["sounddevice", "file", "pipe", "null"],
+        default="sounddevice",
+        help="Where to play the mix: a sound device, a WAV/raw file, "
+        "a pipe or nowhere",
+    )
+    parser.add_argument(
+        "--output-path",
+        help="File for --output file (.wav or raw PCM), "
+        "FIFO or - (stdout, default) for --output pipe",
+    )
+    parser.add_argument(
+        "--latency-ms",
+        type=int,
+        help="Enable the jitter buffer with this target playback delay",
+    )
+    parser.add_argument(
+        "--max-latency-ms",
+        type=int,
+        help="Skip old audio beyond this delay (default: twice --latency-ms)",
+    )
     parser.add_argument("--debug", action="store_true", help="Enable debug logging")
+    parser.add_argument(
+        "--drift-comp",
+        action="store_true",
+        help="Compensate sender/sound card clock drift by resampling",
+    )
+    parser.add_argument(
+        "--input-gain-db",
+        type=float,
+        default=0.0,
+        help="Gain applied to every sender before mixing",
+    )
+    parser.add_argument(
+        "--gate-db",
+        type=float,
+        help="Mute senders below this level (e.g. -50)",
+    )
+    parser.add_argument(
+        "--agc-db",
+        type=float,
+        help="Automatically level senders toward this RMS level (e.g. -20)",
+    )
+    parser.add_argument(
+        "--limit-db",
+        type=float,
+        help="Brickwall-limit the mix at this peak level (e.g. -1)",
+    )
+    parser.add_argument(
+        "--output-gain-db",
+        type=float,
+        default=0.0,
+        help="Gain applied to the whole mix",
+    )
+    parser.add_argument(
+        "--record",
+        metavar="PATH",
+        help="Also record the mix to WAV files; strftime codes are expanded, "
+        "e.g. recordings/%%Y%%m%%d-%%H%%M%%S.wav",
+    )
+    parser.add_argument(
+        "--record-max-mb",
+        type=float,
+        help="Start a new recording file after this many megabytes",
+    )
+    parser.add_argument(
+        "--record-max-minutes",
+        type=float,
+        help="Start a new recording file after this many minutes",
+    )
+    parser.add_argument(
+        "--capture",
+        metavar="PATH",
+        help="Log every received chunk with its arrival time to this file, "
+        "for replay.py",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help="Serve Prometheus metrics on this port (/metrics, /stats)",
+    )
+    parser.add_argument(
+        "--metrics-host",
+        default="127.0.0.1",
+        help="Address for the metrics endpoint",
+    )
+    parser.add_argument(
+        "--stats-interval",
+        type=float,
+        help="Log a JSON stats line every this many seconds",
+    )
+    parser.add_argument(
+        "--calibrate",
+        type=float,
+        metavar="SECONDS",
+        help="Measure sender timestamps for this long, then log the clock "
+        "offset, delay percentiles and a suggested --latency-ms",
+    )
+    parser.add_argument(
+        "--socket-profile",
+        choices=PROFILES,
+        default="default",
+        help="low-latency sets TCP_NODELAY, a small receive buffer, "
+        "quick ACKs (Linux) and keepalives on TCP connections",
+    )
+    parser.add_argument(
+        "--relay",
+        action="append",
+        metavar="URL",
+        help="Also forward the mix to another receiver, e.g. tcp://10.0.0.5:5555 "
+        "or udp://10.0.0.5:5555; may be repeated",
+    )
+    parser.add_argument(
+        "--relay-max-lag-ms",
+        type=int,
+        default=200,
+        help="Drop a downstream receiver that falls this far behind",
+    )
+    parser.add_argument(
+        "--no-resample",
+        action="store_true",
+        help="Open the device at the stream's rate and channels instead of "
+        "its native format",
+    )
     args = parser.parse_args()
+    if args.max_latency_ms is not None and args.latency_ms is None:
+        parser.error("--max-latency-ms requires --latency-ms")
+    if args.output == "file" and not args.output_path:
+        parser.error("--output file requires --output-path")
+    if args.device and len(args.device) > 1 and args.output != "sounddevice":
+        parser.error("Several --device IDs need --output sounddevice")
 
+    # Configure logging; stdout may be carrying the audio itself
+    console = sys.stdout
+    if args.output == "pipe" and args.output_path in (None, "-"):
+        console = sys.stderr
+    logging.basicConfig(
+        level=logging.INFO,
+        format=LOG_FORMAT,
+        handlers=[
+            logging.StreamHandler(console),
+            logging.FileHandler("receiver.log"),
+        ],
+    )
     if args.debug:
         logging.getLogger().setLevel(logging.DEBUG)
         logging.debug("Debug logging enabled")
 
     # List available devices if requested
-    if args.device is None:
+    if args.device is None and args.output == "sounddevice" and sd is not None:
         print("Available output devices:")
         devices = sd.query_devices()
         for i, d in enumerate(devices):
@@ -180,13 +210,45 @@ if __name__ == "__main__":
                 print(f"{i}: {d['name']} (channels: {d['max_output_channels']})")
         print("\nUse --device <ID> to select an output device")
 
-    receiver = AudioReceiver(
-        host=args.host,
-        port=args.port,
-        sample_rate=args.rate,
-        channels=args.channels,
-        device=args.device,
-    )
+    try:
+        receiver = AudioReceiver(
+            host=args.host,
+            port=args.port,
+            sample_rate=args.rate,
+            channels=args.channels,
+            device=args.device,
+            latency_ms=args.latency_ms,
+            max_latency_ms=args.max_latency_ms,
+            drift_compensation=args.drift_comp,
+            transport=args.transport,
+            max_clients=args.max_clients,
+            codec=None if args.codec == "pcm" else args.codec,
+            output=args.output,
+            output_path=args.output_path,
+            record_path=args.record,
+            record_max_mb=args.record_max_mb,
+            record_max_minutes=args.record_max_minutes,
+            input_gain_db=args.input_gain_db,
+            gate_db=args.gate_db,
+            agc_db=args.agc_db,
+            limiter_db=args.limit_db,
+            output_gain_db=args.output_gain_db,
+            metrics_port=args.metrics_port,
+            metrics_host=args.metrics_host,
+            stats_interval=args.stats_interval,
+            calibrate_s=args.calibrate,
+            socket_profile=args.socket_profile,
+            relay_targets=args.relay,
+            relay_max_lag_ms=args.relay_max_lag_ms,
+            resample_to_device=not args.no_resample,
+            capture_path=args.capture,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+
+    # Register signal handlers for graceful shutdown
+    signal.signal(signal.SIGINT, receiver.signal_handler)
+    signal.signal(signal.SIGTERM, receiver.signal_handler)
 
     try:
         receiver.start()
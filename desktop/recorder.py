@@ -0,0 +1,226 @@
+import errno
+import mmap
+import os
+import time
+from threading import Thread, Event
+
+import numpy as np
+
+from backends import WAV_HEADER, wav_header
+from ringbuffer import PCMRingBuffer
+
+
+class MappedWavFile:
+    """WAV file written through a memory map that grows in large steps
+
+    Space is reserved ``grow_bytes`` at a time so appending is a memcpy
+    into the map rather than a write syscall. ``close`` trims the unused
+    reservation and patches the header sizes. The reservation is real disk
+    space, not a sparse hole, so a full disk raises OSError when growing
+    rather than SIGBUS on a later store into the map.
+    """
+
+    ZEROS = bytes(1024 * 1024)
+
+    def __init__(self, path, sample_rate, channels, dtype, grow_bytes):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.dtype = np.dtype(dtype)
+        self.grow_bytes = grow_bytes
+        self.data_bytes = 0
+        self.file = open(path, "w+b")
+        self._map = None
+        try:
+            self._reserve(WAV_HEADER.size + grow_bytes)
+        except OSError:
+            self.file.close()
+            raise
+        self._map[: WAV_HEADER.size] = self.header()
+
+    def header(self):
+        return wav_header(self.sample_rate, self.channels, self.dtype, self.data_bytes)
+
+    def _reserve(self, size):
+        # Allocate before unmapping, so a failure leaves the file usable
+        self._allocate(size)
+        if self._map is not None:
+            self._map.close()
+        self._map = mmap.mmap(self.file.fileno(), size)
+
+    def _allocate(self, size):
+        fd = self.file.fileno()
+        start = os.fstat(fd).st_size
+        if size <= start:
+            return
+        if hasattr(os, "posix_fallocate"):
+            try:
+                os.posix_fallocate(fd, start, size - start)
+                return
+            except OSError as e:
+                if e.errno not in (errno.EINVAL, errno.EOPNOTSUPP):
+                    raise
+        # No fallocate here: write zeros, which fail the same way when full
+        self.file.seek(start)
+        left = size - start
+        while left:
+            chunk = min(left, len(self.ZEROS))
+            self.file.write(memoryview(self.ZEROS)[:chunk])
+            left -= chunk
+        self.file.flush()
+
+    def write(self, data):
+        data = memoryview(data).cast("B")
+        start = WAV_HEADER.size + self.data_bytes
+        end = start + data.nbytes
+        if end > len(self._map):
+            self._reserve(max(end, len(self._map) + self.grow_bytes))
+        self._map[start:end] = data
+        self.data_bytes += data.nbytes
+
+    def close(self):
+        self._map[: WAV_HEADER.size] = self.header()
+        self._map.flush()
+        self._map.close()
+        self.file.truncate(WAV_HEADER.size + self.data_bytes)
+        self.file.close()
+
+
+class Recorder:
+    """Tees the played mix into WAV files from a thread of its own
+
+    The audio callback only copies each block into a bounded ring (no
+    locks, no I/O); the recorder thread moves it to disk. If the disk
+    stalls long enough for the ring to fill, new audio is dropped and
+    counted rather than holding up playback. Files rotate after
+    ``max_bytes`` of audio or ``max_seconds`` of recorded time. ``path``
+    may contain ``strftime`` codes, expanded when each file is opened.
+    """
+
+    POLL_S = 0.05
+    GROW_BYTES = 32 * 1024 * 1024
+
+    def __init__(
+        self,
+        path,
+        sample_rate,
+        channels,
+        dtype=np.int16,
+        buffer_s=10,
+        max_bytes=None,
+        max_seconds=None,
+        logger=None,
+    ):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.dtype = np.dtype(dtype)
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.logger = logger
+        self.ring = PCMRingBuffer(int(sample_rate * buffer_s), channels, self.dtype)
+
+        # Written by the audio callback
+        self.dropped_frames = 0
+        # Written by the recorder thread
+        self.recorded_frames = 0
+        self.files = []
+        self.file = None
+        self.error = None
+
+        self._stop = Event()
+        self._thread = None
+
+    def write(self, block):
+        """Queue a block for recording; never blocks"""
+        written = self.ring.write(block)
+        if written < block.nbytes:
+            self.dropped_frames += (block.nbytes - written) // self.ring.frame_bytes
+
+    def start(self):
+        self._thread = Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Write out everything queued so far and close the current file"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def run(self):
+        try:
+            while not self._stop.wait(self.POLL_S):
+                self.drain()
+            self.drain()
+        except OSError as e:
+            # Keep the callback side running; it will just count drops
+            self.error = e
+            if self.logger:
+                self.logger.error(f"Recording stopped: {e}")
+        finally:
+            self.close_file()
+
+    def drain(self):
+        ring = self.ring
+        while ring.available():
+            if self.file is None or self.file_full():
+                self.rotate()
+            frames = ring.read_view(self.frames_left())
+            self.file.write(frames)
+            ring.advance(len(frames))
+            self.recorded_frames += len(frames)
+
+    def file_full(self):
+        left = self.frames_left()
+        return left is not None and left <= 0
+
+    def frames_left(self):
+        """Frames the current file can take before it must rotate"""
+        limits = []
+        if self.max_bytes:
+            limits.append(self.max_bytes // self.ring.frame_bytes)
+        if self.max_seconds:
+            limits.append(round(self.max_seconds * self.sample_rate))
+        if not limits:
+            return None
+        return min(limits) - self.file.data_bytes // self.ring.frame_bytes
+
+    def rotate(self):
+        self.close_file()
+        path = self.next_path()
+        grow = self.GROW_BYTES
+        if self.max_bytes:
+            grow = min(grow, self.max_bytes)
+        self.file = MappedWavFile(
+            path, self.sample_rate, self.channels, self.dtype, grow
+        )
+        self.files.append(path)
+        if self.logger:
+            self.logger.info(f"Recording to {path}")
+
+    def next_path(self):
+        path = time.strftime(self.path)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        root, ext = os.path.splitext(path)
+        n = 1
+        while os.path.exists(path) or path in self.files:
+            n += 1
+            path = f"{root}-{n}{ext}"
+        return path
+
+    def close_file(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def stats(self):
+        return {
+            "recording": self.files[-1] if self.files else None,
+            "recorded_s": round(self.recorded_frames / self.sample_rate, 1),
+            "record_queue_ms": round(self.ring.available() * 1000 / self.sample_rate),
+            "record_dropped_frames": self.dropped_frames,
+            "record_files": len(self.files),
+        }
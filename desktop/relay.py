@@ -0,0 +1,325 @@
+import os
+import selectors
+import socket
+import time
+from threading import Thread, Event
+
+from ringbuffer import BroadcastRing
+from session import SessionInfo
+from udp import PACKET_HEADER
+
+TRANSPORTS = ("tcp", "udp")
+
+
+def parse_target(text):
+    """``tcp://host:port``, ``udp://host:port`` or ``host:port`` (TCP)"""
+    transport, sep, rest = text.partition("://")
+    if not sep:
+        transport, rest = "tcp", text
+    host, sep, port = rest.rpartition(":")
+    if transport not in TRANSPORTS or not sep or not host or not port.isdigit():
+        raise ValueError(f"Invalid relay target {text!r}, expected tcp://host:port")
+    return transport, (host.strip("[]"), int(port))
+
+
+class Subscriber:
+    """One downstream receiver and its cursor into the BroadcastRing
+
+    A subscriber that falls more than ``max_lag_bytes`` behind is cut off
+    so it cannot hold up the others; what that means depends on the
+    transport.
+    """
+
+    RETRY_S = 2
+
+    def __init__(self, transport, address, header, max_lag_bytes):
+        self.transport = transport
+        self.address = address
+        self.name = f"{transport}://{address[0]}:{address[1]}"
+        self.header = header
+        self.max_lag_bytes = max_lag_bytes
+        self.sock = None
+        # Non-blocking connect still in progress (TCP only)
+        self.connecting = False
+        self.pos = 0
+        self.next_attempt = 0.0
+        self.sent_bytes = 0
+        self.dropped_bytes = 0
+        self.disconnects = 0
+
+    @property
+    def connected(self):
+        return self.sock is not None
+
+    @property
+    def streaming(self):
+        return self.sock is not None and not self.connecting
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+
+class TcpSubscriber(Subscriber):
+    """Streams to a receiver as a sender would: session header, then PCM
+
+    Being too far behind closes the connection; it is reopened at the
+    live edge after ``RETRY_S``.
+    """
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self._pending = memoryview(b"")
+
+    def open(self, ring):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # Keep the kernel from queuing far more than the lag limit
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.max_lag_bytes)
+        self.connecting = True
+        self.pos = ring.write_pos
+        self._pending = memoryview(self.header)
+        # Published last, so it never looks streaming before it connects
+        self.sock = sock
+        sock.connect_ex(self.address)
+
+    def on_connected(self):
+        """Finish a non-blocking connect; returns the error code, 0 on success"""
+        error = self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        self.connecting = error != 0
+        return error
+
+    def pump(self, ring):
+        """Send whatever the socket takes; returns an error message or None"""
+        end = ring.write_pos
+        if end - self.pos > self.max_lag_bytes:
+            self.dropped_bytes += end - self.pos
+            return "fell behind"
+        try:
+            while len(self._pending):
+                sent = self.sock.send(self._pending)
+                self._pending = self._pending[sent:]
+            while self.pos < end:
+                sent = self.sock.send(ring.view(self.pos, end))
+                self.pos += sent
+                self.sent_bytes += sent
+        except BlockingIOError:
+            pass
+        except OSError as e:
+            return str(e)
+        return None
+
+
+class UdpSubscriber(Subscriber):
+    """Sends one sequenced datagram per block, as the UDP transport expects
+
+    Datagrams are scatter-gathered from the packet header and the ring
+    with ``sendmsg`` where available. Falling behind skips ahead to the
+    live edge and counts the skipped audio as dropped. The session
+    header is repeated every ``HEADER_EVERY_S`` so a downstream receiver
+    that restarts picks the format up again.
+    """
+
+    HEADER_EVERY_S = 2
+
+    def __init__(self, *args, block_bytes):
+        super().__init__(*args)
+        self.block_bytes = block_bytes
+        self.seq = 0
+        self.last_header = 0.0
+
+    def open(self, ring):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setblocking(False)
+        self.pos = ring.write_pos
+        self.last_header = 0.0
+        self.sock = sock
+
+    def pump(self, ring):
+        end = ring.write_pos
+        now = time.time()
+        try:
+            if now - self.last_header >= self.HEADER_EVERY_S:
+                self.sock.sendto(self.header, self.address)
+                self.last_header = now
+            if end - self.pos > self.max_lag_bytes:
+                skip = (end - self.pos) // self.block_bytes * self.block_bytes
+                self.pos += skip
+                self.dropped_bytes += skip
+            while end - self.pos >= self.block_bytes:
+                header = PACKET_HEADER.pack(self.seq, int(now * 1e6))
+                parts = [header]
+                start = self.pos
+                while start < self.pos + self.block_bytes:
+                    part = ring.view(start, self.pos + self.block_bytes)
+                    parts.append(part)
+                    start += len(part)
+                self.send(parts)
+                self.pos += self.block_bytes
+                self.sent_bytes += self.block_bytes
+                self.seq = (self.seq + 1) & 0xFFFFFFFF
+        except BlockingIOError:
+            pass
+        except OSError as e:
+            return str(e)
+        return None
+
+    def send(self, parts):
+        if hasattr(self.sock, "sendmsg"):
+            self.sock.sendmsg(parts, (), 0, self.address)
+        else:
+            # Windows has no sendmsg
+            self.sock.sendto(b"".join(parts), self.address)
+
+
+class Relay:
+    """Forwards the played mix to downstream FastiMic receivers
+
+    The audio callback copies each block into a BroadcastRing once; a
+    relay thread sends slices of that ring to every subscriber over
+    non-blocking sockets. Each subscriber's cursor is its own bounded
+    queue (``max_lag_ms``), so a slow or dead machine is dropped instead
+    of stalling playback or the other subscribers.
+    """
+
+    POLL_S = 0.005
+
+    def __init__(
+        self,
+        targets,
+        session,
+        buffer_ms=1000,
+        max_lag_ms=200,
+        logger=None,
+    ):
+        self.session = session
+        self.logger = logger
+        frame_bytes = session.channels * session.dtype.itemsize
+        self.ring = BroadcastRing(
+            session.sample_rate * buffer_ms // 1000, session.channels, session.dtype
+        )
+        max_lag = int(session.sample_rate * max_lag_ms / 1000) * frame_bytes
+        if max_lag >= self.ring.capacity_bytes:
+            raise ValueError("Relay lag limit must be below the relay buffer size")
+        # Downstream receivers resume this session when a subscriber reconnects
+        header = SessionInfo(
+            session.sample_rate,
+            session.channels,
+            session.sample_format,
+            session.frame_us,
+            session_id=int.from_bytes(os.urandom(8), "big") or 1,
+        ).pack()
+        self.subscribers = []
+        for target in targets:
+            transport, address = parse_target(target)
+            if transport == "udp":
+                subscriber = UdpSubscriber(
+                    transport,
+                    address,
+                    header,
+                    max_lag,
+                    block_bytes=session.frame_samples * frame_bytes,
+                )
+            else:
+                subscriber = TcpSubscriber(transport, address, header, max_lag)
+            self.subscribers.append(subscriber)
+
+        self._stop = Event()
+        self._thread = None
+
+    def write(self, block):
+        """Publish a played block to every subscriber; never blocks"""
+        self.ring.write(block)
+
+    def start(self):
+        self._thread = Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def log(self, message):
+        if self.logger:
+            self.logger.info(message)
+
+    def run(self):
+        selector = selectors.DefaultSelector()
+        try:
+            while not self._stop.is_set():
+                now = time.monotonic()
+                for subscriber in self.subscribers:
+                    if not subscriber.connected and now >= subscriber.next_attempt:
+                        self.open(subscriber, selector)
+                if selector.get_map():
+                    for key, _ in selector.select(self.POLL_S):
+                        self.on_connect(key.data, selector)
+                else:
+                    self._stop.wait(self.POLL_S)
+                for subscriber in self.subscribers:
+                    if subscriber.streaming:
+                        error = subscriber.pump(self.ring)
+                        if error:
+                            self.disconnect(subscriber, error)
+        finally:
+            for subscriber in self.subscribers:
+                if subscriber.connected:
+                    self.disconnect(subscriber, None)
+            selector.close()
+
+    def open(self, subscriber, selector):
+        try:
+            subscriber.open(self.ring)
+        except OSError as e:
+            self.disconnect(subscriber, str(e))
+            return
+        if subscriber.connecting:
+            selector.register(subscriber.sock, selectors.EVENT_WRITE, subscriber)
+        else:
+            self.log(f"Relaying to {subscriber.name}")
+
+    def on_connect(self, subscriber, selector):
+        selector.unregister(subscriber.sock)
+        error = subscriber.on_connected()
+        if error:
+            self.disconnect(subscriber, f"cannot connect ({os.strerror(error)})")
+        else:
+            self.log(f"Relaying to {subscriber.name}")
+
+    def disconnect(self, subscriber, reason):
+        was_streaming = subscriber.streaming
+        subscriber.close()
+        subscriber.connecting = False
+        subscriber.next_attempt = time.monotonic() + subscriber.RETRY_S
+        if reason is None:
+            return
+        if was_streaming:
+            subscriber.disconnects += 1
+            if self.logger:
+                self.logger.warning(
+                    f"Relay to {subscriber.name} dropped: {reason}; "
+                    f"retrying in {subscriber.RETRY_S} s"
+                )
+        elif self.logger:
+            self.logger.debug(f"Relay to {subscriber.name}: {reason}")
+
+    def stats(self):
+        rate = self.session.sample_rate * self.ring.frame_bytes
+        return {
+            s.name: {
+                "connected": s.streaming,
+                "sent_s": round(s.sent_bytes / rate, 1),
+                "lag_ms": (
+                    round((self.ring.write_pos - s.pos) * 1000 / rate, 1)
+                    if s.streaming
+                    else None
+                ),
+                "dropped_s": round(s.dropped_bytes / rate, 1),
+                "disconnects": s.disconnects,
+            }
+            for s in self.subscribers
+        }
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""Feed a capture (``receiver.py --capture``) back through AudioReceiver
+
+The receiver runs in-process with its sockets replaced by stand-ins that
+hand back the captured chunks, and with its output pulled by this
+script's clock instead of a sound card or timer thread. Every chunk
+arrives at its captured time relative to the output blocks, so network
+jitter is reproduced exactly, and buffer settings can be compared on the
+same traffic:
+
+    python replay.py session.cap                       # at original timing
+    python replay.py session.cap --fast --latency-ms 80
+    python replay.py session.cap --fast --profile      # profile the callback
+
+Jitter buffers, drift compensation and the mix are driven by the audio
+itself, so ``--fast`` replays them exactly. Idle timeouts and network
+delay figures follow the wall clock and are only meaningful at original
+timing.
+"""
+
+import argparse
+import cProfile
+import collections
+import json
+import logging
+import pstats
+import time
+
+from backends import make_stream_factory
+from capture import CLOSE, DATA, DATAGRAM, OPEN, CaptureReader
+from engine import LOG_FORMAT, AudioReceiver
+from jitterbuffer import JitterBuffer
+
+
+class ReplayConnection:
+    """Stands in for an accepted TCP socket, returning captured chunks"""
+
+    def __init__(self):
+        self.chunks = collections.deque()
+        self.eof = False
+
+    def ready(self):
+        return bool(self.chunks) or self.eof
+
+    def recv_into(self, view):
+        if not self.chunks:
+            if self.eof:
+                return 0
+            raise BlockingIOError
+        chunk = self.chunks[0]
+        size = min(len(view), len(chunk))
+        view[:size] = chunk[:size]
+        if size < len(chunk):
+            self.chunks[0] = chunk[size:]
+        else:
+            self.chunks.popleft()
+        return size
+
+    def setblocking(self, flag):
+        pass
+
+    def setsockopt(self, *args):
+        pass
+
+    def close(self):
+        self.chunks.clear()
+
+
+class ReplayListener:
+    """Stands in for the listening socket (TCP) or the bound socket (UDP)"""
+
+    def __init__(self):
+        self.pending = collections.deque()
+
+    def accept(self):
+        if not self.pending:
+            raise BlockingIOError
+        return self.pending.popleft()
+
+    def recvfrom_into(self, buffer):
+        if not self.pending:
+            raise BlockingIOError
+        datagram, addr = self.pending.popleft()
+        buffer[: len(datagram)] = datagram
+        return len(datagram), addr
+
+
+class ReplaySelector:
+    """Tracks the receiver's registrations; ready ones are served at once"""
+
+    Key = collections.namedtuple("Key", "fileobj data")
+
+    def __init__(self):
+        self.keys = {}
+
+    def register(self, fileobj, events, data=None):
+        self.keys[fileobj] = self.Key(fileobj, data)
+
+    def unregister(self, fileobj):
+        del self.keys[fileobj]
+
+    def ready(self):
+        return [key for key in self.keys.values() if key.fileobj.ready()]
+
+    def close(self):
+        self.keys.clear()
+
+
+class SteppedStream:
+    """Wraps a clocked output stream so the replay clock pulls its blocks"""
+
+    def __init__(self, stream, profiler=None):
+        self.stream = stream
+        self.profiler = profiler
+        self.period = stream.blocksize / stream.samplerate
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def close(self):
+        self.stream.close()
+
+    def tick(self):
+        if self.profiler is None:
+            self.stream.tick(None)
+        else:
+            self.profiler.enable()
+            self.stream.tick(None)
+            self.profiler.disable()
+
+
+def parse_addr(payload):
+    host, port = payload.decode().rsplit(":", 1)
+    return host, int(port)
+
+
+class Replay:
+    """Drives one AudioReceiver through a capture file"""
+
+    def __init__(self, args):
+        self.reader = CaptureReader(args.capture)
+        self.fast = args.fast
+        self.tail_s = args.tail_s
+        self.profiler = cProfile.Profile() if args.profile else None
+        settings = dict(self.reader.metadata)
+        for name in ("latency_ms", "max_latency_ms"):
+            if getattr(args, name) is not None:
+                settings[name] = getattr(args, name)
+        if args.no_latency:
+            settings["latency_ms"] = settings["max_latency_ms"] = None
+        if args.drift_comp is not None:
+            settings["drift_compensation"] = args.drift_comp
+        self.settings = settings
+
+        outputs = make_stream_factory(args.output, args.output_path)
+
+        def stream_factory(**kwargs):
+            return SteppedStream(outputs(**kwargs), self.profiler)
+
+        self.receiver = AudioReceiver(
+            sample_rate=settings["sample_rate"],
+            channels=settings["channels"],
+            codec=settings["codec"],
+            transport=settings["transport"],
+            max_clients=settings["max_clients"],
+            latency_ms=settings["latency_ms"],
+            max_latency_ms=settings["max_latency_ms"],
+            drift_compensation=settings["drift_compensation"],
+            input_gain_db=settings["input_gain_db"],
+            gate_db=settings["gate_db"],
+            agc_db=settings["agc_db"],
+            limiter_db=settings["limiter_db"],
+            output_gain_db=settings["output_gain_db"],
+            output=args.output,
+            stream_factory=stream_factory,
+        )
+        self.receiver.selector = ReplaySelector()
+        self.listener = ReplayListener()
+        self.connections = {}
+        self.addresses = {}
+        # Every client seen, so those that left still appear in the report
+        self.clients = {}
+        self.records = 0
+        self.blocks = 0
+
+    def run(self):
+        receiver = self.receiver
+        receiver.open_stream()
+        self.origin = time.perf_counter()
+        now = last = 0.0
+        try:
+            for last, stream, kind, payload in self.reader:
+                now = self.play_until(last, now)
+                self.wait(last)
+                self.handle(stream, kind, payload)
+                self.records += 1
+            now = self.play_until(last + self.tail_s, now)
+            wall_s = time.perf_counter() - self.origin
+            return self.report(now, wall_s)
+        finally:
+            for conn in list(receiver._connections):
+                receiver.close_connection(conn)
+            receiver.cleanup()
+            self.reader.close()
+
+    def play_until(self, t, now):
+        """Pull every output block due before capture time ``t``"""
+        receiver = self.receiver
+        while True:
+            stream = receiver.stream
+            if now + stream.period > t:
+                return now
+            now += stream.period
+            self.wait(now)
+            stream.tick()
+            self.blocks += 1
+            receiver.housekeeping()
+            self.serve()
+
+    def wait(self, t):
+        """At original timing, sleep until capture time ``t`` comes round"""
+        if self.fast:
+            return
+        delay = self.origin + t - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    def handle(self, stream, kind, payload):
+        receiver = self.receiver
+        if kind == OPEN:
+            self.addresses[stream] = addr = parse_addr(payload)
+            if receiver.transport == "tcp":
+                conn = self.connections[stream] = ReplayConnection()
+                self.listener.pending.append((conn, addr))
+                receiver.on_accept(self.listener)
+        elif kind == DATA:
+            self.connections[stream].chunks.append(payload)
+        elif kind == CLOSE:
+            self.connections.pop(stream).eof = True
+        elif kind == DATAGRAM:
+            self.listener.pending.append((payload, self.addresses[stream]))
+            receiver.on_datagram(self.listener)
+        self.serve()
+        receiver.housekeeping()
+        for client in receiver.mixer.clients:
+            self.clients[client.name] = client
+
+    def serve(self):
+        """Let the receiver read every connection that has data, as select() would"""
+        while True:
+            ready = self.receiver.selector.ready()
+            if not ready:
+                return
+            for key in ready:
+                if key.fileobj in self.receiver.selector.keys:
+                    key.data(key.fileobj)
+
+    def report(self, replayed_s, wall_s):
+        stats = self.receiver.stats()
+        clients = {}
+        for name, client in self.clients.items():
+            buffer = client.buffer
+            summary = {
+                "bytes_received": client.bytes_received,
+                "starved_blocks": client.starved_blocks,
+                "overruns": client.overruns,
+            }
+            if isinstance(buffer, JitterBuffer):
+                summary.update(buffer.stats())
+            if client.packets is not None:
+                summary.update(client.packets.stats())
+            clients[name] = summary
+        return {
+            "settings": self.settings,
+            "records": self.records,
+            "replayed_s": round(replayed_s, 3),
+            "wall_s": round(wall_s, 3),
+            "blocks": self.blocks,
+            "callback_s": stats["callback_s"],
+            "connections": stats["connections"],
+            "resumes": stats["resumes"],
+            "rejections": stats["rejections"],
+            "clients": clients,
+        }
+
+
+def print_report(report):
+    print(
+        f"replayed {report['records']} records, {report['replayed_s']} s "
+        f"in {report['wall_s']} s ({report['blocks']} blocks)"
+    )
+    print(f"callback s: {report['callback_s']}")
+    print(
+        f"connections: {report['connections']}, resumes: {report['resumes']}, "
+        f"rejections: {report['rejections']}"
+    )
+    for name, stats in report["clients"].items():
+        print(f"{name}: {stats}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a receiver capture")
+    parser.add_argument("capture", help="File written by receiver.py --capture")
+    parser.add_argument(
+        "--fast", action="store_true", help="Replay as fast as possible"
+    )
+    parser.add_argument(
+        "--latency-ms", type=int, help="Jitter buffer target (default: as captured)"
+    )
+    parser.add_argument(
+        "--max-latency-ms", type=int, help="Latency cap (default: as captured)"
+    )
+    parser.add_argument(
+        "--no-latency", action="store_true", help="Replay without a jitter buffer"
+    )
+    parser.add_argument(
+        "--drift-comp",
+        action="store_const",
+        const=True,
+        help="Replay with drift compensation (default: as captured)",
+    )
+    parser.add_argument(
+        "--no-drift-comp",
+        dest="drift_comp",
+        action="store_const",
+        const=False,
+        help="Replay without drift compensation",
+    )
+    parser.add_argument(
+        "--output",
+        default="null",
+        choices=["null", "file"],
+        help="Discard the mix or write it to --output-path",
+    )
+    parser.add_argument("--output-path", help="WAV or raw PCM file for --output file")
+    parser.add_argument(
+        "--tail-s",
+        type=float,
+        default=1,
+        help="Keep playing this long after the last record",
+    )
+    parser.add_argument(
+        "--profile", action="store_true", help="Profile the audio callback"
+    )
+    parser.add_argument("--json", action="store_true", help="Print a JSON report")
+    parser.add_argument("--verbose", action="store_true", help="Show receiver logs")
+    args = parser.parse_args()
+    if args.output == "file" and not args.output_path:
+        parser.error("--output file requires --output-path")
+    # Logs go to stderr, leaving stdout to the report
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
+    if not args.verbose:
+        logging.getLogger("AudioReceiver").setLevel(logging.WARNING)
+
+    try:
+        replay = Replay(args)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    report = replay.run()
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    if replay.profiler is not None:
+        pstats.Stats(replay.profiler).sort_stats("cumulative").print_stats(20)
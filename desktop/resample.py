@@ -0,0 +1,153 @@
+import math
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def polyphase_bank(up, down, taps, beta=8.6, rolloff=0.94):
+    """Kaiser-windowed sinc low-pass split into ``up`` phases of ``taps``
+
+    The prototype runs at ``up`` times the input rate and cuts off just
+    below the lower of the two Nyquist frequencies. Each phase is
+    reversed so it lines up with an ascending window of input frames.
+    """
+    length = up * taps
+    cutoff = rolloff * 0.5 / max(up, down)
+    n = np.arange(length) - (length - 1) / 2
+    h = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(length, beta) * up
+    bank = h.reshape(taps, up).T[:, ::-1]
+    return np.ascontiguousarray(bank, dtype=np.float32)
+
+
+class PolyphaseResampler:
+    """Streaming rational-ratio resampler for (frames, channels) float32 PCM
+
+    Output frame ``n`` sits at input position ``n * down / up``; its
+    integer part picks a window of ``taps`` input frames and the fraction
+    picks one of ``up`` precomputed filter phases, so each block is a
+    gather and one ``einsum`` over preallocated arrays. The caller pulls
+    exactly ``frames_needed`` new input frames before each ``process``,
+    which keeps the output block size fixed. Adds ``taps / 2`` input
+    frames of delay.
+    """
+
+    def __init__(self, in_rate, out_rate, channels, taps=32, max_frames=4096):
+        common = math.gcd(in_rate, out_rate)
+        self.up = out_rate // common
+        self.down = in_rate // common
+        self.taps = taps
+        self.channels = channels
+        self.bank = polyphase_bank(self.up, self.down, taps)
+        self._phase = 0
+        # Input frames held, starting with taps - 1 frames of history
+        self._have = taps - 1
+        self._x = None
+        self._allocate(max_frames)
+
+    def _allocate(self, frames):
+        max_in = (frames * self.down) // self.up + self.taps + 1
+        x = np.zeros((self.taps - 1 + max_in, self.channels), dtype=np.float32)
+        if self._x is not None:
+            x[: self._have] = self._x[: self._have]
+        self._x = x
+        self._steps = np.arange(frames, dtype=np.int64) * self.down
+        self._pos = np.empty(frames, dtype=np.int64)
+        self._idx = np.empty(frames, dtype=np.int64)
+        self._phases = np.empty(frames, dtype=np.int64)
+        self._windows = np.empty((frames, self.channels, self.taps), dtype=np.float32)
+        self._coeffs = np.empty((frames, self.taps), dtype=np.float32)
+
+    def frames_needed(self, frames):
+        """New input frames to supply before producing ``frames`` outputs"""
+        if frames > len(self._steps):
+            self._allocate(frames)
+        last = (self._phase + (frames - 1) * self.down) // self.up
+        return max(0, last + self.taps - self._have)
+
+    def input_view(self, count):
+        """Writable slots for ``count`` new input frames; then ``commit``"""
+        return self._x[self._have : self._have + count]
+
+    def commit(self, count):
+        self._have += count
+
+    def process(self, out):
+        """Fill float32 ``out`` from the held input and drop what is used up"""
+        frames = len(out)
+        pos = self._pos[:frames]
+        idx = self._idx[:frames]
+        phases = self._phases[:frames]
+        np.add(self._steps[:frames], self._phase, out=pos)
+        np.floor_divide(pos, self.up, out=idx)
+        np.remainder(pos, self.up, out=phases)
+
+        windows = sliding_window_view(self._x[: self._have], self.taps, axis=0)
+        np.take(windows, idx, axis=0, out=self._windows[:frames])
+        np.take(self.bank, phases, axis=0, out=self._coeffs[:frames])
+        np.einsum("nct,nt->nc", self._windows[:frames], self._coeffs[:frames], out=out)
+
+        total = self._phase + frames * self.down
+        consumed = total // self.up
+        self._phase = total % self.up
+        remaining = self._have - consumed
+        self._x[:remaining] = self._x[consumed : self._have]
+        self._have = remaining
+
+
+class FormatConverter:
+    """Plays a source mixed at one rate and channel count at another
+
+    ``source`` fills an array of stream-format frames (Mixer.mix_into);
+    ``read_into`` fills device-format blocks, pulling exactly as many
+    stream frames as each block needs. Mono is copied to both channels
+    and stereo averaged for a mono device.
+    """
+
+    def __init__(self, source, in_rate, in_channels, out_rate, out_channels, dtype):
+        self.source = source
+        self.in_channels = in_channels
+        self.out_channels = out_channels
+        self.dtype = np.dtype(dtype)
+        self.resampler = None
+        if in_rate != out_rate:
+            self.resampler = PolyphaseResampler(in_rate, out_rate, in_channels)
+        if self.dtype.kind == "i":
+            info = np.iinfo(self.dtype)
+            self._limits = (info.min, info.max)
+        else:
+            self._limits = (-1.0, 1.0)
+        self._allocate(0, 0)
+
+    def _allocate(self, in_frames, out_frames):
+        self._in = np.zeros((in_frames, self.in_channels), dtype=self.dtype)
+        self._work = np.zeros((out_frames, self.in_channels), dtype=np.float32)
+        self._mixed = np.zeros((out_frames, self.out_channels), dtype=np.float32)
+
+    def read_into(self, out):
+        frames = len(out)
+        resampler = self.resampler
+        needed = frames if resampler is None else resampler.frames_needed(frames)
+        if needed > len(self._in) or frames > len(self._work):
+            self._allocate(max(needed, len(self._in)), max(frames, len(self._work)))
+        block = self._in[:needed]
+        self.source(block)
+        work = self._work[:frames]
+        if resampler is None:
+            work[:] = block
+        else:
+            resampler.input_view(needed)[:] = block
+            resampler.commit(needed)
+            resampler.process(work)
+
+        if self.in_channels == self.out_channels:
+            mixed = work
+        else:
+            mixed = self._mixed[:frames]
+            if self.in_channels == 1:
+                mixed[:] = work
+            else:
+                np.mean(work, axis=1, keepdims=True, out=mixed)
+        if self.dtype.kind == "i":
+            np.rint(mixed, out=mixed)
+        np.clip(mixed, *self._limits, out=mixed)
+        out[:] = mixed
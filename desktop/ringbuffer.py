@@ -0,0 +1,241 @@
+import numpy as np
+
+
+class RingReader:
+    """Read side of a frame ring, shared by PCMRingBuffer and RingCursor
+
+    Subclasses provide ``_frames`` (the storage as frames x channels),
+    ``capacity_frames``, the read position ``_read_pos`` in frames, and
+    ``available()``. Reads only ever move ``_read_pos`` forward.
+    """
+
+    def peek_into(self, out, count):
+        """Copy up to ``count`` frames into ``out`` without consuming them"""
+        count = min(count, self.available(), len(out))
+        start = self._read_pos % self.capacity_frames
+        first = min(count, self.capacity_frames - start)
+        out[:first] = self._frames[start : start + first]
+        if count > first:
+            out[first:count] = self._frames[: count - first]
+        return count
+
+    def read_view(self, max_frames=None):
+        """Return the next contiguous run of readable frames without copying
+
+        Consume them with ``advance`` once they have been used.
+        """
+        count = self.available()
+        if max_frames is not None:
+            count = min(count, max_frames)
+        start = self._read_pos % self.capacity_frames
+        end = min(start + count, self.capacity_frames)
+        return self._frames[start:end]
+
+    def advance(self, count):
+        """Consume ``count`` frames"""
+        self._read_pos += min(count, self.available())
+
+    def copy_into(self, out):
+        """Fill ``out`` with frames as-is, padding with silence"""
+        count = self.peek_into(out, len(out))
+        self._read_pos += count
+        if count < len(out):
+            out[count:] = 0
+        return count
+
+
+class PCMRingBuffer(RingReader):
+    """Fixed-capacity, frame-aligned PCM ring buffer.
+
+    A single producer (the network thread) writes raw bytes, usually straight
+    from ``socket.recv_into``, and a single consumer (the audio callback) reads
+    whole frames with slice copies. Positions are monotonic counters owned by
+    one side each, so neither side takes a lock and nothing is allocated on
+    the read path.
+    """
+
+    # Writers wait for room rather than losing audio
+    drops_when_full = False
+
+    def __init__(self, capacity_frames, channels, dtype=np.int16):
+        self.capacity_frames = int(capacity_frames)
+        self.channels = channels
+        self.dtype = np.dtype(dtype)
+        self.frame_bytes = self.dtype.itemsize * channels
+        self.capacity_bytes = self.capacity_frames * self.frame_bytes
+
+        self._data = self.allocate(self.capacity_frames * channels)
+        self._frames = self._data.reshape(-1, channels)
+        self._bytes = memoryview(self._data).cast("B")
+
+        # Written bytes (producer) and consumed frames (consumer)
+        self._write_pos = 0
+        self._read_pos = 0
+        # Optional reader that resamples on the way out (see drift.py)
+        self.resampler = None
+        # Frames written before the last flush; set by the producer only
+        self._flushed_frames = 0
+
+    def allocate(self, samples):
+        """Storage for the samples; subclasses may place it elsewhere"""
+        return np.zeros(samples, dtype=self.dtype)
+
+    def available(self):
+        """Number of complete frames ready to be read"""
+        return self._write_pos // self.frame_bytes - self._read_pos
+
+    def free_bytes(self):
+        """Number of bytes that can be written without overwriting unread data"""
+        return self.capacity_bytes - (
+            self._write_pos - self._read_pos * self.frame_bytes
+        )
+
+    def write_view(self, max_bytes=None):
+        """Return a writable view of the next contiguous free region
+
+        The view is empty when the buffer is full. Fill it (e.g. with
+        ``recv_into``) and publish the result with ``commit_write``.
+        """
+        free = self.free_bytes()
+        if max_bytes is not None:
+            free = min(free, max_bytes)
+        start = self._write_pos % self.capacity_bytes
+        end = min(start + free, self.capacity_bytes)
+        return self._bytes[start:end]
+
+    def commit_write(self, nbytes):
+        """Publish ``nbytes`` written into the last ``write_view``"""
+        self._write_pos += nbytes
+
+    def write(self, data):
+        """Copy as much of ``data`` as fits and return the number of bytes taken"""
+        data = memoryview(data)
+        if not data.nbytes:
+            return 0
+        data = data.cast("B")
+        written = 0
+        while written < len(data):
+            view = self.write_view(len(data) - written)
+            if not len(view):
+                break
+            view[:] = data[written : written + len(view)]
+            self.commit_write(len(view))
+            written += len(view)
+        return written
+
+    def discard_partial(self):
+        """Drop a trailing incomplete frame, e.g. when a connection ends"""
+        self._write_pos -= self._write_pos % self.frame_bytes
+
+    def flush(self):
+        """Producer side: drop everything written so far
+
+        The consumer skips the stale frames at its next read, so the
+        producer never moves the read position itself.
+        """
+        self.discard_partial()
+        self._flushed_frames = self._write_pos // self.frame_bytes
+
+    def skip_flushed(self):
+        """Consumer side: jump past frames dropped by ``flush``; True if any"""
+        if self._flushed_frames > self._read_pos:
+            self._read_pos = self._flushed_frames
+            return True
+        return False
+
+    def read_into(self, out):
+        """Fill ``out`` with frames, padding with silence; return frames filled"""
+        self.skip_flushed()
+        if self.resampler is not None:
+            return self.resampler.read_into(self, out)
+        return self.copy_into(out)
+
+
+class BroadcastRing:
+    """Single-writer ring buffer read by any number of independent cursors
+
+    The writer (the audio callback) never waits: it overwrites the oldest
+    audio, and each reader keeps its own position, which must stay within
+    the capacity of ``write_pos``. Readers get views of the storage
+    itself (``view`` for bytes, or a RingCursor for frames), so one copy
+    in serves every reader.
+    """
+
+    def __init__(self, capacity_frames, channels, dtype=np.int16):
+        self.capacity_frames = int(capacity_frames)
+        self.channels = channels
+        self.dtype = np.dtype(dtype)
+        self.frame_bytes = self.dtype.itemsize * channels
+        self.capacity_bytes = self.capacity_frames * self.frame_bytes
+        self._data = np.zeros(self.capacity_frames * channels, dtype=self.dtype)
+        self._frames = self._data.reshape(-1, channels)
+        self._bytes = memoryview(self._data).cast("B")
+        # Bytes ever written, always whole frames; published after the copy
+        self.write_pos = 0
+
+    def write(self, block):
+        data = memoryview(block).cast("B")
+        start = self.write_pos % self.capacity_bytes
+        first = min(len(data), self.capacity_bytes - start)
+        self._bytes[start : start + first] = data[:first]
+        self._bytes[: len(data) - first] = data[first:]
+        self.write_pos += len(data)
+
+    def view(self, start, end):
+        """Contiguous bytes from position ``start`` toward ``end``"""
+        offset = start % self.capacity_bytes
+        return self._bytes[
+            offset : offset + min(end - start, self.capacity_bytes - offset)
+        ]
+
+
+class RingCursor(RingReader):
+    """One reader of a BroadcastRing, with the read side of PCMRingBuffer
+
+    It can stand in for a PCMRingBuffer wherever only reads happen,
+    including behind a DriftCompensator. A cursor starts at the live
+    edge and plays silence until ``start_frames`` are queued, and again
+    after every underrun, so its reader always has a cushion. If it
+    falls more than ``max_lag_frames`` behind, the oldest audio is
+    skipped rather than read while the writer overwrites it.
+    """
+
+    def __init__(self, ring, start_frames=0, max_lag_frames=None):
+        self.ring = ring
+        self.frame_bytes = ring.frame_bytes
+        # The ring's storage, read in place
+        self._frames = ring._frames
+        self.capacity_frames = ring.capacity_frames
+        self.start_frames = start_frames
+        self.max_lag_frames = max_lag_frames or ring.capacity_frames // 2
+        self._read_pos = ring.write_pos // ring.frame_bytes
+        self.primed = False
+        self.underruns = 0
+        self.skipped_frames = 0
+        # Optional reader that resamples on the way out (see drift.py)
+        self.resampler = None
+
+    def available(self):
+        available = self.ring.write_pos // self.frame_bytes - self._read_pos
+        if available > self.max_lag_frames:
+            skip = available - self.start_frames
+            self._read_pos += skip
+            self.skipped_frames += skip
+            available -= skip
+        return available
+
+    def read_into(self, out):
+        """Fill ``out`` with frames, padding with silence; return frames filled"""
+        if not self.primed:
+            if self.available() < max(self.start_frames, len(out)):
+                out.fill(0)
+                return 0
+            self.primed = True
+        if self.resampler is not None:
+            count = self.resampler.read_into(self, out)
+        else:
+            count = self.copy_into(out)
+        if count < len(out):
+            self.underruns += 1
+            self.primed = False
+        return count
@@ -0,0 +1,157 @@
+import struct
+
+import numpy as np
+
+# Optional header a sender may put at the start of a connection (or send as
+# its own datagram over UDP). Streams that do not start with MAGIC are raw
+# PCM in the receiver's configured format.
+MAGIC = b"FMIC"
+VERSION = 3
+
+# magic, version, header length
+HEADER_PREFIX = struct.Struct("!4sBB")
+# ... format, channels, sample rate, frame duration (us). Later versions
+# may append fields; header length lets older receivers skip them.
+HEADER_V1 = struct.Struct("!4sBBBBII")
+# Version 2 appends a flags byte
+HEADER_V2 = struct.Struct("!4sBBBBIIB")
+# Version 3 appends a session ID; a sender that reconnects with the same
+# non-zero ID takes its place in the mix back (0 means none)
+HEADER_V3 = struct.Struct("!4sBBBBIIBQ")
+
+# Over TCP, every frame is preceded by its capture time as a big-endian
+# uint64 in microseconds (UDP packets always carry one)
+FLAG_TIMESTAMPS = 0x01
+
+FORMAT_INT16 = 0
+FORMAT_FLOAT32 = 1
+FORMAT_ULAW = 2
+FORMAT_IMA_ADPCM = 3
+
+# Wire format code -> (decoded sample format, codec)
+SAMPLE_FORMATS = {
+    FORMAT_INT16: ("int16", None),
+    FORMAT_FLOAT32: ("float32", None),
+    FORMAT_ULAW: ("int16", "ulaw"),
+    FORMAT_IMA_ADPCM: ("int16", "ima-adpcm"),
+}
+
+
+class SessionInfo:
+    """Stream parameters declared by a sender (or assumed for raw PCM)"""
+
+    def __init__(
+        self,
+        sample_rate,
+        channels,
+        sample_format="int16",
+        frame_us=20000,
+        codec=None,
+        timestamps=False,
+        session_id=0,
+    ):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        # Format of the decoded PCM; ``codec`` is how it travels on the wire
+        self.sample_format = sample_format
+        self.frame_us = frame_us
+        self.codec = codec
+        self.timestamps = timestamps
+        self.session_id = session_id
+
+    @property
+    def dtype(self):
+        return np.dtype(self.sample_format)
+
+    @property
+    def frame_samples(self):
+        return max(1, self.sample_rate * self.frame_us // 1000000)
+
+    def same_stream(self, other):
+        """Whether both sessions can share one output stream as-is"""
+        return (
+            self.sample_rate == other.sample_rate
+            and self.channels == other.channels
+            and self.sample_format == other.sample_format
+            and self.frame_samples == other.frame_samples
+        )
+
+    def same_encoding(self, other):
+        """Whether a connection in ``other``'s session decodes like this one"""
+        return (
+            self.same_stream(other)
+            and self.codec == other.codec
+            and self.timestamps == other.timestamps
+        )
+
+    def pack(self):
+        codes = {fmt: code for code, fmt in SAMPLE_FORMATS.items()}
+        code = codes[(self.sample_format, self.codec)]
+        return HEADER_V3.pack(
+            MAGIC,
+            VERSION,
+            HEADER_V3.size,
+            code,
+            self.channels,
+            self.sample_rate,
+            self.frame_us,
+            FLAG_TIMESTAMPS if self.timestamps else 0,
+            self.session_id,
+        )
+
+    def __repr__(self):
+        return (
+            f"{self.sample_rate} Hz, {self.channels} ch, "
+            f"{self.codec or self.sample_format}, "
+            f"{self.frame_us / 1000:g} ms frames"
+            f"{', timestamped' if self.timestamps else ''}"
+        )
+
+
+def header_length(data):
+    """Length of the header starting ``data``, or None if more bytes are needed
+
+    Returns 0 when ``data`` is not a session header at all.
+    """
+    if len(data) < len(MAGIC):
+        return None
+    if bytes(data[: len(MAGIC)]) != MAGIC:
+        return 0
+    if len(data) < HEADER_PREFIX.size:
+        return None
+    return HEADER_PREFIX.unpack_from(data)[2]
+
+
+def parse_header(data):
+    """Parse a complete header into a SessionInfo, raising ValueError if invalid"""
+    if len(data) < HEADER_V1.size:
+        raise ValueError(f"Session header too short ({len(data)} bytes)")
+    _, version, length, code, channels, sample_rate, frame_us = HEADER_V1.unpack_from(
+        data
+    )
+    if version < 1 or length < HEADER_V1.size:
+        raise ValueError(f"Unsupported session header version {version}")
+    if code not in SAMPLE_FORMATS:
+        raise ValueError(f"Unsupported sample format {code}")
+    if channels not in (1, 2):
+        raise ValueError(f"Unsupported channel count {channels}")
+    if not 8000 <= sample_rate <= 192000:
+        raise ValueError(f"Unsupported sample rate {sample_rate}")
+    if not 1000 <= frame_us <= 100000:
+        raise ValueError(f"Unsupported frame duration {frame_us} us")
+    flags = 0
+    if version >= 2 and length >= HEADER_V2.size and len(data) >= HEADER_V2.size:
+        flags = HEADER_V2.unpack_from(data)[-1]
+    session_id = 0
+    if version >= 3 and length >= HEADER_V3.size and len(data) >= HEADER_V3.size:
+        session_id = HEADER_V3.unpack_from(data)[-1]
+    sample_format, codec = SAMPLE_FORMATS[code]
+    return SessionInfo(
+        sample_rate,
+        channels,
+        sample_format,
+        frame_us,
+        codec,
+        timestamps=bool(flags & FLAG_TIMESTAMPS),
+        session_id=session_id,
+    )
@@ -0,0 +1,145 @@
+import pickle
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from ringbuffer import PCMRingBuffer
+
+
+class SharedPCMRing(PCMRingBuffer):
+    """PCMRingBuffer whose samples and positions live in shared memory
+
+    One process creates the block and another attaches to it by name;
+    after that it behaves exactly like PCMRingBuffer, with one process
+    producing and the other consuming. Each position is an aligned int64
+    written by one side only (on its own cache line), so publishing it is
+    a single store and neither process takes a lock. Attach before either
+    side starts reading or writing, since setting up the ring resets the
+    positions.
+    """
+
+    HEADER_BYTES = 128
+    # int64 slots for the write and read positions, 64 bytes apart
+    WRITE_SLOT = 0
+    READ_SLOT = 8
+
+    def __init__(self, capacity_frames, channels, dtype=np.int16, name=None):
+        dtype = np.dtype(dtype)
+        size = self.HEADER_BYTES + int(capacity_frames) * channels * dtype.itemsize
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        self._positions = np.ndarray(
+            (self.HEADER_BYTES // 8,), dtype=np.int64, buffer=self.shm.buf
+        )
+        super().__init__(capacity_frames, channels, dtype)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def allocate(self, samples):
+        return np.ndarray(
+            (samples,), dtype=self.dtype, buffer=self.shm.buf, offset=self.HEADER_BYTES
+        )
+
+    @property
+    def _write_pos(self):
+        return int(self._positions[self.WRITE_SLOT])
+
+    @_write_pos.setter
+    def _write_pos(self, value):
+        self._positions[self.WRITE_SLOT] = value
+
+    @property
+    def _read_pos(self):
+        return int(self._positions[self.READ_SLOT])
+
+    @_read_pos.setter
+    def _read_pos(self, value):
+        self._positions[self.READ_SLOT] = value
+
+    def close(self):
+        """Detach; the creating process also frees the block"""
+        # Every view into the block must be gone before it can be closed
+        self._bytes.release()
+        self._data = self._frames = self._bytes = self._positions = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class SharedSnapshot:
+    """Latest value published by one process, read by another without locks
+
+    The writer pickles each value into a shared block behind a sequence
+    number that is odd while it writes (a seqlock). A reader copies the
+    payload and keeps it only if the sequence number was even and did not
+    change meanwhile, so it never waits for the writer and never sees a
+    half-written value.
+    """
+
+    HEADER_BYTES = 64
+    # int64 slots for the sequence number and the payload length
+    SEQ_SLOT = 0
+    LENGTH_SLOT = 1
+    READ_ATTEMPTS = 3
+
+    def __init__(self, capacity_bytes=256 * 1024, name=None):
+        if name is None:
+            self.shm = shared_memory.SharedMemory(
+                create=True, size=self.HEADER_BYTES + capacity_bytes
+            )
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        self._header = np.ndarray(
+            (self.HEADER_BYTES // 8,), dtype=np.int64, buffer=self.shm.buf
+        )
+        if self.owner:
+            self._header[:] = 0
+        self._payload = self.shm.buf[self.HEADER_BYTES :]
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def publish(self, value):
+        """Writer side: replace the snapshot with ``value``"""
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(data) > len(self._payload):
+            raise ValueError(f"Snapshot of {len(data)} bytes does not fit")
+        seq = int(self._header[self.SEQ_SLOT])
+        self._header[self.SEQ_SLOT] = seq + 1
+        self._payload[: len(data)] = data
+        self._header[self.LENGTH_SLOT] = len(data)
+        self._header[self.SEQ_SLOT] = seq + 2
+
+    def read(self):
+        """Reader side: the latest value, or None if there is none yet
+
+        Also None if the writer kept replacing it while it was copied.
+        """
+        for _ in range(self.READ_ATTEMPTS):
+            seq = int(self._header[self.SEQ_SLOT])
+            if seq == 0:
+                return None
+            if seq % 2:
+                continue
+            length = int(self._header[self.LENGTH_SLOT])
+            data = bytes(self._payload[: min(length, len(self._payload))])
+            if int(self._header[self.SEQ_SLOT]) == seq:
+                return pickle.loads(data)
+        return None
+
+    def close(self):
+        """Detach; the creating process also frees the block"""
+        self._payload.release()
+        self._header = self._payload = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+
+from audiocodecs import (
+    IMA_BLOCK_HEADER,
+    IMA_INDEX_TABLE,
+    IMA_STEP_TABLE,
+    ULAW_TABLE,
+    ImaAdpcmDecoder,
+    MuLawDecoder,
+    block_samples,
+    ima_block_bytes,
+)
+
+
+def ulaw_encode(x):
+    """G.711 mu-law encoder, one sample at a time"""
+    sign = 0x80 if x < 0 else 0
+    magnitude = min(abs(x), 32635) + 0x84
+    exponent = max(magnitude.bit_length() - 8, 0)
+    mantissa = (magnitude >> (exponent + 3)) & 0x0F
+    return ~(sign | exponent << 4 | mantissa) & 0xFF
+
+
+def ima_decode_reference(block, channels, samples):
+    """IMA-ADPCM block decoder, one sample at a time"""
+    out = np.zeros((samples, channels), dtype=np.int16)
+    for ch in range(channels):
+        predictor, index, _ = IMA_BLOCK_HEADER.unpack_from(block, 4 * ch)
+        index = min(index, 88)
+        for n in range(samples):
+            group, nibble = divmod(n, 8)
+            byte = block[4 * channels + (group * channels + ch) * 4 + nibble // 2]
+            code = byte >> 4 if nibble % 2 else byte & 0x0F
+            step = int(IMA_STEP_TABLE[index])
+            diff = step >> 3
+            if code & 4:
+                diff += step
+            if code & 2:
+                diff += step >> 1
+            if code & 1:
+                diff += step >> 2
+            predictor += -diff if code & 8 else diff
+            predictor = max(-32768, min(32767, predictor))
+            index = max(0, min(88, index + int(IMA_INDEX_TABLE[code])))
+            out[n, ch] = predictor
+    return out
+
+
+def random_ima_blocks(rng, blocks, channels, frame_samples):
+    size = ima_block_bytes(channels, frame_samples)
+    data = bytearray(rng.integers(0, 256, blocks * size, dtype=np.uint8).tobytes())
+    for b in range(blocks):
+        for ch in range(channels):
+            IMA_BLOCK_HEADER.pack_into(
+                data,
+                b * size + 4 * ch,
+                int(rng.integers(-32768, 32768)),
+                int(rng.integers(0, 89)),
+                0,
+            )
+    return bytes(data), size
+
+
+@pytest.mark.parametrize("channels", [1, 2])
+@pytest.mark.parametrize("frame_samples", [8, 20, 960])
+def test_ima_adpcm_matches_scalar_decoder(channels, frame_samples):
+    rng = np.random.default_rng(channels * 1000 + frame_samples)
+    data, size = random_ima_blocks(rng, 3, channels, frame_samples)
+    decoded = ImaAdpcmDecoder(channels, frame_samples).decode(data)
+    samples = block_samples(frame_samples)
+    expected = np.concatenate(
+        [
+            ima_decode_reference(data[b * size : (b + 1) * size], channels, samples)
+            for b in range(3)
+        ]
+    )
+    np.testing.assert_array_equal(decoded, expected)
+
+
+def test_ima_adpcm_clamps_at_full_scale():
+    # Largest step, every code pushing the same way
+    header = IMA_BLOCK_HEADER.pack(32000, 88, 0)
+    block = header + bytes([0x77]) * 4
+    decoded = ImaAdpcmDecoder(1, 8).decode(block)
+    np.testing.assert_array_equal(decoded, ima_decode_reference(block, 1, 8))
+    assert decoded.max() == 32767
+
+
+def test_ima_adpcm_ignores_a_partial_block():
+    decoder = ImaAdpcmDecoder(1, 8)
+    assert decoder.decode(b"\0" * (decoder.unit_bytes - 1)).shape == (0, 1)
+
+
+def test_ulaw_decodes_every_code_to_a_value_that_encodes_back():
+    for code in range(256):
+        back = ulaw_encode(int(ULAW_TABLE[code]))
+        # Negative zero (0x7F) encodes as positive zero (0xFF)
+        assert back == (0xFF if code == 0x7F else code)
+
+
+def test_ulaw_round_trip_error_within_one_step():
+    x = np.arange(-32768, 32768, 7)
+    codes = np.array([ulaw_encode(int(v)) for v in x], dtype=np.uint8)
+    decoded = MuLawDecoder(1, 8).decode(codes.tobytes())[:, 0].astype(np.int64)
+    # Each segment's step is 1/16 of its lower edge, biased by 0x84
+    limit = (np.minimum(np.abs(x), 32635) + 0x84) // 16 + 1
+    error = np.abs(decoded - x)
+    assert (error <= limit + np.maximum(np.abs(x) - 32635, 0)).all()
+    # Quiet samples stay quiet, and the sign is kept
+    assert decoded[np.abs(x) < 8].max() <= 8
+    assert (np.sign(decoded[np.abs(x) > 16]) == np.sign(x[np.abs(x) > 16])).all()
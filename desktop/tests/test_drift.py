@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from drift import DriftCompensator
+from ringbuffer import PCMRingBuffer
+
+# A low rate and long blocks keep 20 simulated minutes quick
+RATE = 8000
+BLOCK = 800
+TARGET = 2 * BLOCK
+
+
+def run(ppm, seconds):
+    """Feed a ring from a source whose clock is off by ``ppm``"""
+    ring = PCMRingBuffer(RATE * 4, 1)
+    compensator = ring.resampler = DriftCompensator(RATE, 1, BLOCK, TARGET)
+    ring.write(np.zeros(TARGET, dtype=np.int16))
+    source = np.zeros(2 * BLOCK, dtype=np.int16)
+    out = np.empty((BLOCK, 1), dtype=np.int16)
+    owed = 0.0
+    for _ in range(seconds * RATE // BLOCK):
+        owed += BLOCK * (1 + ppm * 1e-6)
+        count = int(owed)
+        owed -= count
+        ring.write(source[:count])
+        assert ring.read_into(out) == BLOCK
+    return compensator
+
+
+@pytest.mark.parametrize("ppm", [200, -200])
+def test_converges_on_the_clock_mismatch(ppm):
+    compensator = run(ppm, 1200)
+    stats = compensator.stats()
+    assert stats["drift_ppm"] == pytest.approx(ppm, abs=20)
+    # Depth before each read holds at the target
+    assert stats["avg_fill_ms"] == pytest.approx(TARGET * 1000 / RATE, abs=5)
+    assert compensator.bypassed_blocks == 0
+
+
+def test_interpolates_a_ramp_smoothly():
+    ring = PCMRingBuffer(RATE, 1)
+    ring.resampler = DriftCompensator(RATE, 1, BLOCK, TARGET)
+    ring.write(np.arange(3 * BLOCK, dtype=np.int16).reshape(-1, 1))
+    out = np.empty((BLOCK, 1), dtype=np.int16)
+    ring.read_into(out)
+    steps = np.diff(out[:, 0].astype(np.int64))
+    # Above its target the ring is read slightly fast: steps of 1, rarely 2
+    assert set(steps) <= {1, 2}
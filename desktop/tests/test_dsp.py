@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+
+from dsp import (
+    AutoGain,
+    Limiter,
+    NoiseGate,
+    ProcessingChain,
+    block_rms,
+    db_to_gain,
+    gain_to_db,
+)
+
+RATE = 48000
+BLOCK = 480
+
+
+def sine(level_db, blocks, channels=1, freq=440.0):
+    """Blocks of a sine whose RMS is ``level_db`` dBFS"""
+    n = np.arange(blocks * BLOCK)
+    wave = np.sqrt(2) * db_to_gain(level_db) * np.sin(2 * np.pi * freq * n / RATE)
+    wave = np.repeat(wave[:, None], channels, axis=1).astype(np.float32)
+    return np.split(wave, blocks)
+
+
+def run(processor, blocks):
+    out = [block.copy() for block in blocks]
+    for block in out:
+        processor.process(block)
+    return out
+
+
+def test_limiter_holds_the_ceiling():
+    limiter = Limiter(RATE, ceiling_db=-1.0, release_ms=80)
+    # +12 dB over full scale, then a sudden drop and jump again
+    blocks = sine(9, 20, channels=2) + sine(-20, 10, channels=2) + sine(9, 5, 2)
+    out = np.concatenate(run(limiter, blocks))
+    assert np.abs(out).max() <= db_to_gain(-1.0) * (1 + 1e-6)
+    # Loud parts come out right at the ceiling, not squashed further
+    assert np.abs(out).max() > db_to_gain(-1.5)
+
+
+def test_limiter_recovers_after_release():
+    limiter = Limiter(RATE, ceiling_db=-1.0, release_ms=20)
+    run(limiter, sine(9, 5))
+    quiet = sine(-20, 50)
+    out = run(limiter, quiet)
+    np.testing.assert_allclose(out[-1], quiet[-1], atol=1e-4)
+
+
+def test_limiter_on_integer_scaled_audio():
+    limiter = Limiter(RATE, ceiling_db=-1.0, full_scale=32768.0)
+    blocks = [block * 32768 for block in sine(6, 5)]
+    out = np.concatenate(run(limiter, blocks))
+    assert np.abs(out).max() <= db_to_gain(-1.0) * 32768 * (1 + 1e-6)
+
+
+def test_gate_opens_above_threshold_and_closes_after_hold():
+    gate = NoiseGate(RATE, threshold_db=-50, hysteresis_db=6, hold_ms=150)
+    run(gate, sine(-40, 5))
+    assert gate.is_open
+    # Between the close and open levels the gate stays as it is
+    run(gate, sine(-53, 50))
+    assert gate.is_open
+    # Below the close level it waits out the hold time
+    run(gate, sine(-70, 14))
+    assert gate.is_open
+    run(gate, sine(-70, 2))
+    assert not gate.is_open
+    run(gate, sine(-53, 50))
+    assert not gate.is_open
+
+
+def test_closed_gate_mutes_to_its_floor():
+    gate = NoiseGate(RATE, threshold_db=-50, floor_db=-80, release_ms=10)
+    out = run(gate, sine(-60, 50))
+    assert not gate.is_open
+    assert gain_to_db(block_rms(out[-1])) == pytest.approx(-140, abs=0.5)
+
+
+@pytest.mark.parametrize("level_db", [-35, -8])
+def test_agc_converges_on_the_target(level_db):
+    agc = AutoGain(RATE, target_db=-20)
+    out = run(agc, sine(level_db, 1500))
+    assert gain_to_db(block_rms(out[-1])) == pytest.approx(-20, abs=0.5)
+
+
+def test_agc_gain_is_bounded():
+    agc = AutoGain(RATE, target_db=-20, max_gain_db=24, max_cut_db=12)
+    run(agc, sine(-50, 2000))
+    assert agc.gain_db == pytest.approx(24, abs=0.1)
+    run(agc, sine(0, 500))
+    assert agc.gain_db == pytest.approx(-12, abs=0.1)
+
+
+def test_agc_does_not_boost_silence():
+    agc = AutoGain(RATE, target_db=-20, floor_db=-55)
+    run(agc, sine(-70, 500))
+    assert agc.gain_db == 0.0
+
+
+def test_chain_clips_integer_output():
+    chain = ProcessingChain([], 1, np.int16)
+    pcm = np.array([[-32768], [0], [32767]], dtype=np.int16)
+    np.testing.assert_array_equal(chain.process(pcm), pcm)
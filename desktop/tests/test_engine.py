@@ -0,0 +1,142 @@
+import pytest
+
+from audiocodecs import DECODERS
+from engine import AudioReceiver
+from replay import ReplayConnection, ReplayListener, ReplaySelector
+from session import SessionInfo
+
+ADDR = ("10.0.0.2", 4000)
+
+
+@pytest.fixture
+def receiver():
+    receiver = AudioReceiver(
+        sample_rate=48000, channels=1, transport="udp", output="null"
+    )
+    yield receiver
+    receiver.cleanup()
+
+
+def send_header(receiver, session, addr=ADDR):
+    listener = ReplayListener()
+    listener.pending.append((session.pack(), addr))
+    receiver.on_datagram(listener)
+    return receiver._udp_senders[addr]
+
+
+def test_repeated_udp_header_keeps_the_sender(receiver):
+    client = send_header(receiver, SessionInfo(48000, 1))
+    assert send_header(receiver, SessionInfo(48000, 1)) is client
+
+
+@pytest.mark.parametrize(
+    "changed",
+    [
+        SessionInfo(48000, 1, codec="ima-adpcm"),
+        SessionInfo(48000, 1, codec="ulaw"),
+        SessionInfo(48000, 1, timestamps=True),
+    ],
+)
+def test_udp_header_with_new_encoding_rebuilds_the_decoder(receiver, changed):
+    first = send_header(receiver, SessionInfo(48000, 1))
+    client = send_header(receiver, changed)
+    assert client is not first
+    assert client.session.same_encoding(changed)
+    assert client.packets.decoder is client.decoder
+    if changed.codec:
+        assert isinstance(client.decoder, DECODERS[changed.codec])
+
+
+@pytest.fixture
+def tcp_receiver():
+    receiver = AudioReceiver(
+        sample_rate=48000, channels=1, transport="tcp", output="null"
+    )
+    receiver.selector = ReplaySelector()
+    yield receiver
+    receiver.cleanup()
+
+
+def connect(receiver, session, addr=ADDR):
+    """Accept a connection that sends ``session``'s header; returns it"""
+    conn = ReplayConnection()
+    conn.chunks.append(session.pack())
+    listener = ReplayListener()
+    listener.pending.append((conn, addr))
+    receiver.on_accept(listener)
+    serve(receiver)
+    return conn
+
+
+def serve(receiver):
+    """Read until no connection has anything left"""
+    ready = receiver.selector.ready()
+    while ready:
+        for key in ready:
+            if key.fileobj in receiver.selector.keys:
+                key.data(key.fileobj)
+        ready = receiver.selector.ready()
+
+
+def hang_up(receiver, conn):
+    conn.eof = True
+    serve(receiver)
+
+
+def test_sender_resumes_within_the_window(tcp_receiver):
+    first = connect(tcp_receiver, SessionInfo(48000, 1, session_id=7))
+    client = tcp_receiver._connections[first]
+    client.gain = 0.5
+    hang_up(tcp_receiver, first)
+    assert client.departed_at is not None
+
+    tcp_receiver.expire_sessions()
+    second = connect(
+        tcp_receiver, SessionInfo(48000, 1, session_id=7), addr=("10.0.0.3", 4001)
+    )
+    assert tcp_receiver._connections[second] is client
+    assert client.departed_at is None
+    assert client.gain == 0.5
+    assert client in tcp_receiver.mixer.clients
+    assert tcp_receiver.resumes.value == 1
+
+
+def test_resume_closes_the_old_connection(tcp_receiver):
+    first = connect(tcp_receiver, SessionInfo(48000, 1, session_id=7))
+    client = tcp_receiver._connections[first]
+    second = connect(tcp_receiver, SessionInfo(48000, 1, session_id=7))
+    assert first not in tcp_receiver._connections
+    assert tcp_receiver._connections[second] is client
+    assert tcp_receiver.mixer.clients.count(client) == 1
+
+
+def test_sender_is_new_after_the_window(tcp_receiver):
+    first = connect(tcp_receiver, SessionInfo(48000, 1, session_id=7))
+    client = tcp_receiver._connections[first]
+    hang_up(tcp_receiver, first)
+    client.departed_at -= AudioReceiver.RESUME_WINDOW_S + 1
+
+    tcp_receiver.expire_sessions()
+    second = connect(tcp_receiver, SessionInfo(48000, 1, session_id=7))
+    assert tcp_receiver._connections[second] is not client
+    assert tcp_receiver.resumes.value == 0
+
+
+def test_other_session_id_is_a_new_sender(tcp_receiver):
+    first = connect(tcp_receiver, SessionInfo(48000, 1, session_id=7))
+    client = tcp_receiver._connections[first]
+    hang_up(tcp_receiver, first)
+
+    second = connect(tcp_receiver, SessionInfo(48000, 1, session_id=8))
+    assert tcp_receiver._connections[second] is not client
+    assert tcp_receiver.resumes.value == 0
+
+
+def test_udp_sender_resumes_from_a_new_address(receiver):
+    client = send_header(receiver, SessionInfo(48000, 1, session_id=7))
+    moved = send_header(
+        receiver, SessionInfo(48000, 1, session_id=7), addr=("10.0.0.3", 4001)
+    )
+    assert moved is client
+    assert ADDR not in receiver._udp_senders
+    assert receiver.resumes.value == 1
@@ -0,0 +1,115 @@
+import numpy as np
+import pytest
+
+from jitterbuffer import JitterBuffer
+
+# At 1 kHz one frame is one millisecond
+RATE = 1000
+BLOCK = 10
+
+
+def make_buffer(latency_ms=50, max_latency_ms=None):
+    return JitterBuffer(RATE, 1, BLOCK, latency_ms, max_latency_ms)
+
+
+def ramp(start, count):
+    return np.arange(start, start + count, dtype=np.int16)
+
+
+def read_block(buffer):
+    out = np.empty((BLOCK, 1), dtype=np.int16)
+    return buffer.read_into(out), out
+
+
+def test_waits_for_the_target_before_playing():
+    buffer = make_buffer()
+    buffer.write(ramp(1, 40))
+    count, out = read_block(buffer)
+    assert count == 0
+    assert not out.any()
+    buffer.write(ramp(41, 10))
+    count, out = read_block(buffer)
+    assert count == BLOCK
+    np.testing.assert_array_equal(out[:, 0], ramp(1, BLOCK))
+
+
+def test_trims_to_the_target_above_the_maximum():
+    buffer = make_buffer(50, 100)
+    buffer.write(ramp(0, 150))
+    count, out = read_block(buffer)
+    assert count == BLOCK
+    assert buffer.skipped_frames == 100
+    # Playback resumes target frames behind the newest audio
+    np.testing.assert_array_equal(out[:, 0], ramp(100, BLOCK))
+    assert buffer.available() == 40
+
+
+def test_repeated_underruns_raise_the_target():
+    buffer = make_buffer(50, 100)
+    for _ in range(JitterBuffer.UNDERRUN_LIMIT):
+        buffer.write(ramp(0, 50))
+        while read_block(buffer)[0] == BLOCK:
+            pass
+    assert buffer.underruns == JitterBuffer.UNDERRUN_LIMIT
+    assert buffer.target_ms() == 50 + JitterBuffer.STEP_MS
+
+
+def test_target_never_reaches_the_maximum():
+    buffer = make_buffer(50, 70)
+    for _ in range(JitterBuffer.UNDERRUN_LIMIT * 5):
+        buffer.write(ramp(0, int(buffer.target_frames)))
+        while read_block(buffer)[0] == BLOCK:
+            pass
+    assert buffer.target_frames == 70 - BLOCK
+
+
+def test_retarget_applies_at_the_next_read():
+    buffer = make_buffer(50)
+    assert buffer.retarget(80)
+    assert buffer.target_ms() == 50
+    read_block(buffer)
+    assert buffer.target_ms() == 80
+    assert buffer.max_frames == 160
+
+
+def test_maximum_must_leave_room_for_a_block():
+    with pytest.raises(ValueError):
+        make_buffer(50, 55)
+
+
+def test_overflow_is_discarded_not_blocking():
+    buffer = make_buffer(50)
+    data = ramp(0, buffer.capacity_frames + 20)
+    assert buffer.write(data) == data.nbytes
+    assert buffer.available() == buffer.capacity_frames
+    assert buffer.overflow_bytes == 20 * buffer.frame_bytes
+
+
+def receive(buffer, data, chunk):
+    """Feed ``data`` the way the network thread does, ``chunk`` bytes at most"""
+    pos = 0
+    while pos < len(data):
+        view = buffer.write_view()
+        size = min(len(view), chunk, len(data) - pos)
+        view[:size] = data[pos : pos + size]
+        buffer.commit_write(size)
+        pos += size
+
+
+def test_overflow_drops_whole_frames():
+    buffer = JitterBuffer(RATE, 2, BLOCK, 50)
+    stream = np.tile(np.array([1000, -2000], dtype=np.int16), 3000).tobytes()
+    # Overfill, cutting the stream mid-frame
+    split = buffer.capacity_bytes + 4 * 25 + 3
+    receive(buffer, stream[:split], 7)
+    assert buffer.overflow_bytes % buffer.frame_bytes
+    out = np.empty((BLOCK, 2), dtype=np.int16)
+    while buffer.read_into(out):
+        pass
+    receive(buffer, stream[split : split + 4 * 200 + 1], 7)
+    assert buffer.overflow_bytes % buffer.frame_bytes == 0
+    played = 0
+    while buffer.read_into(out) == BLOCK:
+        played += 1
+        assert (out == [1000, -2000]).all()
+    assert played
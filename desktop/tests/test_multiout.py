@@ -0,0 +1,79 @@
+import numpy as np
+
+from multiout import MultiDeviceOutput
+from session import SessionInfo
+
+
+class FakeStream:
+    def __init__(self, fail_start=False, **kwargs):
+        self.kwargs = kwargs
+        self.fail_start = fail_start
+        self.closed = False
+
+    def start(self):
+        if self.fail_start:
+            raise OSError("device busy")
+
+    def stop(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def play(self, blocks):
+        """Run the callback like the device would; return the last block"""
+        out = np.empty(
+            (self.kwargs["blocksize"], self.kwargs["channels"]),
+            dtype=self.kwargs["dtype"],
+        )
+        for _ in range(blocks):
+            self.kwargs["callback"](out, len(out), None, None)
+        return out
+
+
+def stream_factory(device, **kwargs):
+    if device == "missing":
+        raise OSError("no such device")
+    return FakeStream(fail_start=device == "busy", device=device, **kwargs)
+
+
+def native_formats(device, session):
+    if device == "cd":
+        return SessionInfo(44100, 2, session.sample_format, session.frame_us)
+    return session
+
+
+def tone_block(session, n):
+    t = np.arange(n * session.frame_samples, (n + 1) * session.frame_samples)
+    wave = 10000 * np.sin(2 * np.pi * 440 * t / session.sample_rate)
+    return np.rint(wave).astype(np.int16)[:, None]
+
+
+def test_each_device_opens_at_its_own_format():
+    session = SessionInfo(48000, 1)
+    outputs = MultiDeviceOutput(
+        ["same", "cd"], session, stream_factory, session_for_device=native_formats
+    )
+    same, cd = (output.stream for output in outputs.outputs)
+    assert same.kwargs["samplerate"] == 48000
+    assert (cd.kwargs["samplerate"], cd.kwargs["channels"]) == (44100, 2)
+    assert cd.kwargs["blocksize"] == 882
+    for n in range(10):
+        outputs.write(tone_block(session, n))
+    out = cd.play(5)
+    assert np.abs(out).max() > 5000
+    np.testing.assert_array_equal(out[:, 0], out[:, 1])
+    outputs.close()
+
+
+def test_failed_devices_are_left_out():
+    session = SessionInfo(48000, 1)
+    outputs = MultiDeviceOutput(["missing", "ok", "busy"], session, stream_factory)
+    assert [output.device for output in outputs.outputs] == ["ok", "busy"]
+    outputs.start()
+    assert [output.device for output in outputs.outputs] == ["ok"]
+    stats = outputs.stats()
+    assert stats["device missing"] == {"error": "no such device"}
+    assert stats["device busy"] == {"error": "device busy"}
+    assert "underruns" in stats["device ok"]
+    outputs.close()
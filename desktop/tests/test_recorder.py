@@ -0,0 +1,100 @@
+import errno
+import os
+import wave
+
+import numpy as np
+import pytest
+
+from recorder import MappedWavFile, Recorder
+
+
+def read_wav(path):
+    with wave.open(path, "rb") as wav:
+        params = wav.getparams()
+        data = np.frombuffer(wav.readframes(params.nframes), dtype=np.int16)
+    return params, data.reshape(-1, params.nchannels)
+
+
+def tone(frames, channels=2):
+    return (
+        (np.arange(frames * channels) % 1000).astype(np.int16).reshape(frames, channels)
+    )
+
+
+def test_close_patches_the_header_and_trims_the_file(tmp_path):
+    path = str(tmp_path / "out.wav")
+    wav = MappedWavFile(path, 48000, 2, np.int16, grow_bytes=4096)
+    audio = tone(3000)
+    # Past the first reservation, so the file grows once
+    wav.write(audio[:1000])
+    wav.write(audio[1000:])
+    wav.close()
+    params, data = read_wav(path)
+    assert (params.framerate, params.nchannels, params.sampwidth) == (48000, 2, 2)
+    np.testing.assert_array_equal(data, audio)
+    assert os.path.getsize(path) == 44 + audio.nbytes
+
+
+def test_grows_with_plain_writes_without_fallocate(tmp_path, monkeypatch):
+    monkeypatch.delattr(os, "posix_fallocate", raising=False)
+    path = str(tmp_path / "out.wav")
+    wav = MappedWavFile(path, 8000, 2, np.int16, grow_bytes=1000)
+    audio = tone(2000)
+    wav.write(audio)
+    wav.close()
+    np.testing.assert_array_equal(read_wav(path)[1], audio)
+
+
+def record(tmp_path, blocks, **kwargs):
+    recorder = Recorder(str(tmp_path / "rec.wav"), 8000, 2, **kwargs)
+    recorder.start()
+    for block in blocks:
+        recorder.write(block)
+    recorder.stop()
+    return recorder
+
+
+def test_rotates_by_size(tmp_path):
+    audio = tone(5000)
+    recorder = record(tmp_path, np.split(audio, 10), max_bytes=8000)
+    # 2000 frames of 4 bytes per file
+    assert [os.path.basename(path) for path in recorder.files] == [
+        "rec.wav",
+        "rec-2.wav",
+        "rec-3.wav",
+    ]
+    parts = [read_wav(path)[1] for path in recorder.files]
+    assert [len(part) for part in parts] == [2000, 2000, 1000]
+    np.testing.assert_array_equal(np.concatenate(parts), audio)
+    assert recorder.recorded_frames == 5000
+
+
+@pytest.fixture
+def disk_full(monkeypatch):
+    def fallocate(fd, offset, length):
+        # Room for the first reservation only
+        if offset:
+            raise OSError(errno.ENOSPC, "No space left on device")
+        os.ftruncate(fd, length)
+
+    monkeypatch.setattr(os, "posix_fallocate", fallocate, raising=False)
+
+
+def test_disk_full_while_growing_keeps_what_was_written(tmp_path, disk_full):
+    path = str(tmp_path / "out.wav")
+    wav = MappedWavFile(path, 8000, 2, np.int16, grow_bytes=4000)
+    audio = tone(2000)
+    wav.write(audio[:1000])
+    with pytest.raises(OSError):
+        wav.write(audio[1000:])
+    wav.close()
+    np.testing.assert_array_equal(read_wav(path)[1], audio[:1000])
+
+
+def test_disk_full_stops_only_the_recording(tmp_path, monkeypatch, disk_full):
+    monkeypatch.setattr(Recorder, "GROW_BYTES", 4000)
+    recorder = record(tmp_path, [tone(4000)])
+    assert recorder.error.errno == errno.ENOSPC
+    assert recorder.file is None
+    # Playback keeps queueing blocks; they are just not recorded
+    recorder.write(tone(10))
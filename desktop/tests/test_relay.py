@@ -0,0 +1,158 @@
+import socket
+import time
+
+import numpy as np
+import pytest
+
+from relay import Relay
+from session import SessionInfo, header_length, parse_header
+from udp import PACKET_HEADER
+
+SESSION = SessionInfo(8000, 1)
+BLOCK = SESSION.frame_samples
+
+
+def block(n):
+    return np.full((BLOCK, 1), n + 1, dtype=np.int16)
+
+
+def udp_sink():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.settimeout(2)
+    return sock
+
+
+def tcp_listener(rcvbuf=None):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    if rcvbuf:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+    sock.bind(("127.0.0.1", 0))
+    sock.listen(1)
+    sock.settimeout(2)
+    return sock
+
+
+def target(transport, sock):
+    host, port = sock.getsockname()
+    return f"{transport}://{host}:{port}"
+
+
+def wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+def play(relay, blocks, start=0):
+    """Publish blocks at roughly real time, as the audio callback would"""
+    for n in range(start, start + blocks):
+        relay.write(block(n))
+        time.sleep(0.002)
+
+
+def read_udp(sock, blocks):
+    """Sequence numbers and first samples of the next ``blocks`` audio packets"""
+    seqs, values = [], []
+    while len(seqs) < blocks:
+        datagram = sock.recv(65536)
+        if header_length(datagram):
+            assert parse_header(datagram[: header_length(datagram)]).same_stream(
+                SESSION
+            )
+            continue
+        seq, _ = PACKET_HEADER.unpack_from(datagram)
+        pcm = np.frombuffer(datagram[PACKET_HEADER.size :], dtype=np.int16)
+        assert len(pcm) == BLOCK and (pcm == pcm[0]).all()
+        seqs.append(seq)
+        values.append(int(pcm[0]))
+    return seqs, values
+
+
+def read_tcp(conn, blocks):
+    data = b""
+    while True:
+        length = header_length(data)
+        if length:
+            break
+        data += conn.recv(4096)
+    data = data[length:]
+    while len(data) < blocks * BLOCK * 2:
+        data += conn.recv(65536)
+    pcm = np.frombuffer(data[: blocks * BLOCK * 2], dtype=np.int16)
+    return [int(value) for value in pcm[::BLOCK]]
+
+
+@pytest.fixture
+def relays():
+    started = []
+
+    def make(targets, **kwargs):
+        relay = Relay(targets, SESSION, **kwargs)
+        relay.start()
+        started.append(relay)
+        return relay
+
+    yield make
+    for relay in started:
+        relay.stop()
+
+
+def test_fans_out_to_every_subscriber(relays):
+    udp_a, udp_b, listener = udp_sink(), udp_sink(), tcp_listener()
+    relay = relays(
+        [target("udp", udp_a), target("udp", udp_b), target("tcp", listener)]
+    )
+    conn, _ = listener.accept()
+    conn.settimeout(2)
+    assert wait_for(lambda: all(s.streaming for s in relay.subscribers))
+    play(relay, 20)
+    expected = list(range(1, 21))
+    for sink in (udp_a, udp_b):
+        assert read_udp(sink, 20) == (list(range(20)), expected)
+    assert read_tcp(conn, 20) == expected
+    stats = relay.stats()
+    assert all(s["connected"] and s["dropped_s"] == 0 for s in stats.values())
+    for sock in (udp_a, udp_b, conn, listener):
+        sock.close()
+
+
+def test_a_stalled_tcp_receiver_is_cut_off_alone(relays):
+    # Accepted but never read: its socket buffers fill up and stay full
+    stalled = tcp_listener(rcvbuf=4096)
+    healthy = udp_sink()
+    relay = relays(
+        [target("tcp", stalled), target("udp", healthy)],
+        max_lag_ms=100,
+    )
+    conn, _ = stalled.accept()
+    assert wait_for(lambda: all(s.streaming for s in relay.subscribers))
+    slow, fast = relay.subscribers
+    play(relay, 150)
+    assert wait_for(lambda: slow.disconnects >= 1)
+    assert slow.dropped_bytes > 0
+    # The UDP receiver got every block, in order
+    seqs, values = read_udp(healthy, 150)
+    assert values == list(range(1, 151))
+    assert fast.dropped_bytes == 0
+    for sock in (conn, stalled, healthy):
+        sock.close()
+
+
+def test_an_unreachable_receiver_does_not_hold_up_the_others(relays):
+    # Bound but not listening, so connections are refused
+    closed = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    closed.bind(("127.0.0.1", 0))
+    healthy = udp_sink()
+    relay = relays([target("tcp", closed), target("udp", healthy)])
+    dead, live = relay.subscribers
+    assert wait_for(lambda: live.streaming)
+    play(relay, 10)
+    assert read_udp(healthy, 10)[1] == list(range(1, 11))
+    assert not dead.streaming
+    assert relay.stats()[dead.name]["lag_ms"] is None
+    for sock in (closed, healthy):
+        sock.close()
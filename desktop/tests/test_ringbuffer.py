@@ -0,0 +1,100 @@
+import numpy as np
+
+from ringbuffer import BroadcastRing, PCMRingBuffer, RingCursor
+
+
+def frames(start, count, channels=1):
+    return np.arange(start, start + count * channels, dtype=np.int16).reshape(
+        count, channels
+    )
+
+
+def test_read_back_across_wraparound():
+    ring = PCMRingBuffer(8, 2)
+    out = np.empty((5, 2), dtype=np.int16)
+    ring.write(frames(0, 5, 2))
+    assert ring.read_into(out) == 5
+    # The next write starts 5 frames in and wraps past the end
+    block = frames(100, 6, 2)
+    assert ring.write(block) == block.nbytes
+    assert ring.available() == 6
+    out = np.empty((6, 2), dtype=np.int16)
+    assert ring.read_into(out) == 6
+    np.testing.assert_array_equal(out, block)
+
+
+def test_write_view_stops_at_the_end_of_storage():
+    ring = PCMRingBuffer(8, 1)
+    ring.write(frames(0, 6))
+    ring.advance(6)
+    view = ring.write_view()
+    assert len(view) == 2 * ring.frame_bytes
+    view[:] = frames(50, 2).tobytes()
+    ring.commit_write(len(view))
+    assert len(ring.write_view()) == 6 * ring.frame_bytes
+
+
+def test_overrun_keeps_unread_audio():
+    ring = PCMRingBuffer(4, 1)
+    assert ring.write(frames(0, 6)) == 4 * ring.frame_bytes
+    assert ring.free_bytes() == 0
+    assert not len(ring.write_view())
+    out = np.empty((4, 1), dtype=np.int16)
+    ring.read_into(out)
+    np.testing.assert_array_equal(out, frames(0, 4))
+
+
+def test_underrun_pads_with_silence():
+    ring = PCMRingBuffer(8, 1)
+    ring.write(frames(1, 3))
+    out = np.full((5, 1), 7, dtype=np.int16)
+    assert ring.read_into(out) == 3
+    np.testing.assert_array_equal(out[:3], frames(1, 3))
+    assert not out[3:].any()
+
+
+def test_partial_frames_wait_for_the_rest():
+    ring = PCMRingBuffer(8, 2)
+    data = frames(0, 2, 2).tobytes()
+    ring.write(data[:6])
+    assert ring.available() == 1
+    ring.write(data[6:])
+    assert ring.available() == 2
+    ring.write(data[:2])
+    ring.discard_partial()
+    assert ring.available() == 2
+    assert ring.free_bytes() == 6 * ring.frame_bytes
+
+
+def test_flush_is_applied_by_the_reader():
+    ring = PCMRingBuffer(8, 1)
+    ring.write(frames(0, 4))
+    ring.flush()
+    ring.write(frames(10, 2))
+    out = np.empty((2, 1), dtype=np.int16)
+    assert ring.read_into(out) == 2
+    np.testing.assert_array_equal(out, frames(10, 2))
+
+
+def test_cursor_reads_across_wraparound():
+    ring = BroadcastRing(8, 2)
+    cursor = RingCursor(ring, max_lag_frames=8)
+    out = np.empty((5, 2), dtype=np.int16)
+    ring.write(frames(0, 5, 2))
+    assert cursor.read_into(out) == 5
+    block = frames(100, 6, 2)
+    ring.write(block)
+    out = np.empty((6, 2), dtype=np.int16)
+    assert cursor.read_into(out) == 6
+    np.testing.assert_array_equal(out, block)
+
+
+def test_cursor_skips_ahead_when_it_lags():
+    ring = BroadcastRing(16, 1)
+    cursor = RingCursor(ring, start_frames=2, max_lag_frames=8)
+    for start in range(0, 12, 4):
+        ring.write(frames(start, 4))
+    out = np.empty((2, 1), dtype=np.int16)
+    assert cursor.read_into(out) == 2
+    assert cursor.skipped_frames == 10
+    np.testing.assert_array_equal(out, frames(10, 2))
@@ -0,0 +1,39 @@
+import pytest
+
+from shmring import SharedSnapshot
+
+
+@pytest.fixture
+def snapshot():
+    writer = SharedSnapshot(capacity_bytes=4096)
+    reader = SharedSnapshot(name=writer.name)
+    yield writer, reader
+    reader.close()
+    writer.close()
+
+
+def test_reader_sees_the_latest_value(snapshot):
+    writer, reader = snapshot
+    assert reader.read() is None
+    writer.publish({"mix": {"peak_dbfs": -12.0}, "clients": {}})
+    writer.publish({"mix": None, "clients": {"10.0.0.2:4000": {"underruns": 3}}})
+    assert reader.read() == {
+        "mix": None,
+        "clients": {"10.0.0.2:4000": {"underruns": 3}},
+    }
+
+
+def test_reader_skips_a_value_being_written(snapshot):
+    writer, reader = snapshot
+    writer.publish([1, 2, 3])
+    # The writer stopped halfway through its next publish
+    writer._header[SharedSnapshot.SEQ_SLOT] += 1
+    assert reader.read() is None
+
+
+def test_oversized_value_is_refused(snapshot):
+    writer, reader = snapshot
+    writer.publish("kept")
+    with pytest.raises(ValueError):
+        writer.publish(bytes(8192))
+    assert reader.read() == "kept"
@@ -0,0 +1,109 @@
+import numpy as np
+
+from ringbuffer import PCMRingBuffer
+from udp import PACKET_HEADER, PacketReorderer, seq_delta
+
+BLOCK = 4
+
+
+def packet(seq, value=None):
+    """Datagram whose block holds ``value`` (default: the sequence number)"""
+    value = seq % 1000 if value is None else value
+    block = np.full(BLOCK, value, dtype=np.int16)
+    return PACKET_HEADER.pack(seq & 0xFFFFFFFF, 0) + block.tobytes()
+
+
+def make_reorderer(window=3):
+    ring = PCMRingBuffer(4096, 1)
+    return PacketReorderer(ring, window), ring
+
+
+def played(ring):
+    """First sample of every block queued so far"""
+    out = np.empty((ring.available(), 1), dtype=np.int16)
+    ring.read_into(out)
+    return list(out[::BLOCK, 0])
+
+
+def test_seq_delta_wraps():
+    assert seq_delta(0, 0xFFFFFFFF) == 1
+    assert seq_delta(0xFFFFFFFF, 0) == -1
+    assert seq_delta(5, 3) == 2
+
+
+def test_in_order_packets_play_at_once():
+    reorderer, ring = make_reorderer()
+    for seq in range(1, 6):
+        reorderer.handle(packet(seq))
+    assert played(ring) == [1, 2, 3, 4, 5]
+
+
+def test_reorders_within_the_window():
+    reorderer, ring = make_reorderer()
+    for seq in (1, 3, 4, 2, 5):
+        reorderer.handle(packet(seq))
+    assert played(ring) == [1, 2, 3, 4, 5]
+    assert reorderer.lost == 0
+
+
+def test_conceals_a_lost_packet_with_a_fade():
+    reorderer, ring = make_reorderer()
+    reorderer.handle(packet(1, 1000))
+    for seq in range(3, 6):
+        reorderer.handle(packet(seq))
+    out = played(ring)
+    assert reorderer.lost == 1
+    assert out[0] == 1000
+    # The repeat of packet 1 starts at full level and fades toward silence
+    assert 0 < out[1] <= 1000
+    assert out[2:] == [3, 4, 5]
+
+
+def test_late_packets_are_dropped():
+    reorderer, ring = make_reorderer()
+    for seq in (1, 2, 3, 2):
+        reorderer.handle(packet(seq))
+    assert played(ring) == [1, 2, 3]
+    assert reorderer.late == 1
+
+
+def test_sequence_restart_resyncs():
+    reorderer, ring = make_reorderer()
+    for seq in range(1000, 1005):
+        reorderer.handle(packet(seq, 7))
+    played(ring)
+    for seq in range(1, 4):
+        reorderer.handle(packet(seq))
+    assert played(ring) == [1, 2, 3]
+    assert reorderer.resyncs == 1
+    assert reorderer.late == 0
+
+
+def test_large_jump_resyncs_without_concealing_the_gap():
+    reorderer, ring = make_reorderer()
+    reorderer.handle(packet(1))
+    reorderer.handle(packet(1 + 1_000_000))
+    assert reorderer.resyncs == 1
+    assert reorderer.lost == 0
+    assert ring.available() == 2 * BLOCK
+
+
+def test_concealment_is_limited_per_gap():
+    reorderer, ring = make_reorderer()
+    reorderer.handle(packet(1))
+    gap = reorderer.window * reorderer.RESYNC_WINDOWS
+    reorderer.handle(packet(1 + gap))
+    # The gap is lost, but only a few blocks of it are concealed
+    assert reorderer.resyncs == 0
+    assert reorderer.lost == gap - reorderer.window
+    concealed = ring.available() // BLOCK - 1
+    assert concealed == reorderer.MAX_CONCEALED
+
+
+def test_sequence_wraps_at_32_bits():
+    reorderer, ring = make_reorderer()
+    for seq in (0xFFFFFFFE, 0, 0xFFFFFFFF, 1):
+        reorderer.handle(packet(seq, seq & 0xF))
+    assert played(ring) == [0xE, 0xF, 0, 1]
+    assert reorderer.lost == 0
+    assert reorderer.resyncs == 0
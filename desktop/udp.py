@@ -0,0 +1,161 @@
+import struct
+
+import numpy as np
+
+# Every datagram starts with a sequence number and the sender's capture
+# timestamp in microseconds, followed by one frame-aligned block of PCM
+# (or whole blocks of the session's codec).
+PACKET_HEADER = struct.Struct("!IQ")
+MAX_DATAGRAM = 65536
+
+
+def seq_delta(a, b):
+    """Signed distance from sequence number ``b`` to ``a`` with wraparound"""
+    return (a - b + 0x80000000) % 0x100000000 - 0x80000000
+
+
+class PacketReorderer:
+    """Turn sequenced datagrams into a continuous stream in a ring buffer
+
+    Packets are held for at most ``window`` sequence numbers while waiting
+    for stragglers. Once a gap falls out of the window it is filled with
+    packet-loss concealment (the last block repeated with a fade toward
+    silence) so playback never stalls on a lost packet. Only the first
+    ``MAX_CONCEALED`` blocks of a gap are concealed; by then the fade is
+    nearly silent, and the buffer's own underrun handling takes over.
+    A sequence number more than ``RESYNC_WINDOWS`` windows away from the
+    expected one means the sender restarted its count or skipped far
+    ahead, so the stream starts over from that packet.
+    """
+
+    FADE_PER_LOSS = 0.5
+    MAX_CONCEALED = 4
+    RESYNC_WINDOWS = 4
+
+    def __init__(self, ring, window=3, decoder=None):
+        self.ring = ring
+        self.decoder = decoder
+        self.window = window
+        self.next_seq = None
+        self.last_timestamp_us = None
+
+        self.received = 0
+        self.late = 0
+        self.lost = 0
+        self.resyncs = 0
+        self.dropped_bytes = 0
+
+        self._slots = [None] * window
+        self._slot_data = [bytearray(MAX_DATAGRAM) for _ in range(window)]
+        self._last = np.zeros(0, dtype=ring.dtype)
+        self._conceal = np.zeros(0, dtype=np.float32)
+        self._fade = 1.0
+
+    def reset(self):
+        """Forget sequencing state, e.g. when a new sender appears"""
+        self.next_seq = None
+        self._slots = [None] * self.window
+        self._fade = 1.0
+
+    def handle(self, datagram):
+        """Process one datagram (header and payload)"""
+        if len(datagram) < PACKET_HEADER.size:
+            return
+        seq, timestamp_us = PACKET_HEADER.unpack_from(datagram)
+        payload = datagram[PACKET_HEADER.size :]
+        if self.decoder is not None:
+            pcm = self.decoder.convert(payload)
+            payload = memoryview(pcm.reshape(-1).view(np.uint8))
+        payload = payload[: len(payload) - len(payload) % self.ring.frame_bytes]
+        self.received += 1
+        self.last_timestamp_us = timestamp_us
+
+        if self.next_seq is None:
+            self.next_seq = seq
+        ahead = seq_delta(seq, self.next_seq)
+        if abs(ahead) > self.window * self.RESYNC_WINDOWS:
+            self.resyncs += 1
+            self.reset()
+            self.next_seq = seq
+            ahead = 0
+        if ahead < 0:
+            self.late += 1
+            return
+
+        if ahead == 0:
+            self._play(payload)
+            self.next_seq = (self.next_seq + 1) & 0xFFFFFFFF
+        else:
+            concealed = 0
+            while ahead >= self.window:
+                # The oldest missing packet is not coming back in time
+                if self._advance_gap(conceal=concealed < self.MAX_CONCEALED):
+                    concealed += 1
+                ahead -= 1
+            slot = seq % self.window
+            size = len(payload)
+            self._slot_data[slot][:size] = payload
+            self._slots[slot] = (seq, size)
+        self._flush()
+
+    def _flush(self):
+        while True:
+            slot = self.next_seq % self.window
+            held = self._slots[slot]
+            if held is None or held[0] != self.next_seq:
+                return
+            self._slots[slot] = None
+            self._play(memoryview(self._slot_data[slot])[: held[1]])
+            self.next_seq = (self.next_seq + 1) & 0xFFFFFFFF
+
+    def _advance_gap(self, conceal=True):
+        """Move past ``next_seq``; True if it was lost and concealed"""
+        slot = self.next_seq % self.window
+        held = self._slots[slot]
+        concealed = False
+        if held is not None and held[0] == self.next_seq:
+            self._slots[slot] = None
+            self._play(memoryview(self._slot_data[slot])[: held[1]])
+        else:
+            self.lost += 1
+            if conceal:
+                self._write(self._concealment())
+                concealed = True
+        self.next_seq = (self.next_seq + 1) & 0xFFFFFFFF
+        return concealed
+
+    def _play(self, payload):
+        samples = np.frombuffer(payload, dtype=self.ring.dtype)
+        if len(self._last) != len(samples):
+            self._last = np.empty_like(samples)
+            self._conceal = np.empty(len(samples), dtype=np.float32)
+        self._last[:] = samples
+        self._fade = 1.0
+        self._write(payload)
+
+    def _concealment(self):
+        """Repeat the last block, fading further with each consecutive loss"""
+        start = self._fade
+        self._fade *= self.FADE_PER_LOSS
+        if not len(self._last):
+            return self._last
+        frames = len(self._last) // self.ring.channels
+        ramp = np.linspace(start, self._fade, frames, dtype=np.float32)
+        conceal = self._conceal.reshape(frames, self.ring.channels)
+        np.multiply(
+            self._last.reshape(frames, self.ring.channels), ramp[:, None], out=conceal
+        )
+        return conceal.astype(self.ring.dtype)
+
+    def _write(self, data):
+        written = self.ring.write(data)
+        self.dropped_bytes += memoryview(data).nbytes - written
+
+    def stats(self):
+        return {
+            "packets_received": self.received,
+            "packets_late": self.late,
+            "packets_lost": self.lost,
+            "sequence_resyncs": self.resyncs,
+            "dropped_bytes": self.dropped_bytes,
+        }